@@ -1,15 +1,7 @@
 # agents/alignment_agent.py
 from crewai import Agent
 from tools.alignment_tool import AlignmentTool
-from crewai import LLM
-import os
-
-# Create LLM
-llm = LLM(
-    model="gemini/gemini-2.5-flash",  # Note the "gemini/" prefix for LiteLLM
-    temperature=0.1,
-    api_key=os.getenv("GOOGLE_API_KEY")
-)
+from agents.llm import get_llm
 
 def create_alignment_agent():
     return Agent(
@@ -19,7 +11,7 @@ def create_alignment_agent():
         Your specialty is detecting and correcting geometric distortions in scanned documents.
         You ensure that every student answer sheet is perfectly aligned with the template.""",
         tools=[AlignmentTool()],
-        llm=llm,  # IMPORTANT: Add this
+        llm=get_llm(),  # One client shared by every agent
         verbose=True,
         allow_delegation=False
     )
\ No newline at end of file
@@ -0,0 +1,134 @@
+# agents/cached_llm.py
+# Imported by agents/llm.py on first use only: it pulls in crewai and LiteLLM
+import time
+from typing import Callable
+
+import litellm
+from crewai import LLM
+
+from utils import config
+from utils.llm_cache import LLMCache, LLMCacheMiss, llm_cache_key
+from utils.llm_usage import usage_tracker
+
+# Responses shared by every LLM client in this process
+_llm_cache = LLMCache(
+    config.LLM_CACHE_PATH,
+    max_bytes=config.LLM_CACHE_MAX_MB * 1024 * 1024,
+    ttl_seconds=config.LLM_CACHE_TTL_DAYS * 24 * 3600
+) if config.LLM_CACHE_ENABLED or config.LLM_REPLAY_ONLY else None
+
+# Client attributes that change what the model answers
+_OUTPUT_PARAMS = ("temperature", "top_p", "n", "stop", "max_tokens", "max_completion_tokens",
+                  "presence_penalty", "frequency_penalty", "seed", "reasoning_effort")
+
+
+def llm_cache_stats():
+    return _llm_cache.stats() if _llm_cache is not None else None
+
+
+class _UsageCapture:
+    """
+    Callback for one LLM.call(): crewai hands every callback the
+    provider's token usage for the response (log_success_event), which
+    call() itself does not return.
+    """
+
+    def __init__(self):
+        self.usage = None
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        usage = response_obj.get("usage") if isinstance(response_obj, dict) else getattr(response_obj, "usage", None)
+        if usage is not None and self.usage is None:
+            self.usage = usage
+
+
+def _usage_tokens(usage) -> tuple:
+    """(prompt_tokens, completion_tokens) of a LiteLLM usage object or dict."""
+    if isinstance(usage, dict):
+        return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0)
+    return int(getattr(usage, "prompt_tokens", 0) or 0), int(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def _with_callback(args: tuple, kwargs: dict, callback) -> tuple:
+    """LLM.call() arguments with `callback` added to its callbacks (its second positional parameter)."""
+    if len(args) > 1:
+        args = (args[0], list(args[1] or []) + [callback]) + tuple(args[2:])
+    else:
+        kwargs = {**kwargs, "callbacks": list(kwargs.get("callbacks") or []) + [callback]}
+    return args, kwargs
+
+
+class CachedLLM(LLM):
+    """
+    crewai LLM whose calls go through the persistent response cache and
+    are counted in the usage tracker (tokens and latency, per job and
+    stage, see utils.llm_usage). Token counts are the provider's usage
+    when the response reports it, and LiteLLM tokenizer estimates
+    otherwise (counted as "estimated_calls").
+
+    Calls with native tools (function calling) are never cached: their
+    response runs the tools. Agents' ReAct turns are plain text and the
+    executor runs the tools itself, so those are cached as usual.
+
+    `cache_if(response) -> bool` lets the caller keep responses it cannot
+    use (e.g. output that fails its schema) out of the cache: only the
+    ones it approves are stored, and a stored one it rejects is dropped
+    and asked again.
+    """
+
+    def call(self, messages, *args, cache_if: Callable[[str], bool] = None, **kwargs):
+        tools = kwargs.get("tools", args[0] if args else None)
+        cacheable = _llm_cache is not None and not tools
+        key = llm_cache_key(self.model, self._output_params(), messages) if cacheable else None
+
+        if cacheable:
+            cached = _llm_cache.get(key)
+            if cached is not None and (cache_if is None or cache_if(cached["response"])):
+                usage_tracker.record(cached["prompt_tokens"], cached["completion_tokens"], cache_hit=True,
+                                     estimated=cached.get("estimated", True))
+                return cached["response"]
+            if cached is not None:
+                _llm_cache.delete(key)
+        if config.LLM_REPLAY_ONLY:
+            raise LLMCacheMiss(f"No cached response for this {self.model} prompt (SASES_LLM_REPLAY is on)")
+
+        capture = _UsageCapture()
+        args, kwargs = _with_callback(args, kwargs, capture)
+        start = time.perf_counter()
+        response = super().call(messages, *args, **kwargs)
+        latency = time.perf_counter() - start
+
+        estimated = capture.usage is None
+        if estimated:
+            prompt_tokens = self._count_tokens(messages=messages if not isinstance(messages, str) else None,
+                                               text=messages if isinstance(messages, str) else None)
+            completion_tokens = self._count_tokens(text=response if isinstance(response, str) else None)
+        else:
+            prompt_tokens, completion_tokens = _usage_tokens(capture.usage)
+        usage_tracker.record(prompt_tokens, completion_tokens, latency, estimated=estimated)
+        if cacheable and isinstance(response, str) and response.strip() and (cache_if is None or cache_if(response)):
+            _llm_cache.put(key, {
+                "response": response,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "estimated": estimated,
+            })
+        return response
+
+    def _output_params(self) -> dict:
+        params = {name: getattr(self, name, None) for name in _OUTPUT_PARAMS}
+        response_format = getattr(self, "response_format", None)
+        if hasattr(response_format, "model_json_schema"):
+            response_format = response_format.model_json_schema()
+        params["response_format"] = response_format
+        return params
+
+    def _count_tokens(self, messages=None, text=None) -> int:
+        # For responses without provider usage (e.g. streamed ones): an
+        # estimate from LiteLLM's tokenizer for the model
+        if not messages and not text:
+            return 0
+        try:
+            return litellm.token_counter(model=self.model, messages=messages, text=text)
+        except Exception:
+            return len(text or str(messages)) // 4
@@ -1,14 +1,7 @@
 # agents/evaluation_agent.py
 from crewai import Agent
 from tools.evaluation_tool import AnswerEvaluationTool
-from crewai import LLM
-import os
-
-llm = LLM(
-    model="gemini/gemini-2.5-flash",  # Note the "gemini/" prefix for LiteLLM
-    temperature=0.1,
-    api_key=os.getenv("GOOGLE_API_KEY")
-)
+from agents.llm import get_llm
 
 def create_evaluation_agent():
     return Agent(
@@ -18,7 +11,7 @@ def create_evaluation_agent():
         You can handle multiple question types (MCQ, fill-in-the-blank, one-word)
         and provide fair, consistent evaluations with confidence scores.""",
         tools=[AnswerEvaluationTool()],
-        llm=llm,  # IMPORTANT: Add this
+        llm=get_llm(),  # One client shared by every agent
         verbose=True,
         allow_delegation=False
     )
\ No newline at end of file
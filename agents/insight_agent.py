@@ -1,17 +1,10 @@
 # agents/insight_agent.py
 from crewai import Agent
-from crewai import LLM
-import os
 
 # Import the new tools
 from tools.insight_tool import FileReaderTool, FileWriterTool
+from agents.llm import get_llm
 
-# Reuse the same LLM configuration
-llm = LLM(
-    model="gemini/gemini-2.5-flash",
-    temperature=0.1,
-    api_key=os.getenv("GOOGLE_API_KEY")
-)
 
 def create_insight_agent():
     return Agent(
@@ -26,7 +19,7 @@ def create_insight_agent():
             FileReaderTool(),
             FileWriterTool()
         ],
-        llm=llm,
+        llm=get_llm(),  # One client shared by every agent
         verbose=True,
         allow_delegation=False
     )
\ No newline at end of file
@@ -0,0 +1,36 @@
+# agents/llm.py
+import os
+import threading
+
+from utils import config
+
+# One client per output schema (None: free text)
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_llm(response_format=None):
+    """
+    The process-wide LLM client, created on first use and shared by every
+    agent, so all LLM calls reuse one client and its connections. Its
+    calls go through the response cache and the usage tracker (see
+    agents/cached_llm.py).
+
+    `response_format` (a pydantic model) gives the client for structured
+    output constrained to that schema, also created once.
+    """
+    llm = _clients.get(response_format)
+    if llm is None:
+        with _lock:
+            llm = _clients.get(response_format)
+            if llm is None:
+                # Deferred: crewai/LiteLLM take seconds to import
+                from agents.cached_llm import CachedLLM
+
+                llm = _clients[response_format] = CachedLLM(
+                    model=config.LLM_MODEL,
+                    temperature=config.LLM_TEMPERATURE,
+                    api_key=os.getenv("GOOGLE_API_KEY"),
+                    response_format=response_format
+                )
+    return llm
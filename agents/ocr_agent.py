@@ -1,14 +1,7 @@
 # agents/ocr_agent.py
 from crewai import Agent
 from tools.azure_ocr_tool import AzureOCRTool
-from crewai import LLM
-import os
-
-llm = LLM(
-    model="gemini/gemini-2.5-flash",  # Note the "gemini/" prefix for LiteLLM
-    temperature=0.1,
-    api_key=os.getenv("GOOGLE_API_KEY")
-)
+from agents.llm import get_llm
 
 def create_ocr_agent():
     return Agent(
@@ -18,7 +11,7 @@ def create_ocr_agent():
         You use Azure's state-of-the-art OCR technology to extract text with high accuracy,
         even from challenging handwritten content.""",
         tools=[AzureOCRTool()],
-        llm=llm,  # IMPORTANT: Add this
+        llm=get_llm(),  # One client shared by every agent
         verbose=True,
         allow_delegation=False
     )
\ No newline at end of file
@@ -1,21 +1,149 @@
+from utils.startup import elapsed, report_startup  # First, so the startup timer covers every import below (reads no env vars)
 from dotenv import load_dotenv
 load_dotenv()  # Must be BEFORE any other imports that use env vars
 
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 # Pydantic and List/Optional are no longer needed as per main.py logic
 # from pydantic import BaseModel
 # from typing import List, Optional
+import asyncio
+import functools
 import shutil
 import os
-from crew import SASESCrew  # This imports agents which need GOOGLE_API_KEY
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from crew import SASESCrew, CHECKPOINT_STAGES  # This imports agents which need GOOGLE_API_KEY
+from utils import config
+from utils.exam_registry import DuplicateStudentError, UnknownExamError, student_id_from_sheet
+from utils.job_queue import new_job_id
+from utils.llm_usage import usage_tracker
+from utils.ocr_cache import OCRCache
+from worker import create_job_queue
 import json
+import threading
 
 app = FastAPI(title="SASES API")
 
-# Initialize crew
+# Initialize crew (agents and tools are built on first use)
 sases_crew = SASESCrew()
 
+# Jobs submitted here are run by worker.py processes
+job_queue = create_job_queue()
+
+# --- Admission control ---
+# The pipeline is blocking and takes minutes, so it runs on worker threads.
+# At most API_MAX_CONCURRENT_RUNS run at once, at most API_MAX_QUEUED_RUNS
+# wait for a slot, and nobody waits longer than API_QUEUE_TIMEOUT_SECONDS:
+# excess load gets a 503 with Retry-After instead of a hanging request.
+_executor = ThreadPoolExecutor(max_workers=config.API_MAX_CONCURRENT_RUNS, thread_name_prefix="sases-api")
+_run_slots = asyncio.Semaphore(config.API_MAX_CONCURRENT_RUNS)
+_queued_runs = 0
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class Overloaded(Exception):
+    pass
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+async def _acquire_run_slot():
+    """Wait for a free pipeline slot, or raise Overloaded."""
+    global _queued_runs
+    if _queued_runs >= config.API_MAX_QUEUED_RUNS:
+        raise Overloaded()
+    _queued_runs += 1
+    try:
+        await asyncio.wait_for(_run_slots.acquire(), config.API_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise Overloaded()
+    finally:
+        _queued_runs -= 1
+
+
+def _submit_run(fn, *args, **kwargs) -> asyncio.Future:
+    """Start a blocking call on the worker pool; needs a slot from _acquire_run_slot()."""
+    future = asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+    # The slot is freed when the work finishes, even if the client went away
+    future.add_done_callback(lambda _: _run_slots.release())
+    return future
+
+
+# Request temp dirs that a pipeline run is still reading
+_busy_work_dirs = set()
+
+
+async def _run_pipeline(fn, *args, work_dir: str = None, **kwargs):
+    """
+    Run a blocking pipeline call on the worker pool, subject to admission control.
+
+    The run goes on if the client disconnects, so `work_dir` (the request's
+    uploads) is removed when the run ends rather than when the handler
+    does (see _remove_work_dir()).
+    """
+    await _acquire_run_slot()
+    run = _submit_run(fn, *args, **kwargs)
+    if work_dir is not None:
+        _busy_work_dirs.add(work_dir)
+
+        def release(_):
+            _busy_work_dirs.discard(work_dir)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        run.add_done_callback(release)
+    return await asyncio.shield(run)
+
+
+def _remove_work_dir(work_dir: str) -> None:
+    """Remove a request's temp dir, unless a run still reads it (it goes when that run ends)."""
+    if work_dir not in _busy_work_dirs:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _error_response(e: Exception) -> JSONResponse:
+    if isinstance(e, Overloaded):
+        return JSONResponse(
+            {"success": False, "error": "Server busy, retry later."},
+            status_code=503,
+            headers={"Retry-After": str(int(config.API_QUEUE_TIMEOUT_SECONDS))}
+        )
+    if isinstance(e, UploadTooLarge):
+        return JSONResponse({"success": False, "error": str(e)}, status_code=413)
+    if isinstance(e, DuplicateStudentError):
+        return JSONResponse({"success": False, "error": str(e)}, status_code=409)
+    return JSONResponse({
+        "success": False,
+        "error": str(e)
+    }, status_code=500)
+
+
+def _new_request_id() -> str:
+    """Each request is its own job in the artifact store."""
+    return uuid.uuid4().hex[:16]
+
+
+def _parse_force_stages(value: str) -> List[str]:
+    """'report,insights' -> ['report', 'insights']; raises ValueError on unknown stages."""
+    stages = [stage.strip() for stage in (value or "").split(",") if stage.strip()]
+    unknown = sorted(set(stages) - set(CHECKPOINT_STAGES))
+    if unknown:
+        raise ValueError(f"Unknown stage(s) in 'force_stages': {unknown}. "
+                         f"Use any of: {', '.join(CHECKPOINT_STAGES)}.")
+    return stages
+
+
+def _bad_request(e: Exception) -> JSONResponse:
+    return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
 # --- Removed Pydantic models ---
 # The models 'ReferenceAnswer' and 'EvaluationRequest' are not used in
 # the main.py workflow, which relies on a teacher's answer sheet image.
@@ -24,41 +152,46 @@ sases_crew = SASESCrew()
 async def evaluate_answer_sheet(
     template: UploadFile = File(...),
     teacher_sheet: UploadFile = File(...),  # <-- ADDED
-    student_sheet: UploadFile = File(...)
+    student_sheet: UploadFile = File(...),
+    mode: str = Form(None),  # "crew" or "direct"; defaults to SASES_PIPELINE_MODE
+    layout: UploadFile = File(None),  # Optional template zone layout JSON
+    force_stages: str = Form(None)  # Comma-separated stages to recompute despite their checkpoints
     # reference_answers: str = Form(...)  <-- REMOVED
 ):
     """
     Main endpoint to evaluate answer sheet by providing
     template, teacher's key, and the student's sheet.
     """
+    try:
+        force_stages = _parse_force_stages(force_stages)
+    except ValueError as e:
+        return _bad_request(e)
     
-    # Define temp paths
-    temp_dir = "temp"
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    template_path = os.path.join(temp_dir, template.filename)
-    teacher_path = os.path.join(temp_dir, teacher_sheet.filename) # <-- ADDED
-    student_path = os.path.join(temp_dir, student_sheet.filename)
+    # Each request gets its own temp dir, so concurrent uploads never collide
+    work_dir = _new_work_dir("eval_")
+    request_id = _new_request_id()
 
     try:
         # Save uploaded files
-        with open(template_path, "wb") as f:
-            shutil.copyfileobj(template.file, f)
-        
-        with open(teacher_path, "wb") as f:  # <-- ADDED
-            shutil.copyfileobj(teacher_sheet.file, f)
-            
-        with open(student_path, "wb") as f:
-            shutil.copyfileobj(student_sheet.file, f)
+        template_path = await _save_upload(template, work_dir, f"template_{template.filename}")
+        teacher_path = await _save_upload(teacher_sheet, work_dir, f"teacher_{teacher_sheet.filename}")  # <-- ADDED
+        student_path = await _save_upload(student_sheet, work_dir, f"student_{student_sheet.filename}")
+        layout_path = await _save_upload(layout, work_dir, f"layout_{layout.filename}") if layout else None
         
         # --- Removed parsing of reference_answers ---
         
-        # Process through crew (matching main.py)
+        # Process through crew (matching main.py), off the event loop
         print(f"Starting API pipeline for: {student_path}")
-        result = sases_crew.process_answer_sheet(
+        result = await _run_pipeline(
+            sases_crew.process_answer_sheet,
             template_path=template_path,
             teacher_sheet_path=teacher_path,  # <-- ADDED
-            student_sheet_path=student_path
+            student_sheet_path=student_path,
+            mode=mode,
+            layout_path=layout_path,
+            job_id=request_id,
+            force_stages=force_stages,
+            work_dir=work_dir
         )
         
         # Use .model_dump() as seen in main.py for clean JSON output
@@ -70,27 +203,547 @@ async def evaluate_answer_sheet(
 
         return JSONResponse({
             "success": True,
+            "request_id": request_id,
             "result": final_output  # <-- Use serialized output
         })
         
     except Exception as e:
-        return JSONResponse({
-            "success": False,
-            "error": str(e)
-        }, status_code=500)
+        return _error_response(e)
     
     finally:
         # Clean up temp files
-        if os.path.exists(template_path):
-            os.remove(template_path)
-        if os.path.exists(teacher_path):
-            os.remove(teacher_path)
-        if os.path.exists(student_path):
-            os.remove(student_path)
+        _remove_work_dir(work_dir)
+
+# --- Streaming: progress events as stages finish, the score as soon as it exists ---
+
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+def _format_event(event: str, data: dict, fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps({"event": event, **data}, default=str) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _stage_summary(result):
+    """The evaluation summary, if this stage produced it (both modes pass the report dict)."""
+    if isinstance(result, dict) and isinstance(result.get("summary"), dict):
+        return result["summary"]
+    return None
+
+
+@app.post("/api/v1/evaluate/stream")
+async def evaluate_answer_sheet_stream(
+    template: UploadFile = File(...),
+    teacher_sheet: UploadFile = File(...),
+    student_sheet: UploadFile = File(...),
+    mode: str = Form(None),
+    layout: UploadFile = File(None),
+    format: str = Form("sse"),  # "sse" (text/event-stream) or "ndjson"
+    force_stages: str = Form(None)
+):
+    """
+    Same inputs as /api/v1/evaluate, but the response is a stream:
+    a 'stage' event as each stage finishes, a 'score' event with the
+    evaluation summary as soon as it exists (before insights and
+    validation), then a final 'result' or 'error' event.
+    """
+    if format not in STREAM_MEDIA_TYPES:
+        return JSONResponse({"success": False, "error": "'format' must be 'sse' or 'ndjson'."}, status_code=400)
+    try:
+        force_stages = _parse_force_stages(force_stages)
+    except ValueError as e:
+        return _bad_request(e)
+
+    work_dir = _new_work_dir("stream_")
+    request_id = _new_request_id()
+    try:
+        template_path = await _save_upload(template, work_dir, f"template_{template.filename}")
+        teacher_path = await _save_upload(teacher_sheet, work_dir, f"teacher_{teacher_sheet.filename}")
+        student_path = await _save_upload(student_sheet, work_dir, f"student_{student_sheet.filename}")
+        layout_path = await _save_upload(layout, work_dir, f"layout_{layout.filename}") if layout else None
+        # Admission happens before the response starts, so overload is still a 503
+        await _acquire_run_slot()
+    except Exception as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return _error_response(e)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    start = time.perf_counter()
+
+    def on_stage(name, result):
+        # Called from the pipeline thread; hand the event over to the event loop
+        summary = _stage_summary(result)
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+        loop.call_soon_threadsafe(events.put_nowait, ("stage", {"stage": name, "elapsed_ms": elapsed_ms}))
+        if summary is not None:
+            loop.call_soon_threadsafe(events.put_nowait, ("score", {"stage": name, "summary": summary}))
+
+    run = _submit_run(
+        sases_crew.process_answer_sheet,
+        template_path=template_path,
+        teacher_sheet_path=teacher_path,
+        student_sheet_path=student_path,
+        mode=mode,
+        layout_path=layout_path,
+        job_id=request_id,
+        on_stage=on_stage,
+        force_stages=force_stages
+    )
+    # The temp dir goes when the run is over, whether or not the client is still there
+    run.add_done_callback(lambda _: shutil.rmtree(work_dir, ignore_errors=True))
+
+    async def stream():
+        yield _format_event("accepted", {"request_id": request_id}, format)
+        while not run.done() or not events.empty():
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, run}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                yield _format_event(*next_event.result(), format)
+            else:
+                next_event.cancel()
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+        try:
+            result = run.result()
+        except Exception as e:
+            yield _format_event("error", {"error": str(e), "elapsed_ms": elapsed_ms}, format)
+            return
+        try:
+            result = result.model_dump()
+        except AttributeError:
+            pass  # "direct" mode returns a plain dict
+        yield _format_event("result", {"result": result, "elapsed_ms": elapsed_ms}, format)
+
+    return StreamingResponse(
+        stream(),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+
+def _iter_zip_sheets(zip_path: str, extract_dir: str):
+    """
+    Yield (student id, sheet path) for the sheets in a zip one at a time,
+    extracting each member only when it is requested, so the whole archive
+    is never unpacked at once. Students are named after the member's path
+    in the archive.
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        for index, info in enumerate(archive.infolist()):
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            # Prefix with the index: members in different folders may share a name
+            sheet_path = os.path.join(extract_dir, f"{index:05d}_{name}")
+            with archive.open(info) as src, open(sheet_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            yield student_id_from_sheet(info.filename), sheet_path
+
+
+def _new_work_dir(prefix: str) -> str:
+    """A private temp dir per request, so concurrent uploads never collide."""
+    return tempfile.mkdtemp(prefix=prefix, dir="temp" if os.path.isdir("temp") else None)
+
+
+async def _save_upload(upload: UploadFile, directory: str, name: str) -> str:
+    """Stream an upload to disk in chunks, enforcing API_MAX_UPLOAD_MB."""
+    # Client-supplied names must not point outside the work dir
+    path = os.path.join(directory, os.path.basename(name) or "upload")
+    max_bytes = config.API_MAX_UPLOAD_MB * 1024 * 1024
+    written = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if max_bytes and written > max_bytes:
+                raise UploadTooLarge(
+                    f"Upload '{upload.filename}' exceeds the {config.API_MAX_UPLOAD_MB} MB limit."
+                )
+            f.write(chunk)
+    return path
+
+
+async def _student_sheets(work_dir: str, student_sheets: List[UploadFile], student_zip: UploadFile):
+    """
+    Save uploaded student sheets, or lazily extract them from a zip, as
+    (student id, sheet path) pairs; students are named after the uploaded
+    file names.
+    """
+    if student_zip:
+        zip_path = await _save_upload(student_zip, work_dir, "students.zip")
+        # Members are extracted on the worker thread, as the batch consumes them
+        return _iter_zip_sheets(zip_path, work_dir)
+    return [
+        (student_id_from_sheet(os.path.basename(sheet.filename)),
+         await _save_upload(sheet, work_dir, f"{i:05d}_{os.path.basename(sheet.filename)}"))
+        for i, sheet in enumerate(student_sheets)
+    ]
+
+
+MISSING_STUDENTS_ERROR = "Provide 'student_sheets' files or a 'student_zip' archive."
+
+
+@app.post("/api/v1/evaluate/batch")
+async def evaluate_class_batch(
+    template: UploadFile = File(...),
+    teacher_sheet: UploadFile = File(...),
+    student_sheets: List[UploadFile] = File(None),  # Many student sheets...
+    student_zip: UploadFile = File(None),           # ...or one zip of them
+    layout: UploadFile = File(None),
+    include_insights: bool = Form(False)
+):
+    """
+    Grade a whole class: the template and teacher key are processed once
+    and every student sheet is graded against them on a worker pool.
+    Returns per-student results plus a class summary.
+    """
+    if not student_sheets and not student_zip:
+        return JSONResponse({"success": False, "error": MISSING_STUDENTS_ERROR}, status_code=400)
+
+    # Each batch gets its own temp dir, removed when the batch is done
+    batch_dir = _new_work_dir("batch_")
+
+    try:
+        template_path = await _save_upload(template, batch_dir, f"template_{template.filename}")
+        teacher_path = await _save_upload(teacher_sheet, batch_dir, f"teacher_{teacher_sheet.filename}")
+        layout_path = await _save_upload(layout, batch_dir, f"layout_{layout.filename}") if layout else None
+        sheet_paths = await _student_sheets(batch_dir, student_sheets, student_zip)
+
+        print(f"Starting API batch pipeline in: {batch_dir}")
+        result = await _run_pipeline(
+            sases_crew.process_class_batch,
+            template_path=template_path,
+            teacher_sheet_path=teacher_path,
+            student_sheet_paths=sheet_paths,
+            layout_path=layout_path,
+            include_insights=include_insights,
+            job_id=_new_request_id(),
+            work_dir=batch_dir
+        )
+        return JSONResponse(result, status_code=200 if result["success"] else 500)
+
+    except Exception as e:
+        return _error_response(e)
+
+    finally:
+        _remove_work_dir(batch_dir)
+
+
+# --- Exam registry: register the template and key once, grade for days ---
+
+@app.post("/api/v1/exams")
+async def register_exam(
+    template: UploadFile = File(...),
+    teacher_sheet: UploadFile = File(...),
+    layout: UploadFile = File(None),
+    name: str = Form(None)
+):
+    """
+    Register an exam: runs teacher alignment and key OCR once and stores
+    the template, its features, the layout and the parsed key on disk.
+    """
+    work_dir = _new_work_dir("exam_")
+    try:
+        template_path = await _save_upload(template, work_dir, f"template_{template.filename}")
+        teacher_path = await _save_upload(teacher_sheet, work_dir, f"teacher_{teacher_sheet.filename}")
+        layout_path = await _save_upload(layout, work_dir, f"layout_{layout.filename}") if layout else None
+
+        manifest = await _run_pipeline(
+            sases_crew.register_exam, template_path, teacher_path, layout_path,
+            name=name, job_id=_new_request_id(), work_dir=work_dir
+        )
+        return JSONResponse({
+            "success": True,
+            "exam_id": manifest["exam_id"],
+            "exam": manifest
+        })
+
+    except Exception as e:
+        return _error_response(e)
+
+    finally:
+        _remove_work_dir(work_dir)
+
+
+def _exam_manifest(exam_id: str):
+    try:
+        return sases_crew.exam_registry.get(exam_id)
+    except ValueError:
+        return None
+
+
+def _unknown_exam(exam_id: str) -> JSONResponse:
+    return JSONResponse({"success": False, "error": f"Unknown exam id: '{exam_id}'"}, status_code=404)
+
+
+@app.get("/api/v1/exams/{exam_id}")
+async def get_exam(exam_id: str):
+    manifest = _exam_manifest(exam_id)
+    if manifest is None:
+        return _unknown_exam(exam_id)
+    return JSONResponse({"success": True, "exam": manifest})
+
+
+@app.post("/api/v1/exams/{exam_id}/evaluate")
+async def evaluate_exam_sheet(
+    exam_id: str,
+    student_sheet: UploadFile = File(...),
+    student_id: str = Form(None),   # Defaults to the sheet's file name
+    replace: bool = Form(False),    # Replace the sheet already stored for this student
+    include_insights: bool = Form(True),
+    force_stages: str = Form(None)
+):
+    """
+    Grade one student sheet against a registered exam (no teacher-side work).
+    409 if another sheet is already stored for the student and `replace` is not set.
+    """
+    try:
+        force_stages = _parse_force_stages(force_stages)
+    except ValueError as e:
+        return _bad_request(e)
+    # Reject unknown exams before accepting the upload
+    if _exam_manifest(exam_id) is None:
+        return _unknown_exam(exam_id)
+
+    work_dir = _new_work_dir("student_")
+    try:
+        student_path = await _save_upload(student_sheet, work_dir, student_sheet.filename)
+        result = await _run_pipeline(
+            sases_crew.grade_exam_student, exam_id, student_path, include_insights,
+            job_id=_new_request_id(), force_stages=force_stages,
+            student_id=student_id or student_id_from_sheet(os.path.basename(student_sheet.filename)),
+            replace=replace, work_dir=work_dir
+        )
+        return JSONResponse({"success": True, "result": result})
+
+    except UnknownExamError:
+        return _unknown_exam(exam_id)
+
+    except Exception as e:
+        return _error_response(e)
+
+    finally:
+        _remove_work_dir(work_dir)
+
+
+@app.post("/api/v1/exams/{exam_id}/evaluate/batch")
+async def evaluate_exam_batch(
+    exam_id: str,
+    student_sheets: List[UploadFile] = File(None),
+    student_zip: UploadFile = File(None),
+    replace: bool = Form(False),  # Replace the sheets already stored for these students
+    include_insights: bool = Form(False)
+):
+    """
+    Grade a class against a registered exam. Students are named after the
+    uploaded file names (or their paths in the zip); a sheet whose student
+    already has another sheet stored fails, unless `replace` is set.
+    """
+    if not student_sheets and not student_zip:
+        return JSONResponse({"success": False, "error": MISSING_STUDENTS_ERROR}, status_code=400)
+    if _exam_manifest(exam_id) is None:
+        return _unknown_exam(exam_id)
+
+    batch_dir = _new_work_dir("batch_")
+    try:
+        sheet_paths = await _student_sheets(batch_dir, student_sheets, student_zip)
+
+        def grade_batch():
+            key_context = sases_crew.load_exam(exam_id)
+            return sases_crew.process_class_batch(
+                template_path=key_context["template_path"],
+                teacher_sheet_path=None,
+                student_sheet_paths=sheet_paths,
+                include_insights=include_insights,
+                key_context=key_context,
+                job_id=_new_request_id(),
+                replace=replace
+            )
+
+        result = await _run_pipeline(grade_batch, work_dir=batch_dir)
+        return JSONResponse(result, status_code=200 if result["success"] else 500)
+
+    except UnknownExamError:
+        return _unknown_exam(exam_id)
+
+    except Exception as e:
+        return _error_response(e)
+
+    finally:
+        _remove_work_dir(batch_dir)
+
+@app.post("/api/v1/exams/{exam_id}/regrade")
+async def regrade_exam(
+    exam_id: str,
+    answer_key: UploadFile = File(None)  # Corrected answer key JSON; omit to re-grade with the stored key
+):
+    """
+    Re-grade every stored student of an exam from their stored answers
+    (no alignment, OCR or LLM calls). Only changed reports are rewritten.
+    """
+    if _exam_manifest(exam_id) is None:
+        return _unknown_exam(exam_id)
+
+    key_data = None
+    if answer_key is not None:
+        try:
+            key_data = json.loads(await answer_key.read())
+        except ValueError:
+            return JSONResponse({"success": False, "error": "'answer_key' must be a JSON file."}, status_code=400)
+        if not isinstance(key_data, dict):
+            return JSONResponse({"success": False, "error": "'answer_key' must be a JSON object."}, status_code=400)
+
+    try:
+        result = await _run_pipeline(sases_crew.regrade_exam, exam_id, key_data)
+        return JSONResponse(result)
+
+    except UnknownExamError:
+        return _unknown_exam(exam_id)
+
+    except ValueError as e:  # A malformed corrected key
+        return _bad_request(e)
+
+    except Exception as e:
+        return _error_response(e)
+
+# --- Job queue: submit now, poll for the result ---
+
+@app.post("/api/v1/jobs", status_code=202)
+async def submit_job(
+    student_sheet: UploadFile = File(...),
+    template: UploadFile = File(None),       # Template and teacher sheet...
+    teacher_sheet: UploadFile = File(None),
+    exam_id: str = Form(None),               # ...or a registered exam
+    student_id: str = Form(None),            # Exam jobs: defaults to the sheet's file name
+    replace: bool = Form(False),             # Exam jobs: replace the sheet stored for this student
+    mode: str = Form(None),
+    layout: UploadFile = File(None),
+    include_insights: bool = Form(True),
+    force_stages: str = Form(None)
+):
+    """
+    Store the inputs and queue an evaluation for the workers.
+    Returns a job id right away; poll GET /api/v1/jobs/{job_id}.
+    A retried attempt resumes from the stages the failed one checkpointed.
+    """
+    try:
+        force_stages = _parse_force_stages(force_stages)
+    except ValueError as e:
+        return _bad_request(e)
+    if exam_id:
+        if _exam_manifest(exam_id) is None:
+            return _unknown_exam(exam_id)
+    elif not template or not teacher_sheet:
+        return JSONResponse(
+            {"success": False, "error": "Provide 'template' and 'teacher_sheet', or an 'exam_id'."},
+            status_code=400
+        )
+
+    job_id = new_job_id()
+    job_dir = os.path.join(config.JOB_DIR, job_id)
+    inputs_dir = os.path.join(job_dir, "inputs")
+    os.makedirs(inputs_dir)
+
+    try:
+        payload = {
+            "inputs_dir": inputs_dir,
+            "student_sheet_path": await _save_upload(student_sheet, inputs_dir, f"student_{student_sheet.filename}"),
+            "force_stages": force_stages,
+        }
+        if exam_id:
+            kind = "exam_evaluate"
+            payload.update(
+                exam_id=exam_id, include_insights=include_insights, replace=replace,
+                student_id=student_id or student_id_from_sheet(os.path.basename(student_sheet.filename))
+            )
+        else:
+            kind = "evaluate"
+            payload.update(
+                template_path=await _save_upload(template, inputs_dir, f"template_{template.filename}"),
+                teacher_sheet_path=await _save_upload(teacher_sheet, inputs_dir, f"teacher_{teacher_sheet.filename}"),
+                layout_path=await _save_upload(layout, inputs_dir, f"layout_{layout.filename}") if layout else None,
+                mode=mode
+            )
+        job_queue.enqueue(kind, payload, job_id=job_id)
+
+    except Exception as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return _error_response(e)
+
+    return JSONResponse({"success": True, "job_id": job_id, "status": "queued"}, status_code=202)
+
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, per-stage progress and (once done) the final result of a job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse({"success": False, "error": f"Unknown job id: '{job_id}'"}, status_code=404)
+    job.pop("payload")  # Server-side paths
+    job.pop("worker_id")
+    return JSONResponse({"success": True, "job": job})
+
+
+_startup = {"ready_seconds": None, "warm": False}
+
+
+def _warm_up():
+    started = time.perf_counter()
+    try:
+        sases_crew.warm_up()
+        _startup["warm"] = True
+        print(f"[api] Warmed up in {elapsed(started):.2f}s")
+    except Exception as e:
+        print(f"[api] Warm-up failed (first request will retry): {e}")
+
+
+@app.on_event("startup")
+async def on_startup():
+    _startup["ready_seconds"] = round(report_startup("api"), 3)
+    if config.WARM_UP_ON_START:
+        # Off the event loop: the server accepts requests while the heavy imports load
+        threading.Thread(target=_warm_up, name="sases-warm-up", daemon=True).start()
+
+
+@app.get("/api/v1/llm/usage")
+async def llm_usage(job_id: str = None):
+    """LLM calls, tokens, cache hits and latency: for one job (per stage), or for this process."""
+    if job_id:
+        usage = usage_tracker.job_usage(job_id)
+        if usage is None:
+            return JSONResponse({"success": False, "error": f"No LLM usage recorded for job '{job_id}'"},
+                                status_code=404)
+        return JSONResponse({"success": True, "job_id": job_id, "usage": usage})
+
+    cache = None
+    if "agents.cached_llm" in sys.modules:  # Don't import crewai just to report an empty cache
+        cache = sys.modules["agents.cached_llm"].llm_cache_stats()
+    return JSONResponse({"success": True, "usage": usage_tracker.totals(), "cache": cache})
+
+
+@app.get("/api/v1/ocr/cache")
+async def ocr_cache():
+    """Entries, size and hit/miss counters of the persistent OCR cache."""
+    if "tools.azure_ocr_tool" in sys.modules:
+        stats = sys.modules["tools.azure_ocr_tool"].ocr_cache_stats()
+    elif config.OCR_CACHE_ENABLED:
+        # No OCR has run in this process yet: report the stored entries without loading the Azure SDK
+        stats = OCRCache(config.OCR_CACHE_PATH).stats()
+    else:
+        stats = None
+    return JSONResponse({"success": True, "enabled": config.OCR_CACHE_ENABLED, "cache": stats})
+
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "startup": _startup}
 
 if __name__ == "__main__":
     import uvicorn
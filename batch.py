@@ -0,0 +1,287 @@
+# batch.py
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Iterable, List
+
+import cv2
+
+from tools.alignment_tool import AlignmentTool, export_template_entries, load_template_entries
+from tools.class_evaluation import evaluate_class
+from utils import config
+from utils.artifact_store import atomic_write_json
+from utils.exam_registry import DuplicateStudentError, student_id_from_sheet
+from utils.hashing import bytes_sha256
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+STUDENTS_DIR = "students"
+CLASS_SUMMARY_FILE = "class_summary.json"
+
+
+# --- Alignment worker processes ---
+
+_worker_tool = None
+
+
+def _init_alignment_worker(template_entries: dict):
+    global _worker_tool
+    # The pool already has one process per core: more OpenCV threads per
+    # process would only oversubscribe the machine
+    cv2.setNumThreads(1)
+    load_template_entries(template_entries)
+    _worker_tool = AlignmentTool()
+
+
+def _align_in_worker(template_path: str, gray):
+    return _worker_tool.align(template_path, gray)
+
+
+class ProcessPoolAligner:
+    """
+    Drop-in for AlignmentTool.align() (see SASESCrew.grade_student's
+    `aligner`) that runs the CPU-bound alignment in a pool of processes,
+    each warmed with the template's precomputed features.
+    """
+
+    def __init__(self, template_path: str, workers: int):
+        # "spawn": the parent already runs threads (OCR event loop), which fork does not mix well with
+        self._pool = ProcessPoolExecutor(
+            max_workers=max(1, workers),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_alignment_worker,
+            initargs=(export_template_entries(template_path),)
+        )
+
+    def __call__(self, template_path: str, gray):
+        return self._pool.submit(_align_in_worker, template_path, gray).result()
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+# --- Progress ---
+
+class Progress:
+    """Prints done/total, throughput and ETA at most every `interval` seconds."""
+
+    def __init__(self, label: str, total: int, interval: float = 5.0):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.ok = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self._last_report = 0.0
+
+    @property
+    def done(self) -> int:
+        return self.ok + self.failed
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, ok: bool = True):
+        if ok:
+            self.ok += 1
+        else:
+            self.failed += 1
+        self.report(force=self.done == self.total)
+
+    def report(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        rate = self.rate
+        eta = (self.total - self.done) / rate if rate > 0 else 0
+        percent = self.done / self.total * 100 if self.total else 100.0
+        print(f"[{self.label}] {self.done}/{self.total} ({percent:.1f}%) ok={self.ok} failed={self.failed} "
+              f"| {rate:.2f} sheets/s | ETA {time.strftime('%H:%M:%S', time.gmtime(eta))}", flush=True)
+
+
+# --- Batch run ---
+
+def find_sheets(pattern: str) -> List[str]:
+    """Image files in a directory, or matching a glob ('scans/**/*.jpg')."""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def sheets_root(pattern: str) -> str:
+    """The directory `pattern` searches: the directory itself, or a glob's fixed leading part."""
+    if os.path.isdir(pattern):
+        return pattern
+    root = []
+    for part in pattern.replace("\\", "/").split("/"):
+        if glob.has_magic(part):
+            break
+        root.append(part)
+    else:
+        root.pop()  # A plain file path
+    return "/".join(root) or "."
+
+
+def student_names(paths: List[str], root: str) -> dict:
+    """
+    Sheets by student name: their path under `root`, so sheets with the
+    same file name in different folders ("classA/001.jpg",
+    "classB/001.jpg") stay apart. Raises ValueError if two sheets still
+    map to one name.
+    """
+    by_name = {}
+    for path in paths:
+        name = student_id_from_sheet(os.path.relpath(path, root))
+        if name in by_name:
+            raise ValueError(f"{path} and {by_name[name]} map to the same student name '{name}'; rename one of them.")
+        by_name[name] = path
+    return by_name
+
+
+def _load_json(path: str):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def run_batch(crew, sheets: str, output_dir: str, template_path: str = None, teacher_sheet_path: str = None,
+              layout_path: str = None, exam_id: str = None, align_workers: int = None, in_flight: int = None,
+              include_insights: bool = False, force_stages: Iterable[str] = ()) -> dict:
+    """
+    Grade every sheet matched by `sheets` (a directory or a glob) against
+    a template and teacher sheet, or a registered exam.
+
+    Each sheet's alignment and answers are written to
+    <output_dir>/students/<student>.json as soon as it is read (students
+    are named after the sheet's path under the searched directory, see
+    student_names()), and a restart skips the sheets that already have
+    one. Once every sheet is
+    read, the whole class is graded in one pass and the reports, the class
+    summary (<output_dir>/class_summary.json) and optional insights
+    (batched, see InsightService) are written.
+
+    Alignment runs in `align_workers` processes (default: one per core);
+    up to `in_flight` sheets are read at a time, so OCR requests overlap on
+    the shared async client while alignment keeps every core busy.
+    """
+    students_dir = os.path.join(output_dir, STUDENTS_DIR)
+    os.makedirs(students_dir, exist_ok=True)
+    # Stable across restarts, so the run's checkpoints stay referenced by one job
+    job_id = f"batch-{bytes_sha256(os.path.abspath(output_dir).encode())[:16]}"
+
+    def result_path(name):
+        return os.path.join(students_dir, f"{name}.json")
+
+    # --- Sheets, minus the ones a previous run already read ---
+    by_name = student_names(find_sheets(sheets), sheets_root(sheets))
+    pending = [(name, path) for name, path in by_name.items() if not os.path.exists(result_path(name))]
+    print(f"[batch] {len(by_name)} sheets: {len(by_name) - len(pending)} already done, {len(pending)} to read.")
+
+    key_context = crew.load_exam(exam_id) if exam_id else crew.prepare_answer_key(
+        template_path, teacher_sheet_path, layout_path, job_id, force_stages
+    )
+
+    # --- 1. Align (process pool) and read (threads, async OCR) every pending sheet ---
+    align_workers = align_workers or os.cpu_count() or 1
+    in_flight = in_flight or max(config.BATCH_MAX_WORKERS, 2 * align_workers)
+    failures = {}
+    read_progress = Progress("read", len(pending))
+    if pending:
+        aligner = ProcessPoolAligner(key_context["template_path"], align_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=in_flight) as executor:
+                futures = {
+                    executor.submit(
+                        crew.grade_student, key_context, path, job_id=job_id,
+                        force_stages=force_stages, evaluate=False, aligner=aligner, student_id=name
+                    ): (name, path)
+                    for name, path in pending
+                }
+                for future in as_completed(futures):
+                    name, path = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failures[name] = str(e)
+                        print(f"[batch] {path} failed: {e}")
+                        read_progress.update(ok=False)
+                        continue
+                    atomic_write_json(result_path(name), {
+                        "student": name,
+                        "sheet": path,
+                        "sheet_sha256": result["sheet_sha256"],
+                        "student_alignment": result["student_alignment"],
+                        "student_answers": result["student_answers"],
+                    })
+                    read_progress.update()
+        finally:
+            aligner.shutdown()
+
+    # --- 2. Grade the whole class (this run's and earlier runs' sheets) in one pass ---
+    names = [name for name in by_name if os.path.exists(result_path(name))]
+    records = [_load_json(result_path(name)) for name in names]
+    evaluation = evaluate_class(
+        key_context["answer_key"], [record["student_answers"] for record in records], failed=len(failures)
+    )
+    for name, record, report in zip(names, records, evaluation["reports"]):
+        if record.get("report") != report:
+            record["report"] = report
+            record.pop("insights", None)  # Written for the old report
+            atomic_write_json(result_path(name), record)
+        if exam_id:
+            try:
+                crew.exam_registry.save_student(
+                    exam_id, name, record["student_answers"], report, sheet_sha256=record.get("sheet_sha256")
+                )
+            except DuplicateStudentError as e:
+                failures[name] = str(e)
+                print(f"[batch] {record['sheet']} not stored with exam {exam_id}: {e}")
+    atomic_write_json(os.path.join(output_dir, CLASS_SUMMARY_FILE), evaluation["class_summary"])
+    if exam_id:
+        # Over every student stored with the exam, not just this run's
+        crew.refresh_exam_summary(exam_id)
+
+    # --- 3. Insights (batched per request, checkpointed and cached, so restarts are cheap) ---
+    missing = [(name, record) for name, record in zip(names, records) if include_insights and "insights" not in record]
+    if missing:
+        insight_progress = Progress("insights", len(missing))
+        # Written to disk chunk by chunk, so an interrupted run keeps what it got
+        chunk_size = max(1, config.INSIGHT_BATCH_SIZE * config.INSIGHT_MAX_CONCURRENCY)
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            try:
+                insights = crew.class_insights([record["report"] for _, record in chunk], job_id, force_stages)
+            except Exception as e:
+                print(f"[batch] Insights for {len(chunk)} students failed: {e}")
+                for _ in chunk:
+                    insight_progress.update(ok=False)
+                continue
+            for (name, record), student_insights in zip(chunk, insights):
+                record["insights"] = student_insights
+                atomic_write_json(result_path(name), record)
+                insight_progress.update()
+
+    if pending:
+        from tools.azure_ocr_tool import ocr_cache_stats
+        stats = ocr_cache_stats()
+        if stats:
+            print(f"[batch] OCR cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate'] * 100:.1f}%), {stats['entries']} entries.")
+
+    return {
+        "success": not failures,
+        "output_dir": output_dir,
+        "sheets": len(by_name),
+        "read": read_progress.ok,
+        "skipped": len(by_name) - len(pending),
+        "failed": failures,
+        "sheets_per_second": round(read_progress.rate, 2),
+        "class_summary": evaluation["class_summary"],
+    }
@@ -1,73 +1,308 @@
 import os
-from crewai import Crew, Process, Task 
-from agents.alignment_agent import create_alignment_agent
-from agents.ocr_agent import create_ocr_agent
-from agents.evaluation_agent import create_evaluation_agent
-from agents.insight_agent import create_insight_agent
-
-# --- 1. IMPORT THE NEW AGENT ---
-from agents.insight_agent import create_insight_agent
-
-# --- IMPORT ALL THE TASK FUNCTIONS ---
-from tasks.alignment_tasks import create_alignment_task
-from tasks.ocr_tasks import (
-    create_key_generation_task, 
-    create_student_extraction_task
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import cached_property
+from typing import Callable, Iterable, List
+
+import numpy as np
+
+# crewai (and LiteLLM), the agents, tasks and tools, OpenCV and the Azure SDK
+# are imported where they are first used, not here: importing this module
+# and building a SASESCrew stays cheap, so the API and workers start fast.
+from tools.class_evaluation import evaluate_class
+from tools.answer_key_index import compile_answer_key, matching_settings
+from tools.insight_service import InsightService
+from models.schemas import find_template_layout, load_template_layout
+from utils import config
+from utils.dag import run_dag, notify_stage, StageError
+from utils.exam_registry import (
+    DuplicateStudentError, ExamRegistry, UnknownExamError, normalize_student_id, student_id_from_sheet
+)
+from utils.pipeline_context import PipelineContext, load_sheet
+from utils.artifact_store import ArtifactStore
+from utils.hashing import bytes_sha256, file_sha256
+from utils.llm_usage import usage_scope, usage_tracker
+
+
+# Bump a stage's version whenever its logic changes: its checkpoints (and,
+# through the content hashes, those of every later stage) stop matching.
+STAGE_VERSIONS = {
+    "alignment": "2",
+    "answers": "1",  # Plus the OCR parsing version, see _direct_extract()
+    "report": "2",
+    "insights": "2",
+    "validation": "1",
+}
+
+# Pipeline stage -> kind of work (teacher and student sheets share a kind,
+# so the same sheet is never aligned or read twice)
+STAGE_KINDS = {
+    "teacher_alignment": "alignment",
+    "student_alignment": "alignment",
+    "answer_key": "answers",
+    "student_answers": "answers",
+}
+
+# Stages that can be forced to recompute (--force-stage / force_stages)
+CHECKPOINT_STAGES = (
+    "teacher_alignment", "student_alignment", "answer_key", "student_answers",
+    "report", "insights", "validation",
 )
-from tasks.evaluation_tasks import create_evaluation_task
 
-# --- 2. IMPORT THE NEW TASK ---
-from tasks.insight_tasks import create_insight_task
+
+def _alignment_settings() -> list:
+    """Every setting that changes an alignment: the engine, its fallback and the skip check."""
+    return [
+        config.ALIGNMENT_METHOD, config.ALIGNMENT_REFINE, config.ALIGNMENT_FALLBACK_METHOD,
+        config.ALIGNMENT_SKIP_CHECK, config.ALIGNMENT_SKIP_TOLERANCE_PX, config.ALIGNMENT_SKIP_MIN_CORRELATION,
+    ]
+
+
+def _artifact_keys(template_path: str, teacher_sheet_path: str = None,
+                   student_sheet_path: str = None, layout_path: str = None) -> dict:
+    """
+    Artifact store names for one run, derived from the content of its
+    inputs (not their file names), so identical inputs share artifacts.
+    Also returns those content hashes (`*_sha256`).
+    """
+    template = file_sha256(template_path)
+    layout = file_sha256(layout_path) if layout_path else "no-layout"
+    alignment = ":".join(str(setting) for setting in _alignment_settings())
+
+    keys = {"template_sha256": template, "layout_sha256": layout}
+    for role, sheet_path in (("teacher", teacher_sheet_path), ("student", student_sheet_path)):
+        if sheet_path is None:
+            continue
+        sheet = file_sha256(sheet_path)
+        keys[f"{role}_sha256"] = sheet
+        ext = os.path.splitext(sheet_path)[1].lower() or ".jpg"
+        keys[f"{role}_aligned"] = ArtifactStore.key("aligned", template, sheet, alignment, ext=ext)
+        keys[f"{role}_answers"] = ArtifactStore.key("answers", template, sheet, layout, alignment)
+    if teacher_sheet_path and student_sheet_path:
+        keys["report"] = ArtifactStore.key("report", keys["teacher_answers"], keys["student_answers"])
+        keys["insights"] = ArtifactStore.key("insights", keys["report"])
+    return keys
+
+
+def _answer_key_digest(answer_key: dict) -> str:
+    return bytes_sha256(json.dumps(answer_key, sort_keys=True).encode())
+
+
+def _result_digest(result) -> str:
+    """Content hash of a stage result, ignoring fields that change on every run."""
+    if isinstance(result, dict):
+        result = {k: v for k, v in result.items() if k not in ("aligned_image_path", "alignment_ms")}
+    return bytes_sha256(json.dumps(result, sort_keys=True, default=str).encode())
+
+
+def _student_id(student_id: str, sheet_path: str) -> str:
+    """`student_id` if given, else the one the sheet's file name implies."""
+    return normalize_student_id(student_id) if student_id else student_id_from_sheet(os.path.basename(sheet_path))
+
+
+def _new_job_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _charged_to_stages(job_id: str, stages: dict) -> dict:
+    """Wrap run_dag() stages so the LLM calls each one makes are counted against its name."""
+    def charged(name, fn):
+        def run(done):
+            with usage_scope(job_id, name):
+                return fn(done)
+        return run
+
+    return {name: (dependencies, charged(name, fn)) for name, (dependencies, fn) in stages.items()}
+
+
+def _print_llm_usage(job_id: str) -> None:
+    usage = usage_tracker.job_usage(job_id)
+    if usage is None:
+        return
+    for stage, counters in usage["stages"].items():
+        print(f"[LLM usage] {job_id} {stage}: {counters['calls']} calls ({counters['cache_hits']} cached), "
+              f"{counters['prompt_tokens']} prompt + {counters['completion_tokens']} completion tokens"
+              + (f" (estimated for {counters['estimated_calls']} calls)" if counters["estimated_calls"] else "")
+              + f", {counters['latency_seconds']:.1f}s")
 
 
 class SASESCrew:
     def __init__(self):
-        # Create agents
-        self.alignment_agent = create_alignment_agent()
-        self.ocr_agent = create_ocr_agent()
-        self.evaluation_agent = create_evaluation_agent()
-        self.validation_agent = create_insight_agent()
-        
-        # --- 3. ADD THE NEW AGENT ---
-        self.insight_agent = create_insight_agent()
+        # Agents and tools are built on first use (see the properties below)
+
+        # Exams whose template and answer key were processed once and stored
+        self.exam_registry = ExamRegistry(config.EXAM_REGISTRY_DIR)
+
+        # Content-addressed outputs, referenced per job and evicted by age/size
+        self.artifact_store = ArtifactStore(
+            config.ARTIFACT_DIR,
+            max_bytes=config.ARTIFACT_MAX_MB * 1024 * 1024,
+            ttl_seconds=config.ARTIFACT_TTL_DAYS * 24 * 3600
+        )
+
+        # "crew" mode drives the shared agents below, so one run at a time.
+        # "direct" mode builds its LLM agents per run and can run concurrently.
+        self._crew_mode_lock = threading.Lock()
+
+    # --- Agents ("crew" mode), built on first use ---
+
+    @cached_property
+    def alignment_agent(self):
+        from agents.alignment_agent import create_alignment_agent
+        return create_alignment_agent()
+
+    @cached_property
+    def ocr_agent(self):
+        from agents.ocr_agent import create_ocr_agent
+        return create_ocr_agent()
+
+    # The student branch runs in parallel with the teacher branch,
+    # so it gets its own alignment and OCR agents
+    @cached_property
+    def student_alignment_agent(self):
+        from agents.alignment_agent import create_alignment_agent
+        return create_alignment_agent()
+
+    @cached_property
+    def student_ocr_agent(self):
+        from agents.ocr_agent import create_ocr_agent
+        return create_ocr_agent()
+
+    @cached_property
+    def evaluation_agent(self):
+        from agents.evaluation_agent import create_evaluation_agent
+        return create_evaluation_agent()
+
+    @cached_property
+    def insight_agent(self):
+        from agents.insight_agent import create_insight_agent
+        return create_insight_agent()
+
+    @property
+    def validation_agent(self):
+        # Validation runs after the insight task, never alongside it,
+        # so the two can share one agent
+        return self.insight_agent
+
+    # --- Tools for the "direct" mode (called without an agent in between) ---
+
+    @cached_property
+    def alignment_tool(self):
+        from tools.alignment_tool import AlignmentTool
+        return AlignmentTool()
+
+    @cached_property
+    def ocr_tool(self):
+        from tools.azure_ocr_tool import AzureOCRTool
+        return AzureOCRTool()
+
+    @cached_property
+    def evaluation_tool(self):
+        from tools.evaluation_tool import AnswerEvaluationTool
+        return AnswerEvaluationTool()
+
+    @cached_property
+    def insight_service(self):
+        # Stateless apart from its cache, so shared by concurrent runs
+        return InsightService()
+
+    def warm_up(self) -> None:
+        """
+        Build the direct-mode tools, the insight service and the shared LLM
+        client ahead of the first request (e.g. from a background thread
+        right after startup).
+        """
+        from agents.llm import get_llm
+
+        self.alignment_tool, self.ocr_tool, self.evaluation_tool, self.insight_service
+        get_llm()
     
     def process_answer_sheet(self, 
                              template_path: str,
                              teacher_sheet_path: str,
-                             student_sheet_path: str):
-        
-        # --- Define output file paths based on inputs ---
-        teacher_key_json_path = f"outputs/{os.path.splitext(os.path.basename(teacher_sheet_path))[0]}_key.json"
-        student_answers_json_path = f"outputs/{os.path.splitext(os.path.basename(student_sheet_path))[0]}_answers.json"
-        report_output_path = f"outputs/{os.path.splitext(os.path.basename(student_sheet_path))[0]}_report.json"
+                             student_sheet_path: str,
+                             mode: str = None,
+                             layout_path: str = None,
+                             job_id: str = None,
+                             on_stage: Callable = None,
+                             force_stages: Iterable[str] = ()):
+        """
+        Grade one student sheet against a teacher sheet. Outputs go to the
+        artifact store, referenced by `job_id` (a new id if not given).
+
+        In "direct" mode every stage is checkpointed, so a rerun resumes
+        from the first missing stage; `force_stages` recomputes the named
+        stages anyway (see CHECKPOINT_STAGES). "crew" mode always reruns
+        its agents.
+        """
+        mode = mode or config.PIPELINE_MODE
+        job_id = job_id or _new_job_id()
+        # Zone map of the template; defaults to <template>.layout.json if present
+        layout_path = layout_path or find_template_layout(template_path)
+
+        if mode == "direct":
+            return self.process_answer_sheet_direct(
+                template_path,
+                teacher_sheet_path,
+                student_sheet_path,
+                layout_path=layout_path,
+                job_id=job_id,
+                on_stage=on_stage,
+                force_stages=force_stages
+            )
+        if mode != "crew":
+            raise ValueError(f"Unknown pipeline mode: '{mode}'. Use 'crew' or 'direct'.")
+
+        from crewai import Task
+        from tasks.alignment_tasks import create_alignment_task
+        from tasks.ocr_tasks import create_key_generation_task, create_student_extraction_task
+        from tasks.evaluation_tasks import create_evaluation_task
+        from tasks.insight_tasks import create_insight_task
+
+        # --- Define output file paths based on input content ---
+        # The tools write these files themselves, so reserve them in the store
+        keys = _artifact_keys(template_path, teacher_sheet_path, student_sheet_path, layout_path)
+        paths = {
+            name: self.artifact_store.reserve(job_id, key)
+            for name, key in keys.items() if not name.endswith("_sha256")  # Input hashes, not artifacts
+        }
+        teacher_key_json_path = paths["teacher_answers"]
+        student_answers_json_path = paths["student_answers"]
+        report_output_path = paths["report"]
         
         # --- Alignment Phase (Tasks 1 & 2) ---
         teacher_alignment_task = create_alignment_task(
             self.alignment_agent,
             template_path,
             teacher_sheet_path,
-            sheet_type='teacher'
+            sheet_type='teacher',
+            output_path=paths["teacher_aligned"]
         )
         
         student_alignment_task = create_alignment_task(
-            self.alignment_agent,
+            self.student_alignment_agent,
             template_path,
             student_sheet_path,
-            sheet_type='student'
+            sheet_type='student',
+            output_path=paths["student_aligned"]
         )
         
         # --- OCR Phase (Tasks 3 & 4) ---
         key_generation_task = create_key_generation_task(
             self.ocr_agent,
             teacher_sheet_path,
-            teacher_key_json_path
+            teacher_key_json_path,
+            layout_path=layout_path
         )
         key_generation_task.context = [teacher_alignment_task]
         
         student_extraction_task = create_student_extraction_task(
-            self.ocr_agent,
+            self.student_ocr_agent,
             student_sheet_path,
-            student_answers_json_path
+            student_answers_json_path,
+            layout_path=layout_path
         )
         student_extraction_task.context = [student_alignment_task]
         
@@ -83,7 +318,8 @@ class SASESCrew:
         # --- 4. ADD THE NEW INSIGHT TASK (Now Task 6) ---
         insight_task = create_insight_task(
             self.insight_agent,
-            report_output_path  # It takes the report path as input
+            report_output_path,  # It takes the report path as input
+            insight_json_path=paths["insights"]
         )
         # Set dependency on the evaluation task
         insight_task.context = [evaluation_task]
@@ -110,28 +346,707 @@ class SASESCrew:
             ]
         )
         
-        # 6. ADD NEW AGENT AND TASK TO THE CREW
+        # --- Run the tasks as a DAG instead of Process.sequential ---
+        # The teacher branch (alignment -> key OCR) and the student branch
+        # (alignment -> student OCR) are independent until evaluation, so
+        # they run at the same time. Each branch has its own agents because
+        # an Agent is not safe to share between threads.
+        def run(agent, task):
+            return lambda _: self._kickoff_task(agent, task)
+
+        stages = {
+            "teacher_alignment": ([], run(self.alignment_agent, teacher_alignment_task)),
+            "student_alignment": ([], run(self.student_alignment_agent, student_alignment_task)),
+            "key_generation": (["teacher_alignment"], run(self.ocr_agent, key_generation_task)),
+            "student_extraction": (["student_alignment"], run(self.student_ocr_agent, student_extraction_task)),
+            "evaluation": (["key_generation", "student_extraction"], run(self.evaluation_agent, evaluation_task)),
+            "insight": (["evaluation"], run(self.insight_agent, insight_task)),
+            "validation": (["insight"], run(self.validation_agent, validation_task)),
+        }
+        def report_stage(name, result):
+            # The evaluation task's output is agent text; report the saved report instead
+            if name == "evaluation" and os.path.exists(report_output_path):
+                with open(report_output_path, 'r') as f:
+                    result = json.load(f)
+            on_stage(name, result)
+
+        with self._crew_mode_lock:
+            results = run_dag(
+                _charged_to_stages(job_id, stages), max_workers=config.MAX_PARALLEL_STAGES,
+                on_stage=report_stage if on_stage else None
+            )
+        _print_llm_usage(job_id)
+
+        # The validation task's output is the final result, as before
+        return results["validation"]
+
+    def process_answer_sheet_direct(self,
+                                    template_path: str,
+                                    teacher_sheet_path: str,
+                                    student_sheet_path: str,
+                                    run_validation: bool = None,
+                                    layout_path: str = None,
+                                    job_id: str = None,
+                                    on_stage: Callable = None,
+                                    force_stages: Iterable[str] = ()):
+        """
+        Deterministic pipeline: alignment, OCR and evaluation are plain tool
+        calls whose results are passed along in memory. Only the insight
+        stage (and, optionally, validation) goes through an LLM agent.
+
+        Each sheet is read and decoded once; aligned images and results
+        travel between stages in a PipelineContext. Intermediates are only
+        written (to the artifact store, under `job_id`) when
+        SASES_PERSIST_INTERMEDIATES is on.
+
+        With a template layout, OCR reads only the answer zones of the
+        aligned images; without one it reads the whole original sheet.
+
+        Each stage's output is checkpointed under a hash of its inputs and
+        its version (STAGE_VERSIONS). A rerun, e.g. after a failed LLM
+        call, resumes from the first stage without a valid checkpoint;
+        stages in `force_stages` are recomputed regardless.
+
+        `on_stage(name, result)` is called as each stage finishes.
+        """
+        if run_validation is None:
+            run_validation = config.DIRECT_RUN_VALIDATION
+
+        job_id = job_id or _new_job_id()
+        ctx = self._new_context(job_id, force_stages)
+        keys = _artifact_keys(template_path, teacher_sheet_path, student_sheet_path, layout_path)
+        layout = load_template_layout(layout_path) if layout_path else None
+
+        results = {"success": False, "mode": "direct", "job_id": job_id}
+
+        # --- Stage functions (each raises on failure) ---
+        def teacher_alignment(_):
+            return self._direct_align(ctx, "teacher", template_path, teacher_sheet_path, keys, "Teacher sheet")
+
+        def student_alignment(_):
+            return self._direct_align(ctx, "student", template_path, student_sheet_path, keys, "Student sheet")
+
+        def answer_key(done):
+            return self._direct_extract(
+                ctx, "teacher", layout, keys, done["teacher_alignment"], "Answer key"
+            )
+
+        def student_answers(done):
+            return self._direct_extract(
+                ctx, "student", layout, keys, done["student_alignment"], "Student"
+            )
+
+        def report(done):
+            return self._direct_evaluate(ctx, done["answer_key"], done["student_answers"], keys["report"])
+
+        def insights(done):
+            return self._direct_insights(ctx, done["report"], keys["insights"])
+
+        def validation(done):
+            return self._checkpointed(
+                ctx, "validation",
+                [_result_digest(done[name]) for name in sorted(done)],
+                lambda: run_validation_task(done)
+            )
+
+        def run_validation_task(done):
+            from crewai import Task
+            from agents.insight_agent import create_insight_agent
+
+            validation_agent = create_insight_agent()
+            validation_task = Task(
+                description=f"""
+                Review the complete evaluation and insight pipeline.
+                The results below were produced by deterministic tools.
+
+                Alignment (teacher): {json.dumps(done["teacher_alignment"])}
+                Alignment (student): {json.dumps(done["student_alignment"])}
+                Answer key (OCR): {json.dumps(done["answer_key"])}
+                Student answers (OCR): {json.dumps(done["student_answers"])}
+                Evaluation report: {json.dumps(done["report"])}
+                Insights: {json.dumps(done["insights"])}
+
+                Check alignment confidence.
+                Review OCR quality.
+                Validate evaluation results.
+                Flag cases needing manual review.
+                """,
+                agent=validation_agent,
+                expected_output="Final quality report as a JSON object, with a 'manual_review_needed' flag."
+            )
+            return self._run_single_task(validation_agent, validation_task)
+
+        # --- Teacher and student branches run in parallel ---
+        stages = {
+            "teacher_alignment": ([], teacher_alignment),
+            "student_alignment": ([], student_alignment),
+            "answer_key": (["teacher_alignment"], answer_key),
+            "student_answers": (["student_alignment"], student_answers),
+            "report": (["answer_key", "student_answers"], report),
+            "insights": (["report"], insights),
+        }
+        if run_validation:
+            stages["validation"] = (
+                ["teacher_alignment", "student_alignment", "answer_key",
+                 "student_answers", "report", "insights"],
+                validation
+            )
+
+        try:
+            results.update(run_dag(
+                _charged_to_stages(job_id, stages), max_workers=config.MAX_PARALLEL_STAGES, on_stage=on_stage
+            ))
+        except StageError as e:
+            results.update(e.results)
+            results["error"] = str(e.error)
+            results["llm_usage"] = usage_tracker.job_usage(job_id)
+            return results
+
+        results["success"] = True
+        results["llm_usage"] = usage_tracker.job_usage(job_id)
+        return results
+
+    # --- Class batches: one answer key, many students ---
+
+    def prepare_answer_key(self, template_path: str, teacher_sheet_path: str,
+                           layout_path: str = None, job_id: str = None,
+                           force_stages: Iterable[str] = ()) -> dict:
+        """
+        Run the teacher side once (alignment + key OCR) and return a key
+        context that grade_student() can reuse for any number of students.
+        """
+        layout_path = layout_path or find_template_layout(template_path)
+        layout = load_template_layout(layout_path) if layout_path else None
+
+        ctx = self._new_context(job_id or _new_job_id(), force_stages)
+        keys = _artifact_keys(template_path, teacher_sheet_path, layout_path=layout_path)
+        teacher_alignment = self._direct_align(ctx, "teacher", template_path, teacher_sheet_path, keys, "Teacher sheet")
+        answer_key = self._direct_extract(ctx, "teacher", layout, keys, teacher_alignment, "Answer key")
+        return {
+            "template_path": template_path,
+            "layout_path": layout_path,
+            "layout": layout,
+            "teacher_alignment": teacher_alignment,
+            "answer_key": answer_key,
+            "answer_key_digest": _answer_key_digest(answer_key),
+            # Only written to disk when intermediates are persisted
+            "answer_key_path": ctx.path(keys["teacher_answers"]),
+        }
+
+    def grade_student(self, key_context: dict, student_sheet_path: str,
+                      include_insights: bool = False, job_id: str = None,
+                      on_stage: Callable = None, force_stages: Iterable[str] = (),
+                      evaluate: bool = True, aligner: Callable = None, student_id: str = None) -> dict:
+        """
+        Align, OCR and evaluate one student sheet against a prepared key
+        (checkpointed per stage). With `evaluate=False` it stops after OCR,
+        for callers that grade many students at once.
+
+        The result is labelled with `student_id`, by default the sheet's
+        file name (see utils.exam_registry.student_id_from_sheet).
+
+        `aligner(template_path, gray) -> (result, aligned_image)` replaces
+        the in-thread AlignmentTool.align(), e.g. to run it in a process pool.
+        """
+        ctx = self._new_context(job_id or _new_job_id(), force_stages)
+        layout = key_context.get("layout")
+        if layout is None and key_context["layout_path"]:
+            layout = load_template_layout(key_context["layout_path"])
+
+        keys = _artifact_keys(
+            key_context["template_path"], student_sheet_path=student_sheet_path,
+            layout_path=key_context["layout_path"]
+        )
+        answer_key_digest = key_context.get("answer_key_digest") or _answer_key_digest(key_context["answer_key"])
+        keys["report"] = ArtifactStore.key("report", answer_key_digest, keys["student_answers"])
+        keys["insights"] = ArtifactStore.key("insights", keys["report"])
+
+        alignment = self._direct_align(
+            ctx, "student", key_context["template_path"], student_sheet_path, keys, "Student sheet", aligner
+        )
+        notify_stage(on_stage, "student_alignment", alignment)
+        student_answers = self._direct_extract(ctx, "student", layout, keys, alignment, "Student")
+        notify_stage(on_stage, "student_answers", student_answers)
+        student = _student_id(student_id, student_sheet_path)
+        if not evaluate:
+            return {
+                "student": student,
+                "sheet_sha256": keys["student_sha256"],
+                "success": True,
+                "student_alignment": alignment,
+                "student_answers": student_answers,
+            }
+
+        report = self._direct_evaluate(ctx, key_context["answer_key"], student_answers, keys["report"])
+        notify_stage(on_stage, "report", report)
+
+        result = {
+            "student": student,
+            "sheet_sha256": keys["student_sha256"],
+            "success": True,
+            "student_alignment": alignment,
+            "student_answers": student_answers,
+            "report": report,
+        }
+        if include_insights:
+            result["insights"] = self._direct_insights(ctx, report, keys["insights"])
+            notify_stage(on_stage, "insights", result["insights"])
+        return result
+
+    def process_class_batch(self,
+                            template_path: str,
+                            teacher_sheet_path: str,
+                            student_sheet_paths: Iterable[str],
+                            layout_path: str = None,
+                            include_insights: bool = False,
+                            max_workers: int = None,
+                            key_context: dict = None,
+                            job_id: str = None,
+                            force_stages: Iterable[str] = (),
+                            replace: bool = False) -> dict:
+        """
+        Grade a whole class against one template and one teacher key.
+
+        The key is processed once (or taken from `key_context`, e.g. a
+        registered exam), then students are fanned out over a worker pool
+        for alignment and OCR. `student_sheet_paths` is consumed lazily and
+        at most `max_workers` sheets are in flight at a time, so it can be a
+        generator that extracts sheets on demand. Its items are sheet paths
+        or `(student_id, path)` pairs.
+
+        The answers of the whole class are then graded in one vectorized
+        pass (see tools/class_evaluation.py), which also yields the item
+        analysis, and insights (if requested) are fanned out again.
+
+        For a registered exam, each student is stored with the exam: a
+        student id used twice in the batch, or already holding another
+        sheet (unless `replace`), fails that student. The exam's class
+        summary is recomputed over every stored student
+        ("exam_class_summary"), not just this batch.
+        """
+        max_workers = max(1, max_workers or config.BATCH_MAX_WORKERS)
+        job_id = job_id or _new_job_id()  # One job holds every artifact of the batch
+
+        if key_context is None:
+            try:
+                key_context = self.prepare_answer_key(
+                    template_path, teacher_sheet_path, layout_path, job_id, force_stages
+                )
+            except Exception as e:
+                return {"success": False, "error": str(e), "students": [], "class_summary": None}
+        exam_id = key_context.get("exam_id")
+
+        def grade(index, student, path):
+            try:
+                if exam_id and not replace:
+                    # Fail before alignment and OCR rather than when storing the student
+                    self.exam_registry.check_student(exam_id, student, file_sha256(path))
+                result = self.grade_student(
+                    key_context, path, job_id=job_id, force_stages=force_stages, evaluate=False,
+                    student_id=student
+                )
+            except Exception as e:
+                result = {"student": student, "success": False, "error": str(e)}
+            result["index"] = index
+            return result
+
+        students = enumerate(student_sheet_paths)
+        seen = set()
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = set()
+
+            def submit_next():
+                for index, item in students:
+                    student_id, path = item if isinstance(item, tuple) else (None, item)
+                    student = _student_id(student_id, path)
+                    if exam_id and student in seen:
+                        results.append({
+                            "student": student, "success": False, "index": index,
+                            "error": f"Student id '{student}' is used by more than one sheet in this batch.",
+                        })
+                        continue
+                    seen.add(student)
+                    running.add(executor.submit(grade, index, student, path))
+                    return
+
+            for _ in range(max_workers):
+                submit_next()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.remove(future)
+                    results.append(future.result())
+                    submit_next()
+
+        results.sort(key=lambda r: r["index"])
+        graded = [r for r in results if r["success"]]
+        evaluation = evaluate_class(
+            key_context["answer_key"], [r["student_answers"] for r in graded],
+            failed=len(results) - len(graded)
+        )
+        for result, report in zip(graded, evaluation["reports"]):
+            result["report"] = report
+
+        exam_summary = None
+        if exam_id:
+            # Kept with the exam, so it can be re-graded without OCR
+            for result in graded:
+                try:
+                    self.exam_registry.save_student(
+                        exam_id, result["student"], result["student_answers"], result["report"],
+                        sheet_sha256=result["sheet_sha256"], replace=replace
+                    )
+                except DuplicateStudentError as e:  # Stored by another upload since the check
+                    result.update(success=False, error=str(e))
+                    del result["report"]
+            graded = [r for r in graded if r["success"]]
+            exam_summary = self.refresh_exam_summary(exam_id)
+
+        if include_insights and graded:
+            try:
+                for result, insights in zip(graded, self.class_insights(
+                        [r["report"] for r in graded], job_id, force_stages)):
+                    result["insights"] = insights
+            except Exception as e:
+                for result in graded:
+                    result["insights_error"] = str(e)
+
+        return {
+            "success": True,
+            "job_id": job_id,
+            "answer_key": key_context["answer_key"],
+            "students": results,
+            "class_summary": evaluation["class_summary"],
+            "exam_class_summary": exam_summary,
+            "llm_usage": usage_tracker.job_usage(job_id),
+        }
+
+    def student_insights(self, report: dict, job_id: str = None, force_stages: Iterable[str] = ()):
+        """Insights for one evaluation report (checkpointed; raises on failure)."""
+        return self.class_insights([report], job_id, force_stages)[0]
+
+    def class_insights(self, reports: List[dict], job_id: str = None,
+                       force_stages: Iterable[str] = ()) -> List[dict]:
+        """Insights for many evaluation reports, in order (checkpointed; raises on failure)."""
+        ctx = self._new_context(job_id or _new_job_id(), force_stages)
+        insights = self._direct_class_insights(ctx, reports)
+        for report, result in zip(reports, insights):
+            ctx.put_result("insights", result, ArtifactStore.key("insights", _result_digest(report)))
+        return insights
+
+    # --- Registered exams: teacher side done once, reused across days ---
+
+    def register_exam(self, template_path: str, teacher_sheet_path: str,
+                      layout_path: str = None, name: str = None, job_id: str = None) -> dict:
+        """
+        Run alignment and key OCR for an exam once and store the template,
+        its precomputed features, the zone layout and the parsed key.
+        Returns the exam manifest, including its `exam_id`.
+        """
+        from tools.alignment_tool import export_template_entries
+
+        key_context = self.prepare_answer_key(template_path, teacher_sheet_path, layout_path, job_id)
+        return self.exam_registry.register(
+            template_path,
+            key_context["answer_key"],
+            export_template_entries(template_path),
+            layout_path=key_context["layout_path"],
+            teacher_alignment=key_context["teacher_alignment"],
+            name=name
+        )
+
+    def load_exam(self, exam_id: str) -> dict:
+        """Key context of a registered exam, with its template features cached in memory."""
+        key_context = self.exam_registry.key_context(exam_id)
+        if key_context is None:
+            raise UnknownExamError(f"Unknown exam id: '{exam_id}'")
+        if not self.exam_registry.features_loaded(exam_id):
+            from tools.alignment_tool import load_template_entries
+            load_template_entries(self.exam_registry.template_features(exam_id))
+            self.exam_registry.mark_features_loaded(exam_id)
+        if key_context["layout_path"]:
+            key_context["layout"] = load_template_layout(key_context["layout_path"])
+        key_context["answer_key_digest"] = _answer_key_digest(key_context["answer_key"])
+        return key_context
+
+    def grade_exam_student(self, exam_id: str, student_sheet_path: str,
+                           include_insights: bool = True, job_id: str = None,
+                           on_stage: Callable = None, force_stages: Iterable[str] = (),
+                           student_id: str = None, replace: bool = False) -> dict:
+        """
+        Grade one student sheet against a registered exam and keep its
+        answers with the exam, under `student_id` (default: the sheet's
+        file name). Raises DuplicateStudentError if another sheet is stored
+        under that id, unless `replace` is set.
+        """
+        key_context = self.load_exam(exam_id)
+        student = _student_id(student_id, student_sheet_path)
+        if not replace:
+            self.exam_registry.check_student(exam_id, student, file_sha256(student_sheet_path))
+        result = self.grade_student(
+            key_context, student_sheet_path, include_insights, job_id, on_stage, force_stages,
+            student_id=student
+        )
+        self.exam_registry.save_student(
+            exam_id, student, result["student_answers"], result["report"],
+            sheet_sha256=result["sheet_sha256"], replace=replace
+        )
+        self.refresh_exam_summary(exam_id)
+        return result
+
+    def refresh_exam_summary(self, exam_id: str) -> dict:
+        """Recompute and store an exam's class summary over every stored student (no OCR)."""
+        key_context = self.exam_registry.key_context(exam_id)
+        if key_context is None:
+            raise UnknownExamError(f"Unknown exam id: '{exam_id}'")
+        stored = self.exam_registry.student_answers(exam_id)
+        class_summary = evaluate_class(key_context["answer_key"], list(stored.values()))["class_summary"]
+        self.exam_registry.save_class_summary(exam_id, class_summary)
+        return class_summary
+
+    def regrade_exam(self, exam_id: str, answer_key: dict = None) -> dict:
+        """
+        Re-grade every stored student of an exam, optionally against a
+        corrected `answer_key` (which then replaces the stored one).
+
+        Works from the stored OCR answers only: no alignment, OCR or LLM
+        call. Only reports whose content changes are rewritten; the class
+        summary is always rewritten.
+        """
+        key_context = self.exam_registry.key_context(exam_id)
+        if key_context is None:
+            raise UnknownExamError(f"Unknown exam id: '{exam_id}'")
+        old_key = key_context["answer_key"]
+        if answer_key is None:
+            answer_key = old_key
+        elif answer_key != old_key:
+            try:
+                compile_answer_key(answer_key)  # Reject a malformed key before storing it
+            except (KeyError, TypeError, AttributeError) as e:
+                raise ValueError(f"Invalid answer key: {e!r}") from e
+            self.exam_registry.update_answer_key(exam_id, answer_key)
+
+        stored = self.exam_registry.student_answers(exam_id)
+        students = list(stored)
+        evaluation = evaluate_class(answer_key, [stored[student] for student in students])
+
+        changed = []
+        for student, report in zip(students, evaluation["reports"]):
+            if self.exam_registry.student_report(exam_id, student) != report:
+                self.exam_registry.save_student_report(exam_id, student, report)
+                changed.append({"student": student, "summary": report["summary"]})
+        self.exam_registry.save_class_summary(exam_id, evaluation["class_summary"])
+
+        return {
+            "success": True,
+            "exam_id": exam_id,
+            "answer_key_changed": answer_key != old_key,
+            "students_regraded": len(students),
+            "students_changed": changed,
+            "class_summary": evaluation["class_summary"],
+        }
+
+    # --- Direct-mode stage helpers (each raises on failure) ---
+
+    def _new_context(self, job_id, force_stages=()) -> PipelineContext:
+        # Intermediates stay in memory unless the debug/audit sink is on
+        store = self.artifact_store if config.PERSIST_INTERMEDIATES else None
+        unknown = set(force_stages) - set(CHECKPOINT_STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stage(s) to force: {sorted(unknown)}. "
+                             f"Use any of: {', '.join(CHECKPOINT_STAGES)}.")
+        return PipelineContext(store, job_id, force_stages)
+
+    def _checkpointed(self, ctx, stage, inputs, compute, valid=None):
+        """
+        Return a stage's output from its checkpoint, or compute it and
+        store a checkpoint. The checkpoint is keyed by the stage kind, its
+        version and `inputs` (content hashes of everything it depends on),
+        so it is invalidated as soon as any input or the stage logic changes.
+        """
+        if not config.CHECKPOINTS_ENABLED:
+            return compute()
+
+        found, result = self._read_checkpoint(ctx, stage, inputs, valid)
+        if found:
+            return result
+        result = compute()
+        self._write_checkpoint(ctx, stage, inputs, result)
+        return result
+
+    def _read_checkpoint(self, ctx, stage, inputs, valid=None, quiet=False):
+        """(True, result) for a valid checkpoint of the stage, else (False, None)."""
+        if not config.CHECKPOINTS_ENABLED or stage in ctx.force_stages:
+            return False, None
+        checkpoint = self.artifact_store.read_json(ctx.job_id, self._checkpoint_name(stage, inputs))
+        if checkpoint is not None and (valid is None or valid(checkpoint["result"])):
+            if not quiet:
+                print(f"[Checkpoint] Resuming '{stage}' from checkpoint.")
+            return True, checkpoint["result"]
+        return False, None
+
+    def _write_checkpoint(self, ctx, stage, inputs, result):
+        if config.CHECKPOINTS_ENABLED:
+            kind = STAGE_KINDS.get(stage, stage)
+            self.artifact_store.write_json(ctx.job_id, self._checkpoint_name(stage, inputs),
+                                           {"stage": kind, "version": STAGE_VERSIONS[kind], "result": result})
+
+    @staticmethod
+    def _checkpoint_name(stage, inputs):
+        kind = STAGE_KINDS.get(stage, stage)
+        return ArtifactStore.key(f"{kind}-checkpoint", STAGE_VERSIONS[kind], *inputs)
+
+    def _direct_align(self, ctx, role, template_path, sheet_path, keys, label, aligner=None):
+        aligned_key = keys[f"{role}_aligned"]
+        ctx.put_result(f"{role}_sheet_path", sheet_path)
+
+        def compute():
+            # The sheet is read and decoded once; OCR reuses the bytes and the aligned image
+            image_bytes, gray = load_sheet(sheet_path)
+            ctx.put_result(f"{role}_sheet_bytes", image_bytes)
+            try:
+                alignment, aligned_image = (aligner or self.alignment_tool.align)(template_path, gray)
+            except Exception as e:
+                raise RuntimeError(f"{label} alignment failed: {e}") from e
+
+            if alignment['alignment_skipped']:
+                # Already registered: the scan itself is the aligned image
+                ctx.put_image(f"{role}_aligned", aligned_image)
+                alignment['aligned_image_path'] = None
+            else:
+                alignment['aligned_image_path'] = ctx.put_image(f"{role}_aligned", aligned_image, aligned_key)
+            # The checkpoint keeps the transform, not the image: a resumed
+            # run re-warps the sheet (see _aligned_image())
+            alignment['aligned_shape'] = list(aligned_image.shape[:2])
+            return alignment
+
+        alignment = self._checkpointed(
+            ctx, f"{role}_alignment",
+            [keys["template_sha256"], keys[f"{role}_sha256"]] + _alignment_settings(),
+            compute
+        )
+        if alignment['alignment_skipped']:
+            alignment['aligned_image_path'] = sheet_path
+        return alignment
+
+    def _aligned_image(self, ctx, role, alignment):
+        """
+        The aligned image of a sheet: the one alignment produced in this
+        run or, when alignment came from a checkpoint, the sheet warped
+        again with the checkpointed transform.
+        """
+        image = ctx.image(f"{role}_aligned", None)
+        if image is not None:
+            return image
+
+        import cv2
+
+        image_bytes, gray = load_sheet(ctx.result(f"{role}_sheet_path"))
+        ctx.put_result(f"{role}_sheet_bytes", image_bytes)
+        if alignment['alignment_skipped']:
+            image = gray
+        else:
+            height, width = alignment['aligned_shape']
+            image = cv2.warpPerspective(gray, np.array(alignment['transform_matrix']), (width, height))
+        ctx.put_image(f"{role}_aligned", image)
+        return image
+
+    def _direct_extract(self, ctx, role, layout, keys, alignment, label):
+        from tools.azure_ocr_tool import PARSING_VERSION
+
+        stage = "answer_key" if role == "teacher" else "student_answers"
+
+        def compute():
+            if layout is not None:
+                # Zones are defined in template coordinates, so crop the aligned image
+                answers = self.ocr_tool.extract(image=self._aligned_image(ctx, role, alignment), layout=layout)
+            else:
+                image_bytes = ctx.result(f"{role}_sheet_bytes", None)
+                if image_bytes is None:  # Alignment came from a checkpoint
+                    with open(ctx.result(f"{role}_sheet_path"), "rb") as f:
+                        image_bytes = f.read()
+                answers = self.ocr_tool.extract(image_bytes=image_bytes)
+            return self._check(answers, f"{label} OCR failed")
+
+        answers = self._checkpointed(
+            ctx, stage,
+            [keys[f"{role}_sha256"], _result_digest(alignment), keys["layout_sha256"],
+             f"parsing{PARSING_VERSION}", config.OMR_FILL_THRESHOLD, config.OMR_MIN_MARGIN],
+            compute
+        )
+        ctx.put_result(f"{role}_answers", answers, keys[f"{role}_answers"])
+        return answers
+
+    def _direct_evaluate(self, ctx, answer_key, student_answers, key):
+        report = self._checkpointed(
+            ctx, "report",
+            [_result_digest(answer_key), _result_digest(student_answers), *matching_settings()],
+            lambda: self._check(self.evaluation_tool.evaluate(answer_key, student_answers), "Evaluation failed")
+        )
+        ctx.put_result("report", report, key)
+        return report
+
+    def _direct_insights(self, ctx, report, key):
+        insights = self._direct_class_insights(ctx, [report])[0]
+        ctx.put_result("insights", insights, key)
+        return insights
+
+    def _direct_class_insights(self, ctx, reports):
+        # Reports without a checkpoint go to the insight service together,
+        # so their LLM requests are batched and identical profiles asked once
+        insights = [None] * len(reports)
+        pending = []
+        for i, report in enumerate(reports):
+            found, result = self._read_checkpoint(
+                ctx, "insights", self._insight_inputs(report), self._insights_valid, quiet=True
+            )
+            if found:
+                insights[i] = result
+            else:
+                pending.append(i)
+        if len(pending) < len(reports):
+            print(f"[Checkpoint] Resuming 'insights' from checkpoint ({len(reports) - len(pending)}/{len(reports)}).")
+
+        if pending:
+            with usage_scope(ctx.job_id, "insights"):
+                generated = self.insight_service.generate([reports[i] for i in pending])
+            for i, result in zip(pending, generated):
+                insights[i] = result
+                if self._insights_valid(result):
+                    self._write_checkpoint(ctx, "insights", self._insight_inputs(reports[i]), result)
+        return insights
+
+    def _insight_inputs(self, report):
+        return [_result_digest(report), *self.insight_service.settings()]
+
+    def _insights_valid(self, insights):
+        # Template feedback that stood in for a failed LLM request is redone
+        return isinstance(insights, dict) and insights.get("generated_by") == self.insight_service.mode
+
+    @staticmethod
+    def _check(tool_result: dict, message: str) -> dict:
+        """Raise if a tool returned its error dict instead of a result."""
+        if tool_result.get('success') is False or "error" in tool_result:
+            raise RuntimeError(f"{message}: {tool_result.get('error')}")
+        return tool_result
+
+    def _kickoff_task(self, agent, task):
+        """
+        Run one task in its own single-task crew. Context tasks that ran
+        in another crew are still picked up through their stored output.
+        """
+        from crewai import Crew, Process
+
         crew = Crew(
-            agents=[
-                self.alignment_agent,
-                self.ocr_agent,
-                self.evaluation_agent,
-                self.insight_agent,  # <-- Added new agent
-                self.validation_agent
-            ],
-            tasks=[
-                teacher_alignment_task,
-                student_alignment_task,
-                key_generation_task,
-                student_extraction_task,
-                evaluation_task,
-                insight_task,  # <-- Added new task
-                validation_task
-            ],
+            agents=[agent],
+            tasks=[task],
             process=Process.sequential,
             verbose=True
         )
-        
-        result = crew.kickoff()
-        
-        return result
\ No newline at end of file
+        return crew.kickoff()
+
+    def _run_single_task(self, agent, task):
+        """Run one task with its agent and return the raw text output."""
+        output = self._kickoff_task(agent, task)
+        return getattr(output, "raw", str(output))
@@ -1,4 +1,7 @@
 # main.py
+from utils.startup import report_startup  # First, so the startup timer covers every import below (reads no env vars)
+
+import argparse
 import json
 from dotenv import load_dotenv
 
@@ -7,22 +10,24 @@ from dotenv import load_dotenv
 load_dotenv() 
 
 # 2. Import your main crew class
-from crew import SASESCrew
+from crew import SASESCrew, CHECKPOINT_STAGES
 
-def run_full_pipeline():
+def run_full_pipeline(mode=None, layout_path=None, force_stages=(),
+                      template_path=None, teacher_sheet_path=None, student_sheet_path=None):
     """
     Initializes and runs the complete SASESCrew pipeline.
     """
     
     # 3. Initialize the crew
-    print("Initializing SASESCrew with all agents...")
+    print("Initializing SASESCrew...")
     crew = SASESCrew()
+    report_startup("main")
     
     # --- Define Your Input Image Paths Here ---
     
-    TEMPLATE_PATH = "data/template.jpg"
-    TEACHER_SHEET_PATH = "data/teacher_key_sheet.jpg"
-    STUDENT_SHEET_PATH = "data/student_sheet_001.jpg"
+    TEMPLATE_PATH = template_path or "data/template.jpg"
+    TEACHER_SHEET_PATH = teacher_sheet_path or "data/teacher_key_sheet.jpg"
+    STUDENT_SHEET_PATH = student_sheet_path or "data/student_sheet_001.jpg"
     
     # -----------------------------------------
     
@@ -32,7 +37,10 @@ def run_full_pipeline():
     result = crew.process_answer_sheet(
         template_path=TEMPLATE_PATH,
         teacher_sheet_path=TEACHER_SHEET_PATH,
-        student_sheet_path=STUDENT_SHEET_PATH
+        student_sheet_path=STUDENT_SHEET_PATH,
+        mode=mode,
+        layout_path=layout_path,
+        force_stages=force_stages
     )
     
     # 5. Print the final result
@@ -43,8 +51,127 @@ def run_full_pipeline():
     try:
         print(json.dumps(result.model_dump(), indent=2))
     except AttributeError:
-        # Fallback for older crewAI versions
-        print(result)
+        # "direct" mode returns a plain dict; older crewAI versions return text
+        if isinstance(result, dict):
+            print(json.dumps(result, indent=2))
+        else:
+            print(result)
+
+def run_batch_pipeline(args):
+    """
+    Grade a directory or glob of student scans (see batch.py). Results are
+    written as sheets finish; rerunning the same command resumes.
+    """
+    from batch import run_batch
+
+    print("Initializing SASESCrew...")
+    crew = SASESCrew()
+    report_startup("main")
+    result = run_batch(
+        crew,
+        args.students,
+        args.output_dir,
+        template_path=args.template or "data/template.jpg",
+        teacher_sheet_path=args.teacher or "data/teacher_key_sheet.jpg",
+        layout_path=args.layout,
+        exam_id=args.exam,
+        align_workers=args.align_workers,
+        in_flight=args.in_flight,
+        include_insights=args.insights,
+        force_stages=args.force_stages
+    )
+    print("\n--- Batch Complete ---")
+    print(json.dumps({k: v for k, v in result.items() if k != "class_summary"}, indent=2))
+
+def run_regrade(exam_id, answer_key_path=None):
+    """
+    Re-grade a registered exam's stored students, optionally against a
+    corrected answer key JSON. No alignment, OCR or LLM calls.
+    """
+    answer_key = None
+    if answer_key_path:
+        with open(answer_key_path, 'r') as f:
+            answer_key = json.load(f)
+
+    crew = SASESCrew()
+    result = crew.regrade_exam(exam_id, answer_key)
+    print(f"Re-graded {result['students_regraded']} students, "
+          f"{len(result['students_changed'])} changed.")
+    print(json.dumps(result, indent=2))
 
 if __name__ == "__main__":
-    run_full_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the SASES evaluation pipeline.")
+    parser.add_argument(
+        "--mode",
+        choices=["crew", "direct"],
+        default=None,
+        help="'crew' runs every stage through its agent; 'direct' calls the "
+             "alignment/OCR/evaluation tools directly (default: SASES_PIPELINE_MODE)."
+    )
+    parser.add_argument(
+        "--layout",
+        default=None,
+        help="Template zone layout JSON (default: <template>.layout.json if it exists)."
+    )
+    parser.add_argument(
+        "--force-stage",
+        action="append",
+        choices=CHECKPOINT_STAGES,
+        default=[],
+        dest="force_stages",
+        help="Recompute this stage even if it has a valid checkpoint (repeatable; 'direct' mode)."
+    )
+    parser.add_argument(
+        "--regrade",
+        metavar="EXAM_ID",
+        default=None,
+        help="Re-grade the stored students of a registered exam instead of running the pipeline."
+    )
+    parser.add_argument(
+        "--answer-key",
+        default=None,
+        help="With --regrade: corrected answer key JSON that replaces the exam's key."
+    )
+    parser.add_argument("--template", default=None, help="Template image (default: data/template.jpg).")
+    parser.add_argument("--teacher", default=None, help="Teacher key sheet (default: data/teacher_key_sheet.jpg).")
+    parser.add_argument("--student", default=None, help="Student sheet (default: data/student_sheet_001.jpg).")
+
+    batch = parser.add_argument_group("batch mode (direct pipeline)")
+    batch.add_argument(
+        "--students",
+        default=None,
+        help="Directory or glob of student scans ('scans/**/*.jpg'); grades them all."
+    )
+    batch.add_argument(
+        "--exam",
+        default=None,
+        help="Registered exam id to grade against, instead of --template/--teacher."
+    )
+    batch.add_argument(
+        "--output-dir",
+        default="outputs/batch",
+        help="Where per-student results and the class summary are written (default: outputs/batch)."
+    )
+    batch.add_argument(
+        "--align-workers",
+        type=int,
+        default=None,
+        help="Alignment processes (default: one per CPU core)."
+    )
+    batch.add_argument(
+        "--in-flight",
+        type=int,
+        default=None,
+        help="Sheets read at the same time, i.e. concurrent OCR/LLM requests "
+             "(default: twice the alignment processes)."
+    )
+    batch.add_argument("--insights", action="store_true", help="Also generate LLM insights per student.")
+    args = parser.parse_args()
+    if args.regrade:
+        run_regrade(args.regrade, args.answer_key)
+    elif args.students:
+        run_batch_pipeline(args)
+    else:
+        run_full_pipeline(mode=args.mode, layout_path=args.layout, force_stages=args.force_stages,
+                          template_path=args.template, teacher_sheet_path=args.teacher,
+                          student_sheet_path=args.student)
\ No newline at end of file
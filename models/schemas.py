@@ -0,0 +1,65 @@
+# models/schemas.py
+import json
+import os
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class QuestionZone(BaseModel):
+    """One answer region on the template, in template pixel coordinates."""
+    question_id: str
+    type: Literal["multiple_choice", "fill_in_the_blanks"]
+    box: List[int] = Field(..., min_length=4, max_length=4, description="[x, y, width, height]")
+    # Prompt used as the key for fill-in-the-blank answers
+    prompt: Optional[str] = None
+    # Bubble boxes per option letter ({"A": [x, y, w, h], ...}). Questions
+    # with bubbles are read locally by OMR instead of OCR.
+    options: Optional[Dict[str, List[int]]] = None
+
+    @property
+    def is_bubble(self) -> bool:
+        return self.type == "multiple_choice" and bool(self.options)
+
+
+class TemplateLayout(BaseModel):
+    """Zone map of a template: where each question's answer is written."""
+    name: Optional[str] = None
+    questions: List[QuestionZone]
+
+    def zones(self, question_type: str = None) -> List[QuestionZone]:
+        return [q for q in self.questions if question_type is None or q.type == question_type]
+
+    def bubble_zones(self) -> List[QuestionZone]:
+        return [q for q in self.questions if q.is_bubble]
+
+    def text_zones(self) -> List[QuestionZone]:
+        return [q for q in self.questions if not q.is_bubble]
+
+
+def load_template_layout(layout_path: str) -> TemplateLayout:
+    with open(layout_path, 'r') as f:
+        return TemplateLayout(**json.load(f))
+
+
+def find_template_layout(template_path: str) -> Optional[str]:
+    """
+    Return the layout file that sits next to a template, if there is one.
+    e.g. data/template.jpg -> data/template.layout.json
+    """
+    layout_path = f"{os.path.splitext(template_path)[0]}.layout.json"
+    return layout_path if os.path.exists(layout_path) else None
+
+
+class StudentFeedback(BaseModel):
+    """The written part of a student's insights (the numbers come from the report)."""
+    id: int = Field(..., description="The id of the student profile this feedback is for")
+    overall_performance: str = Field(..., description="A 1-2 sentence summary")
+    strengths: List[str] = Field(..., description="What the student did well")
+    areas_for_improvement: List[str] = Field(..., description="Actionable advice")
+    motivational_feedback: str = Field(..., description="An encouraging closing remark")
+
+
+class InsightBatch(BaseModel):
+    """Structured LLM output for a batch of student profiles: one entry per profile."""
+    insights: List[StudentFeedback]
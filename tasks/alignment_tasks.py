@@ -2,14 +2,14 @@
 from crewai import Task
 import os
 
-def _get_output_path(input_path, suffix):
+def _get_output_path(input_path, suffix, output_dir="outputs"):
     """Helper to create a unique output path in the 'outputs' folder."""
     base_name = os.path.basename(input_path)
     file_name, _ = os.path.splitext(base_name)
     # e.g., outputs/aligned_student_sheet_001_student.jpg
-    return f"outputs/aligned_{file_name}_{suffix}.jpg"
+    return os.path.join(output_dir, f"aligned_{file_name}_{suffix}.jpg")
 
-def create_alignment_task(agent, template_path, sheet_path, sheet_type='student'):
+def create_alignment_task(agent, template_path, sheet_path, sheet_type='student', output_path=None):
     """
     Creates a task to align either a student or teacher sheet.
     
@@ -18,8 +18,10 @@ def create_alignment_task(agent, template_path, sheet_path, sheet_type='student'
         template_path: Path to the blank template image.
         sheet_path: Path to the sheet (student or teacher) to be aligned.
         sheet_type: A string ('student' or 'teacher') for naming the output.
+        output_path: Where to save the aligned image (e.g. an artifact
+            store path); defaults to a name derived from the sheet.
     """
-    output_image_path = _get_output_path(sheet_path, sheet_type)
+    output_image_path = output_path or _get_output_path(sheet_path, sheet_type)
     
     return Task(
         description=f"""
@@ -28,6 +30,7 @@ def create_alignment_task(agent, template_path, sheet_path, sheet_type='student'
         1.  **Template Path:** '{template_path}'
         2.  **Sheet Path:** '{sheet_path}'
         3.  **Output Path:** Save the aligned image to '{output_image_path}'
+            (pass `output_path='{output_image_path}'` to the tool)
         
         Use your 'ImageAlignmentTool' to perform the alignment.
         Your tool must return the 'aligned_image_path' in its output.
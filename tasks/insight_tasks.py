@@ -3,12 +3,12 @@ from crewai import Task
 import os
 import json
 
-def create_insight_task(agent, evaluation_report_path):
+def create_insight_task(agent, evaluation_report_path, insight_json_path=None):
     """
     Creates the task for generating insights from the evaluation report.
     """
     # Define the output path for the new insights JSON
-    insight_json_path = evaluation_report_path.replace("_report.json", "_insights.json")
+    insight_json_path = insight_json_path or evaluation_report_path.replace("_report.json", "_insights.json")
 
     return Task(
         description=f"""
@@ -2,9 +2,21 @@
 from crewai import Task
 import os
 
+def _layout_instructions(layout_path):
+    """Extra instructions when the template has a zone layout."""
+    if not layout_path:
+        return ""
+    return f"""
+        3.  **Template Layout:** This exam has a zone layout at:
+            '{layout_path}'
+            Instead of the original sheet, use the 'aligned_image_path'
+            reported by the alignment step as the input image, and pass
+            this file as the tool's `layout_path` argument.
+        """
+
 # --- TASK 1: FOR THE TEACHER'S KEY ---
 
-def create_key_generation_task(agent, teacher_sheet_path, key_output_path):
+def create_key_generation_task(agent, teacher_sheet_path, key_output_path, layout_path=None):
     """
     Creates the task for generating the master answer key from the teacher's sheet.
     """
@@ -15,7 +27,7 @@ def create_key_generation_task(agent, teacher_sheet_path, key_output_path):
             '{teacher_sheet_path}'
         2.  **Output JSON:** Save the extracted answers to this *exact* file path:
             '{key_output_path}'
-        
+        {_layout_instructions(layout_path)}
         Use your 'Azure OCR Tool' to process the image and save the formatted JSON.
         """,
         agent=agent,
@@ -24,7 +36,7 @@ def create_key_generation_task(agent, teacher_sheet_path, key_output_path):
 
 # --- TASK 2: FOR THE STUDENT'S SHEET ---
 
-def create_student_extraction_task(agent, student_sheet_path, student_output_path):
+def create_student_extraction_task(agent, student_sheet_path, student_output_path, layout_path=None):
     """
     Creates the task for extracting answers from the student's sheet.
     """
@@ -35,7 +47,7 @@ def create_student_extraction_task(agent, student_sheet_path, student_output_pat
             '{student_sheet_path}'
         2.  **Output JSON:** Save the extracted answers to this *exact* file path:
             '{student_output_path}'
-        
+        {_layout_instructions(layout_path)}
     Use your 'Azure OCR Tool' to process the image and save the formatted JSON.
     """,
         agent=agent,
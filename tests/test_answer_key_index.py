@@ -0,0 +1,98 @@
+# tests/test_answer_key_index.py
+# Answer normalization and matching of the compiled answer key
+import random
+
+import pytest
+
+from tools.answer_key_index import AnswerKeyIndex, BitParallelPattern, normalize_choice, normalize_text
+from tools.class_evaluation import AnswerMatrix
+
+# Fixed settings, so the thresholds below do not depend on the environment
+SETTINGS = {"fuzzy_ratio": 0.2, "fuzzy_min_length": 5, "numeric_tolerance": 0.0}
+
+
+def judge(written_answer, student_answer, **item):
+    """Whether `student_answer` is accepted for a one-question fill-in-the-blank key."""
+    key = {"fill_in_the_blanks": [
+        {"question_number": 1, "question_prompt": "Blank 1", "written_answer": written_answer, **item}
+    ]}
+    question = AnswerKeyIndex(key, **SETTINGS).questions[0]
+    return question.is_correct(question.normalize(student_answer))
+
+
+def levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def test_normalization():
+    assert normalize_text("  Ｐａｒｉｓ. ") == "paris"  # NFKC folds full-width letters
+    assert normalize_text("STRASSE") == normalize_text("straße")  # Case folding, not just lower()
+    assert normalize_text("New \t  York!") == "new york"
+    assert normalize_text(None) == ""
+    assert normalize_choice("(b)") == normalize_choice(" B. ") == "B"
+
+
+def test_case_and_spacing_do_not_matter():
+    assert judge("Paris", "  PARIS ")
+    assert judge("New York", "new   york.")
+
+
+def test_alternate_answers():
+    assert judge("colour | color", "Color")
+    assert judge("colour | color", "colour")
+    assert judge("colour", "hue", accepted_answers=["hue", "shade"])
+    assert not judge("colour | color", "paint")
+
+
+def test_numeric_answers_match_by_value():
+    assert judge("0.75", "3/4")
+    assert judge("1000", "1,000")
+    assert judge("3.14", "3.149", tolerance=0.01)
+    assert not judge("3.14", "3.16", tolerance=0.01)
+    assert not judge("3.14", "3.15")  # Default tolerance (0): exact value
+    # Numbers are never matched fuzzily, however close the digits
+    assert not judge("10000", "10001")
+
+
+def test_fuzzy_match_around_the_edit_threshold():
+    # 14 characters at a 0.2 edit ratio: up to 2 edits
+    assert judge("photosynthesis", "photosynthesis")
+    assert judge("photosynthesis", "fotosynthesis")     # 2 edits
+    assert judge("photosynthesis", "photosynthesi")     # 1 edit
+    assert not judge("photosynthesis", "fotosinthesis")  # 3 edits
+    # Shorter than fuzzy_min_length: exact only
+    assert not judge("cell", "cel")
+
+
+def test_bit_parallel_distance_is_levenshtein():
+    rng = random.Random(7)
+    for _ in range(300):
+        # Patterns beyond one machine word (64 characters) included
+        pattern = "".join(rng.choice("abcde") for _ in range(rng.randint(1, 80)))
+        text = "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 90)))
+        assert BitParallelPattern(pattern).distance(text) == levenshtein(pattern, text)
+
+
+@pytest.mark.parametrize("answer", [None, "", "   ", "..."])
+def test_blank_answers_are_unanswered(answer):
+    key = {"fill_in_the_blanks": [{"question_number": 1, "question_prompt": "Blank 1", "written_answer": "Paris"}]}
+    student = {"fill_in_the_blanks": [{"question_number": 1, "question_prompt": "Blank 1", "written_answer": answer}]}
+    report = AnswerMatrix(AnswerKeyIndex(key, **SETTINGS), [student]).report(0)
+    assert report["detailed_results"][0]["status"] == "unanswered"
+    assert report["summary"]["unanswered"] == 1
+
+
+def test_missing_answer_is_unanswered():
+    key = {
+        "multiple_choice": [{"question_number": 1, "selected_answer": "A"}],
+        "fill_in_the_blanks": [{"question_number": 2, "question_prompt": "Blank 2", "written_answer": "Paris"}],
+    }
+    report = AnswerMatrix(AnswerKeyIndex(key, **SETTINGS), [{}]).report(0)
+    assert [r["status"] for r in report["detailed_results"]] == ["unanswered", "unanswered"]
+    assert report["summary"]["accuracy_percent"] == "0.00%"
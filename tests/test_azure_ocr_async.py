@@ -0,0 +1,162 @@
+# tests/test_azure_ocr_async.py
+# AsyncOCRClient against a local stand-in for the Document Intelligence REST API
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+from azure.core.exceptions import HttpResponseError
+
+from tools.azure_ocr_async import AsyncOCRClient
+
+
+class FakeDocumentIntelligence:
+    """
+    Answers analyze requests the way the service does (202 + Operation-Location,
+    then a succeeded operation), after failing the first `failures` requests
+    with `failure_status`.
+    """
+
+    def __init__(self, failures: int = 0, failure_status: int = 429, retry_after: str = "0",
+                 analyze_delay: float = 0.0):
+        self.failures = failures
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.analyze_delay = analyze_delay
+        self.analyze_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if request.method == "POST" and request.path.endswith(":analyze"):
+            return await self._analyze(request)
+        if request.method == "GET" and "/analyzeResults/" in request.path:
+            return web.json_response({
+                "status": "succeeded",
+                "analyzeResult": {"apiVersion": "2024-11-30", "modelId": "prebuilt-layout", "content": "ok"},
+            })
+        return web.Response(status=404)
+
+    async def _analyze(self, request: web.Request) -> web.Response:
+        self.analyze_requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await request.read()
+            await asyncio.sleep(self.analyze_delay)
+            if self.analyze_requests <= self.failures:
+                return web.json_response(
+                    {"error": {"code": "TooManyRequests", "message": "Slow down"}},
+                    status=self.failure_status, headers={"Retry-After": self.retry_after}
+                )
+            operation = f"{request.url.origin()}/documentintelligence/documentModels/prebuilt-layout" \
+                        f"/analyzeResults/{self.analyze_requests}?api-version=2024-11-30"
+            return web.Response(status=202, headers={"Operation-Location": operation, "Retry-After": "0"})
+        finally:
+            self.in_flight -= 1
+
+
+@asynccontextmanager
+async def serve(fake: FakeDocumentIntelligence):
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", fake.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_analyze_succeeds():
+    async def scenario():
+        fake = FakeDocumentIntelligence()
+        async with serve(fake) as endpoint:
+            client = AsyncOCRClient(endpoint, "key")
+            try:
+                result = await client.analyze(b"image")
+            finally:
+                await client.close()
+        return fake, result
+
+    fake, result = run(scenario())
+    assert result.content == "ok"
+    assert fake.analyze_requests == 1
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_honor_retry_after(status):
+    async def scenario():
+        # A backoff this long would time the test out: only Retry-After keeps it fast
+        fake = FakeDocumentIntelligence(failures=2, failure_status=status, retry_after="0.1")
+        async with serve(fake) as endpoint:
+            client = AsyncOCRClient(endpoint, "key", max_retries=3, backoff_base=30.0)
+            try:
+                start = time.perf_counter()
+                result = await client.analyze(b"image")
+                elapsed = time.perf_counter() - start
+            finally:
+                await client.close()
+        return fake, result, elapsed
+
+    fake, result, elapsed = run(scenario())
+    assert result.content == "ok"
+    assert fake.analyze_requests == 3
+    assert 0.2 <= elapsed < 5.0
+
+
+def test_gives_up_after_max_retries():
+    async def scenario():
+        fake = FakeDocumentIntelligence(failures=100, failure_status=503)
+        async with serve(fake) as endpoint:
+            client = AsyncOCRClient(endpoint, "key", max_retries=2)
+            try:
+                with pytest.raises(HttpResponseError) as error:
+                    await client.analyze(b"image")
+            finally:
+                await client.close()
+        return fake, error.value
+
+    fake, error = run(scenario())
+    assert error.status_code == 503
+    assert fake.analyze_requests == 3  # The first try and two retries
+
+
+def test_non_retryable_status_is_not_retried():
+    async def scenario():
+        fake = FakeDocumentIntelligence(failures=100, failure_status=400)
+        async with serve(fake) as endpoint:
+            client = AsyncOCRClient(endpoint, "key", max_retries=3)
+            try:
+                with pytest.raises(HttpResponseError):
+                    await client.analyze(b"image")
+            finally:
+                await client.close()
+        return fake
+
+    assert run(scenario()).analyze_requests == 1
+
+
+def test_semaphore_caps_requests_in_flight():
+    async def scenario():
+        fake = FakeDocumentIntelligence(analyze_delay=0.1)
+        async with serve(fake) as endpoint:
+            client = AsyncOCRClient(endpoint, "key", max_concurrency=2)
+            try:
+                results = await asyncio.gather(*(client.analyze(b"image") for _ in range(6)))
+            finally:
+                await client.close()
+        return fake, results
+
+    fake, results = run(scenario())
+    assert len(results) == 6
+    assert fake.analyze_requests == 6
+    assert fake.max_in_flight == 2
@@ -0,0 +1,156 @@
+# tests/test_cached_llm.py
+# CachedLLM and InsightService against a fake crewai LLM (no model calls)
+import importlib
+import json
+import sys
+import types
+
+import pytest
+
+from utils import config
+from utils.llm_cache import LLMCacheMiss
+from utils.llm_usage import usage_scope, usage_tracker
+
+
+class FakeLLM:
+    """
+    Stands in for crewai.LLM: answers with the queued `responses`, in
+    order, and hands `usage` (if set) to the callbacks, as crewai does.
+    """
+
+    responses = []
+    requests = 0
+    usage = None
+
+    def __init__(self, model, temperature=None, api_key=None, response_format=None, **kwargs):
+        self.model = model
+        self.temperature = temperature
+        self.response_format = response_format
+
+    def call(self, messages, tools=None, callbacks=None, **kwargs):
+        FakeLLM.requests += 1
+        if FakeLLM.usage is not None:
+            for callback in callbacks or []:
+                callback.log_success_event(kwargs={"messages": messages}, response_obj={"usage": FakeLLM.usage},
+                                           start_time=0, end_time=0)
+        return FakeLLM.responses.pop(0)
+
+
+@pytest.fixture
+def cached_llm(tmp_path, monkeypatch):
+    """A freshly imported agents.cached_llm, with its cache in tmp_path."""
+    monkeypatch.setitem(sys.modules, "crewai", types.SimpleNamespace(LLM=FakeLLM))
+    monkeypatch.setitem(sys.modules, "litellm", types.SimpleNamespace(
+        token_counter=lambda model, messages=None, text=None: len(text or json.dumps(messages)) // 4
+    ))
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(config, "LLM_REPLAY_ONLY", False)
+    monkeypatch.setattr(FakeLLM, "responses", [])
+    monkeypatch.setattr(FakeLLM, "requests", 0)
+    monkeypatch.setattr(FakeLLM, "usage", None)
+    sys.modules.pop("agents.cached_llm", None)
+    module = importlib.import_module("agents.cached_llm")
+
+    import agents.llm
+    monkeypatch.setattr(agents.llm, "_clients", {})
+    yield module
+    sys.modules.pop("agents.cached_llm", None)
+
+
+def _feedback(profile_id):
+    return {
+        "id": profile_id,
+        "overall_performance": "Good.",
+        "strengths": ["Accuracy."],
+        "areas_for_improvement": ["Blanks."],
+        "motivational_feedback": "Keep going!",
+    }
+
+
+def _report(status):
+    return {
+        "summary": {"total_questions": 1, "correct_answers": int(status == "correct"),
+                    "wrong_answers": int(status == "wrong"), "unanswered": 0, "accuracy_percent": "100.00%"},
+        "detailed_results": [{"question": "MCQ 1", "status": status}],
+    }
+
+
+def test_responses_the_caller_rejects_are_not_cached(cached_llm):
+    FakeLLM.responses = ["not json", '{"ok": true}']
+    llm = cached_llm.CachedLLM(model="fake/model")
+
+    def is_json(response):
+        try:
+            json.loads(response)
+            return True
+        except ValueError:
+            return False
+
+    assert llm.call("prompt", cache_if=is_json) == "not json"
+    assert llm.call("prompt", cache_if=is_json) == '{"ok": true}'
+    assert llm.call("prompt", cache_if=is_json) == '{"ok": true}'  # From the cache
+    assert FakeLLM.requests == 2
+
+
+def test_incomplete_insight_batches_are_not_cached(cached_llm, monkeypatch):
+    from tools.insight_service import InsightService
+
+    monkeypatch.setattr(config, "INSIGHT_CACHE_ENABLED", False)  # Only the LLM response cache
+    partial = json.dumps({"insights": [_feedback(0)]})
+    complete = json.dumps({"insights": [_feedback(0), _feedback(1)]})
+    FakeLLM.responses = [partial, complete]
+    service = InsightService(mode="llm", batch_size=2, cache=None)
+    reports = [_report("correct"), _report("wrong")]
+
+    first = service.generate(reports)
+    assert [insight["generated_by"] for insight in first] == ["llm", "template"]
+    # The skipped profile is asked again instead of replaying the partial answer
+    second = service.generate(reports)
+    assert [insight["generated_by"] for insight in second] == ["llm", "llm"]
+    service.generate(reports)
+    assert FakeLLM.requests == 2
+
+
+def test_usage_is_the_providers_when_reported(cached_llm):
+    FakeLLM.responses = ["first", "second"]
+    llm = cached_llm.CachedLLM(model="fake/model")
+
+    FakeLLM.usage = types.SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+    with usage_scope("job-usage", "insights"):
+        llm.call("prompt one")
+        FakeLLM.usage = None  # No usage reported: estimated instead
+        llm.call("prompt two")
+        llm.call("prompt one")  # Cache hit
+
+    usage = usage_tracker.job_usage("job-usage")["total"]
+    assert usage["calls"] == 3
+    assert usage["cache_hits"] == 1
+    assert usage["estimated_calls"] == 1
+    assert usage["prompt_tokens"] == 120 + len("prompt two") // 4
+    assert usage["completion_tokens"] == 30 + len("second") // 4
+    assert usage["cached_tokens"] == 150
+
+
+def test_replay_answers_from_the_cache_only(cached_llm, monkeypatch):
+    FakeLLM.responses = ["recorded"]
+    llm = cached_llm.CachedLLM(model="fake/model")
+    assert llm.call("prompt") == "recorded"
+
+    monkeypatch.setenv("SASES_LLM_REPLAY", "1")
+    monkeypatch.setattr(config, "LLM_REPLAY_ONLY", config._env_bool("SASES_LLM_REPLAY", False))
+    assert llm.call("prompt") == "recorded"
+    with pytest.raises(LLMCacheMiss):
+        llm.call("a prompt that was never recorded")
+    assert FakeLLM.requests == 1
+
+
+def test_replay_miss_is_not_hidden_by_template_feedback(cached_llm, monkeypatch):
+    from tools.insight_service import InsightService
+
+    monkeypatch.setattr(config, "INSIGHT_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "INSIGHT_TEMPLATE_FALLBACK", True)
+    monkeypatch.setattr(config, "LLM_REPLAY_ONLY", True)
+    with pytest.raises(LLMCacheMiss):
+        InsightService(mode="llm", cache=None).generate([_report("correct")])
+    assert FakeLLM.requests == 0
@@ -0,0 +1,126 @@
+# tests/test_class_evaluation.py
+# Vectorized class grading against the single-sheet path, and the item statistics
+import importlib
+import random
+import sys
+import types
+
+import pytest
+
+from tools.answer_key_index import AnswerKeyIndex
+from tools.class_evaluation import evaluate_class
+
+KEY = {
+    "multiple_choice": [
+        {"question_number": n, "selected_answer": answer} for n, answer in enumerate("ABCDABCDAB", 1)
+    ],
+    "fill_in_the_blanks": [
+        {"question_number": 11, "question_prompt": "Capital of France", "written_answer": "Paris"},
+        {"question_number": 12, "question_prompt": "Spelling", "written_answer": "colour | color"},
+        {"question_number": 13, "question_prompt": "Three quarters", "written_answer": "0.75"},
+        {"question_number": 14, "question_prompt": "Plants make food by", "written_answer": "photosynthesis"},
+        {"question_number": 15, "question_prompt": "Largest planet", "written_answer": "Jupiter",
+         "accepted_answers": ["Jupiter (planet)"]},
+    ],
+}
+
+# What students write: right, right but noisy, wrong, blank
+CHOICES = ["A", "B", "C", "D", "b", "(c)", " d. ", "", None]
+WRITTEN = {
+    11: ["Paris", "paris.", "PARIS", "Lyon", "", None],
+    12: ["colour", "Color", "colr", "paint", ""],
+    13: ["0.75", "3/4", ".75", "0.7", "three quarters", ""],
+    14: ["photosynthesis", "fotosynthesis", "photo synthesis", "respiration", ""],
+    15: ["Jupiter", "jupiter (planet)", "Saturn", "..."],
+}
+
+
+@pytest.fixture
+def evaluate_answers(monkeypatch):
+    """tools.evaluation_tool.evaluate_answers (the single-sheet path), with crewai stubbed out."""
+    crewai_tools = types.SimpleNamespace(BaseTool=object)
+    monkeypatch.setitem(sys.modules, "crewai", types.SimpleNamespace(tools=crewai_tools))
+    monkeypatch.setitem(sys.modules, "crewai.tools", crewai_tools)
+    sys.modules.pop("tools.evaluation_tool", None)
+    yield importlib.import_module("tools.evaluation_tool").evaluate_answers
+    sys.modules.pop("tools.evaluation_tool", None)
+
+
+def random_sheet(rng: random.Random) -> dict:
+    """One student's OCR output: any answer may be noisy, blank or missing, in any order."""
+    mcq = [
+        {"question_number": n, "selected_answer": rng.choice(CHOICES)}
+        for n in range(1, 11) if rng.random() > 0.05
+    ]
+    fib = [
+        {"question_number": n, "question_prompt": f"Blank {n}", "written_answer": rng.choice(answers)}
+        for n, answers in WRITTEN.items() if rng.random() > 0.05
+    ]
+    rng.shuffle(mcq)
+    rng.shuffle(fib)
+    return {"multiple_choice": mcq, "fill_in_the_blanks": fib}
+
+
+def reference_statuses(index: AnswerKeyIndex, sheet: dict) -> list:
+    """Each question's status, judged one answer at a time."""
+    raw = [None] * len(index)
+    for section, field in (("multiple_choice", "selected_answer"), ("fill_in_the_blanks", "written_answer")):
+        for item in sheet.get(section, []):
+            j = index.locate(section, item)
+            if j is not None:
+                raw[j] = item.get(field)
+    statuses = []
+    for question, answer in zip(index.questions, raw):
+        normalized = question.normalize(answer) if answer else ""
+        statuses.append("unanswered" if not normalized else
+                        "correct" if question.is_correct(normalized) else "wrong")
+    return statuses
+
+
+def test_class_reports_equal_single_sheet_reports(evaluate_answers):
+    rng = random.Random(2024)
+    sheets = [random_sheet(rng) for _ in range(300)]
+    index = AnswerKeyIndex(KEY)
+
+    reports = evaluate_class(KEY, sheets)["reports"]
+    assert len(reports) == len(sheets)
+    assert {r["status"] for report in reports for r in report["detailed_results"]} == {"correct", "wrong", "unanswered"}
+    for sheet, report in zip(sheets, reports):
+        assert report == evaluate_answers(KEY, sheet)
+        statuses = [result["status"] for result in report["detailed_results"]]
+        assert statuses == reference_statuses(index, sheet)
+        summary = report["summary"]
+        assert summary["correct_answers"] == statuses.count("correct")
+        assert summary["wrong_answers"] == statuses.count("wrong")
+        assert summary["unanswered"] == statuses.count("unanswered")
+
+
+def _mcq_class(rows):
+    """A multiple-choice key and students who answer right (1) or wrong (0) per question."""
+    key = {"multiple_choice": [{"question_number": n, "selected_answer": "A"} for n in range(1, len(rows[0]) + 1)]}
+    students = [
+        {"multiple_choice": [{"question_number": n, "selected_answer": "A" if right else "B"}
+                             for n, right in enumerate(row, 1)]}
+        for row in rows
+    ]
+    return key, students
+
+
+def test_kr20_and_point_biserial():
+    # Worked by hand: scores 3, 2, 1, 0; p = 0.75, 0.5, 0.25; score variance 1.25
+    key, students = _mcq_class([[1, 1, 1], [1, 1, 0], [1, 0, 0], [0, 0, 0]])
+    summary = evaluate_class(key, students)["class_summary"]
+
+    # KR-20 = k/(k-1) * (1 - sum(p*q) / variance) = 3/2 * (1 - 0.625 / 1.25)
+    assert summary["score_distribution"]["kr20_reliability"] == 0.75
+    # Each item against the score on the other items
+    per_question = summary["per_question"]
+    assert [per_question[f"MCQ {n}"]["point_biserial"] for n in (1, 2, 3)] == [0.5222, 0.7071, 0.5222]
+    assert [per_question[f"MCQ {n}"]["difficulty"] for n in (1, 2, 3)] == [0.75, 0.5, 0.25]
+
+
+def test_statistics_are_undefined_without_variance():
+    key, students = _mcq_class([[1, 0], [1, 0], [1, 0]])
+    summary = evaluate_class(key, students)["class_summary"]
+    assert summary["score_distribution"]["kr20_reliability"] is None
+    assert summary["per_question"]["MCQ 1"]["point_biserial"] is None
@@ -0,0 +1,45 @@
+# tests/test_exam_registry.py
+# Student records of a registered exam: one sheet per student id
+import os
+
+import pytest
+
+from utils.exam_registry import DuplicateStudentError, ExamRegistry, UnknownExamError, student_id_from_sheet
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = ExamRegistry(str(tmp_path))
+    os.makedirs(tmp_path / "exam1")
+    return registry
+
+
+def test_student_ids_come_from_the_sheet_path():
+    assert student_id_from_sheet("alice.jpg") == "alice"
+    assert student_id_from_sheet("classA/alice.jpg") == "classA_alice"
+    assert student_id_from_sheet("classA\\alice.jpg") == "classA_alice"
+    assert student_id_from_sheet("../alice smith.png") == "_alice_smith"
+
+
+def test_same_sheet_can_be_stored_again(registry):
+    registry.save_student("exam1", "alice", {"q": 1}, sheet_sha256="sheet-a")
+    registry.save_student("exam1", "alice", {"q": 2}, sheet_sha256="sheet-a")  # e.g. a retried job
+    assert registry.student_answers("exam1") == {"alice": {"q": 2}}
+
+
+def test_another_sheet_never_silently_replaces_a_student(registry):
+    registry.save_student("exam1", "alice", {"q": 1}, sheet_sha256="sheet-a")
+    with pytest.raises(DuplicateStudentError):
+        registry.check_student("exam1", "alice", "sheet-b")
+    with pytest.raises(DuplicateStudentError):
+        registry.save_student("exam1", "alice", {"q": 2}, sheet_sha256="sheet-b")
+    assert registry.student_answers("exam1") == {"alice": {"q": 1}}
+
+    registry.save_student("exam1", "alice", {"q": 3}, sheet_sha256="sheet-b", replace=True)
+    assert registry.student_answers("exam1") == {"alice": {"q": 3}}
+
+
+def test_unknown_exam_has_its_own_error(registry):
+    assert registry.key_context("missing") is None
+    with pytest.raises(UnknownExamError):
+        registry.update_answer_key("missing", {})
@@ -0,0 +1,118 @@
+# tests/test_job_queue.py
+# JobQueue leases, ownership and retries, on a temporary SQLite file with a fake clock
+import types
+
+import pytest
+
+from utils import job_queue
+from utils.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), visibility_timeout=10, max_attempts=3, retry_delay=5)
+
+
+def test_jobs_are_claimed_oldest_first_and_only_once(queue, clock):
+    first = queue.enqueue("evaluate", {"n": 1})
+    clock.advance(1)
+    second = queue.enqueue("evaluate", {"n": 2})
+
+    assert queue.claim("worker-a")["job_id"] == first
+    assert queue.claim("worker-b")["job_id"] == second
+    assert queue.claim("worker-c") is None
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue, clock):
+    job_id = queue.enqueue("evaluate", {})
+    job = queue.claim("worker-a")
+    assert (job["status"], job["worker_id"], job["attempts"]) == (RUNNING, "worker-a", 1)
+    assert queue.record_stage(job_id, "worker-a", "student_alignment")
+
+    clock.advance(9)
+    assert queue.claim("worker-b") is None  # Lease still held
+    clock.advance(2)
+    job = queue.claim("worker-b")
+    assert (job["job_id"], job["worker_id"], job["attempts"]) == (job_id, "worker-b", 2)
+    assert job["progress"] == {}  # The lost attempt's progress is not carried over
+
+    # The worker that lost its lease can no longer touch the job
+    assert not queue.heartbeat(job_id, "worker-a")
+    assert not queue.record_stage(job_id, "worker-a", "report")
+    assert not queue.complete(job_id, "worker-a", {"score": 1})
+    assert queue.fail(job_id, "worker-a", "boom") is None
+
+    assert queue.complete(job_id, "worker-b", {"score": 2})
+    job = queue.get(job_id)
+    assert (job["status"], job["result"]) == (SUCCEEDED, {"score": 2})
+
+
+def test_heartbeat_keeps_the_lease(queue, clock):
+    job_id = queue.enqueue("evaluate", {})
+    queue.claim("worker-a")
+    for _ in range(3):
+        clock.advance(8)
+        assert queue.heartbeat(job_id, "worker-a")
+    assert queue.claim("worker-b") is None
+    assert queue.get(job_id)["status"] == RUNNING
+
+
+def test_only_the_lease_holder_completes(queue):
+    job_id = queue.enqueue("evaluate", {})
+    queue.claim("worker-a")
+    assert not queue.complete(job_id, "worker-b", {"score": 1})
+    assert queue.get(job_id)["status"] == RUNNING
+    assert queue.complete(job_id, "worker-a", {"score": 1})
+    assert not queue.complete(job_id, "worker-a", {"score": 1})  # Only once
+
+
+def test_failures_retry_with_backoff_then_fail(queue, clock):
+    job_id = queue.enqueue("evaluate", {})
+
+    # Attempts 1 and 2 are retried after 5s, then 10s
+    for delay in (5, 10):
+        queue.claim("worker-a")
+        assert queue.fail(job_id, "worker-a", "OCR timeout") == QUEUED
+        clock.advance(delay - 0.5)
+        assert queue.claim("worker-a") is None
+        clock.advance(0.5)
+
+    job = queue.claim("worker-a")
+    assert job["attempts"] == 3
+    assert queue.fail(job_id, "worker-a", "OCR timeout") == FAILED
+
+    clock.advance(3600)
+    assert queue.claim("worker-a") is None
+    job = queue.get(job_id)
+    assert (job["status"], job["error"], job["attempts"]) == (FAILED, "OCR timeout", 3)
+    assert queue.stats() == {FAILED: 1}
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_job(queue, clock):
+    job_id = queue.enqueue("evaluate", {})
+    for _ in range(3):
+        assert queue.claim("worker-a")["job_id"] == job_id
+        clock.advance(11)
+
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert "lease expired" in job["error"]
+    assert queue.claim("worker-b") is None
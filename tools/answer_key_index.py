@@ -0,0 +1,261 @@
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from fractions import Fraction
+from typing import Any, Dict, List, Optional
+
+from utils import config
+from utils.hashing import bytes_sha256
+
+# Bump whenever normalization or matching changes, so checkpointed reports
+# are recomputed
+MATCHING_VERSION = "1"
+
+# Alternates written into the key itself: "colour | color"
+ALTERNATE_SEPARATOR = "|"
+
+_SURROUNDING_PUNCTUATION = " \t\r\n.,;:!?\"'`()[]{}"
+_WHITESPACE = re.compile(r"\s+")
+_THOUSANDS = re.compile(r"^[+-]?\d{1,3}(,\d{3})+(\.\d+)?$")
+
+# Per question, how many distinct student answers keep their verdict cached
+_VERDICT_CACHE_SIZE = 4096
+
+
+def normalize_text(text) -> str:
+    """Unicode-normalized, case-folded, single-spaced, without surrounding punctuation."""
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    return _WHITESPACE.sub(" ", text).strip(_SURROUNDING_PUNCTUATION)
+
+
+def normalize_choice(text) -> str:
+    """A multiple-choice letter: '(b)', 'B.' and ' b ' all become 'B'."""
+    return normalize_text(text).replace(" ", "").upper()
+
+
+def parse_number(text: str) -> Optional[float]:
+    """'42', '-3.5', '1,000', '3/4' -> float; anything else -> None."""
+    if _THOUSANDS.match(text):
+        text = text.replace(",", "")
+    try:
+        if "/" in text:
+            return float(Fraction(text.replace(" ", "")))
+        return float(text)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+class BitParallelPattern:
+    """
+    One accepted answer compiled for Myers' bit-parallel edit distance:
+    the per-character match masks are built once, then each comparison
+    with a student's answer costs a few integer operations per character.
+    """
+
+    __slots__ = ("text", "length", "_peq", "_mask", "_high")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self._peq: Dict[str, int] = {}
+        for i, char in enumerate(text):
+            self._peq[char] = self._peq.get(char, 0) | (1 << i)
+        self._mask = (1 << self.length) - 1
+        self._high = 1 << (self.length - 1) if self.length else 0
+
+    def distance(self, text: str) -> int:
+        """Levenshtein distance between the pattern and `text`."""
+        if not self.length:
+            return len(text)
+        mask, high = self._mask, self._high
+        pv, mv, score = mask, 0, self.length
+        for char in text:
+            eq = self._peq.get(char, 0)
+            xv = eq | mv
+            xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & high:
+                score += 1
+            elif mh & high:
+                score -= 1
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+        return score
+
+
+class KeyQuestion:
+    """One question of a compiled key: everything needed to judge an answer."""
+
+    __slots__ = ("section", "question_id", "label", "answer", "accepted", "numbers",
+                 "tolerance", "patterns", "_verdicts", "_lock")
+
+    def __init__(self, section: str, question_id, label: str, answer, accepted: List[str],
+                 tolerance: float, fuzzy_ratio: float, fuzzy_min_length: int):
+        self.section = section
+        self.question_id = question_id
+        self.label = label
+        self.answer = answer
+        self.accepted = frozenset(accepted)
+        self.tolerance = tolerance
+        self._verdicts: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+        self.numbers = []
+        self.patterns = []
+        if section == "multiple_choice":
+            return  # Letters are matched exactly
+        for text in accepted:
+            number = parse_number(text)
+            if number is not None:
+                self.numbers.append(number)  # Numbers are matched by value, never fuzzily
+            elif fuzzy_ratio > 0 and len(text) >= fuzzy_min_length:
+                self.patterns.append((BitParallelPattern(text), int(len(text) * fuzzy_ratio)))
+
+    def normalize(self, answer) -> str:
+        return normalize_choice(answer) if self.section == "multiple_choice" else normalize_text(answer)
+
+    def is_correct(self, normalized: str) -> bool:
+        """Judge a normalized answer (cached per distinct answer)."""
+        verdict = self._verdicts.get(normalized)
+        if verdict is None:
+            verdict = self._judge(normalized)
+            with self._lock:
+                if len(self._verdicts) < _VERDICT_CACHE_SIZE:
+                    self._verdicts[normalized] = verdict
+        return verdict
+
+    def _judge(self, normalized: str) -> bool:
+        if normalized in self.accepted:
+            return True
+        if self.numbers:
+            number = parse_number(normalized)
+            if number is not None:
+                return any(abs(number - expected) <= max(self.tolerance, 1e-9) for expected in self.numbers)
+        for pattern, max_edits in self.patterns:
+            # Cheap length filter before the bit-parallel pass
+            if abs(len(normalized) - pattern.length) <= max_edits and pattern.distance(normalized) <= max_edits:
+                return True
+        return False
+
+
+class AnswerKeyIndex:
+    """
+    An answer key compiled once per exam and shared by every student graded
+    against it: answers normalized up front, accepted alternates, numeric
+    answers with a tolerance, and bit-parallel patterns for approximate
+    matching of OCR-noisy text.
+
+    A key item may list extra `accepted_answers`, separate alternates with
+    '|' in the answer itself, and set a numeric `tolerance`.
+
+    Students' fill-in-the-blank answers are matched to the key by question
+    number when both sides carry one, since prompts are often generic
+    ("Fill in the blank 1"); otherwise by normalized prompt.
+    """
+
+    def __init__(self, key_data: Dict[str, Any], fuzzy_ratio: float = None,
+                 fuzzy_min_length: int = None, numeric_tolerance: float = None):
+        fuzzy_ratio = config.ANSWER_FUZZY_MAX_EDIT_RATIO if fuzzy_ratio is None else fuzzy_ratio
+        fuzzy_min_length = config.ANSWER_FUZZY_MIN_LENGTH if fuzzy_min_length is None else fuzzy_min_length
+        numeric_tolerance = config.ANSWER_NUMERIC_TOLERANCE if numeric_tolerance is None else numeric_tolerance
+
+        # Later duplicates replace earlier ones, in place
+        mcq = {str(item['question_number']): item for item in key_data.get('multiple_choice', [])}
+        fib = {
+            str(item['question_number']) if item.get('question_number') is not None
+            else normalize_text(item['question_prompt']): item
+            for item in key_data.get('fill_in_the_blanks', [])
+        }
+
+        self.questions: List[KeyQuestion] = []
+        for question_id, item in mcq.items():
+            self.questions.append(self._compile(
+                "multiple_choice", question_id, f"MCQ {item['question_number']}", item['selected_answer'],
+                item, numeric_tolerance, fuzzy_ratio, fuzzy_min_length
+            ))
+        for item in fib.values():
+            self.questions.append(self._compile(
+                "fill_in_the_blanks", item.get('question_number'), item['question_prompt'], item['written_answer'],
+                item, numeric_tolerance, fuzzy_ratio, fuzzy_min_length
+            ))
+
+        self._by_number = {
+            (q.section, str(q.question_id)): j for j, q in enumerate(self.questions) if q.question_id is not None
+        }
+        self._by_prompt = {
+            normalize_text(q.label): j for j, q in enumerate(self.questions) if q.section == "fill_in_the_blanks"
+        }
+        self._located: Dict[tuple, Optional[int]] = {}
+
+    @staticmethod
+    def _compile(section, question_id, label, answer, item, numeric_tolerance, fuzzy_ratio, fuzzy_min_length):
+        normalize = normalize_choice if section == "multiple_choice" else normalize_text
+        alternates = str(answer or "").split(ALTERNATE_SEPARATOR) + list(item.get('accepted_answers') or [])
+        accepted = [text for text in (normalize(a) for a in alternates) if text]
+        tolerance = float(item.get('tolerance', numeric_tolerance))
+        return KeyQuestion(section, question_id, label, answer, accepted, tolerance, fuzzy_ratio, fuzzy_min_length)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def locate(self, section: str, item: Dict[str, Any]) -> Optional[int]:
+        """Index of the key question a student's answer item belongs to, or None."""
+        # Every student of a class sends the same ids and prompts: remember them
+        lookup = (section, item.get('question_number'), item.get('question_prompt'))
+        try:
+            return self._located[lookup]
+        except KeyError:
+            pass
+        except TypeError:  # Unhashable id or prompt
+            return self._locate(*lookup)
+        j = self._located[lookup] = self._locate(*lookup)
+        return j
+
+    def _locate(self, section: str, number, prompt) -> Optional[int]:
+        if number is not None:
+            j = self._by_number.get((section, str(number)))
+            if j is not None:
+                return j
+        if section == "fill_in_the_blanks":
+            return self._by_prompt.get(normalize_text(prompt))
+        return None
+
+
+# Compiled keys by key content, so every student of an exam shares one
+_compiled_keys: "OrderedDict[str, AnswerKeyIndex]" = OrderedDict()
+_compiled_lock = threading.Lock()
+_COMPILED_KEY_CACHE_SIZE = 32
+
+
+def compile_answer_key(key_data: Dict[str, Any]) -> AnswerKeyIndex:
+    """The compiled index of an answer key, built once per distinct key (and matching settings)."""
+    digest = bytes_sha256(json.dumps([key_data, matching_settings()], sort_keys=True, default=str).encode())
+    with _compiled_lock:
+        index = _compiled_keys.get(digest)
+        if index is not None:
+            _compiled_keys.move_to_end(digest)
+            return index
+
+    index = AnswerKeyIndex(key_data)
+    with _compiled_lock:
+        _compiled_keys[digest] = index
+        while len(_compiled_keys) > _COMPILED_KEY_CACHE_SIZE:
+            _compiled_keys.popitem(last=False)
+    return index
+
+
+def matching_settings() -> list:
+    """Everything besides the key that changes a verdict (part of report checkpoint keys)."""
+    return [
+        MATCHING_VERSION,
+        config.ANSWER_FUZZY_MAX_EDIT_RATIO,
+        config.ANSWER_FUZZY_MIN_LENGTH,
+        config.ANSWER_NUMERIC_TOLERANCE,
+    ]
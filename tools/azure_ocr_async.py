@@ -0,0 +1,161 @@
+import os
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+import aiohttp
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ServiceRequestError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
+from azure.ai.documentintelligence.models import AnalyzeResult
+
+from utils import config
+from utils.async_loop import run_coroutine
+
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+def _retry_after_seconds(error: HttpResponseError) -> Optional[float]:
+    """Read the Retry-After header (seconds form) from a failed response."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After") or response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncOCRClient:
+    """
+    Async Azure Document Intelligence client with one shared, pooled HTTP
+    session for the whole process.
+
+    - At most `max_concurrency` analyses are in flight at once.
+    - 429/503 responses are retried with exponential backoff and jitter,
+      honoring Retry-After when the service sends it.
+    - The LRO polling interval adapts to how long recent analyses took,
+      so small jobs aren't held back by a fixed one-second poll.
+
+    Must be used on the background loop (see utils/async_loop.py); use
+    get_async_ocr_client() or analyze_document().
+    """
+
+    def __init__(self, endpoint: str, key: str, max_concurrency: int = 8,
+                 max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.endpoint = endpoint
+        self.key = key
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._session = None
+        self._client = None
+        self._semaphore = None
+        self._average_seconds = None  # Moving average of analysis duration
+
+    async def _ensure_client(self):
+        if self._client is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency * 2)
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = DocumentIntelligenceClient(
+            endpoint=self.endpoint,
+            credential=AzureKeyCredential(self.key),
+            transport=AioHttpTransport(session=self._session, session_owner=False),
+            retry_total=0  # Retries are handled here, with Retry-After support
+        )
+
+    def _polling_interval(self) -> float:
+        if self._average_seconds is None:
+            return 1.0
+        return min(2.0, max(0.25, self._average_seconds / 5))
+
+    def _record_duration(self, seconds: float) -> None:
+        if self._average_seconds is None:
+            self._average_seconds = seconds
+        else:
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * seconds
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    async def analyze(self, image_bytes: bytes, model_id: str = "prebuilt-layout") -> AnalyzeResult:
+        await self._ensure_client()
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                try:
+                    poller = await self._client.begin_analyze_document(
+                        model_id=model_id,
+                        body=image_bytes,
+                        content_type="application/octet-stream",
+                        polling_interval=self._polling_interval()
+                    )
+                    result = await poller.result()
+                    self._record_duration(time.perf_counter() - start)
+                    return result
+
+                except HttpResponseError as e:
+                    if e.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                        raise
+                    delay = _retry_after_seconds(e)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    print(f"OCR Client: HTTP {e.status_code}, retrying in {delay:.1f}s "
+                          f"(attempt {attempt + 1}/{self.max_retries}).")
+                    await asyncio.sleep(delay)
+
+                except ServiceRequestError:
+                    # Connection-level failure: back off and retry as well
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            await self._session.close()
+            self._client = None
+            self._session = None
+
+
+# --- Process-wide shared client ---
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_async_ocr_client() -> Optional[AsyncOCRClient]:
+    """Return the shared async client, or None if Azure isn't configured."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            endpoint = os.getenv('AZURE_VISION_ENDPOINT')
+            key = os.getenv('AZURE_VISION_KEY')
+            if not endpoint or not key:
+                return None
+            _shared_client = AsyncOCRClient(
+                endpoint,
+                key,
+                max_concurrency=config.OCR_MAX_CONCURRENCY,
+                max_retries=config.OCR_MAX_RETRIES,
+                backoff_base=config.OCR_BACKOFF_BASE_SECONDS
+            )
+        return _shared_client
+
+
+def analyze_document(image_bytes: bytes, model_id: str = "prebuilt-layout") -> AnalyzeResult:
+    """Blocking call for worker threads; the analysis runs on the shared loop."""
+    client = get_async_ocr_client()
+    if client is None:
+        raise Exception("AZURE_VISION_ENDPOINT or AZURE_VISION_KEY not set.")
+    return run_coroutine(client.analyze(image_bytes, model_id))
+
@@ -1,113 +1,196 @@
 import os
 import json  # <-- 1. IMPORT JSON
 import time
+import cv2
 from crewai.tools import BaseTool
 from azure.core.credentials import AzureKeyCredential
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.ai.documentintelligence.models import AnalyzeResult
 from pydantic import Field
 from typing import Any
+from models.schemas import load_template_layout
+from utils.image_utils import pack_zones, slot_for_point, encode_png
+from tools.omr_tool import read_bubbles
+from tools.azure_ocr_async import analyze_document
+from utils import config
+from utils.hashing import bytes_sha256
+from utils.ocr_cache import OCRCache, ocr_cache_key
+from utils.artifact_store import atomic_write_json
+
+OCR_MODEL_ID = "prebuilt-layout"
+# Bump whenever the parsing below changes, so cached results are not reused
+PARSING_VERSION = "2"
+
+# Parsed OCR output, shared by every AzureOCRTool in this process
+_ocr_cache = OCRCache(
+    config.OCR_CACHE_PATH,
+    max_bytes=config.OCR_CACHE_MAX_MB * 1024 * 1024,
+    ttl_seconds=config.OCR_CACHE_TTL_DAYS * 24 * 3600
+) if config.OCR_CACHE_ENABLED else None
+
+
+def ocr_cache_stats():
+    """Entries, size and this process's hit/miss counters of the OCR cache (None if it is off)."""
+    return _ocr_cache.stats() if _ocr_cache is not None else None
+
+
+class _ClientMissing(Exception):
+    pass
 
 # Helper function to create the client
 def _create_azure_di_client():
     endpoint = os.getenv('AZURE_VISION_ENDPOINT')
     key = os.getenv('AZURE_VISION_KEY')
-    
+
     if not endpoint or not key:
         print("Warning: AZURE_VISION_ENDPOINT or AZURE_VISION_KEY not set. OCR tool will fail.")
         return None
-        
+
     return DocumentIntelligenceClient(
-        endpoint=endpoint, 
+        endpoint=endpoint,
         credential=AzureKeyCredential(key)
     )
 
+
+def _parse_handwritten_answers(result: AnalyzeResult) -> dict:
+    """
+    Whole-page parsing: pick the handwritten spans out of the layout result
+    and guess which ones are answers.
+    """
+    # 2. Extract only handwritten text
+    handwritten_answers = []
+    if result.styles:
+        for style in result.styles:
+            if style.is_handwritten:
+                for span in style.spans:
+                    start = span.offset
+                    end = span.offset + span.length
+                    handwritten_text = result.content[start:end].strip()
+
+                    if handwritten_text:
+                        handwritten_answers.append(handwritten_text)
+
+    print(f"OCR Tool: Found handwritten text: {handwritten_answers}")
+
+    # 3. Format the text into your desired JSON structure
+    output_json = {
+        "multiple_choice": [],
+        "fill_in_the_blanks": []
+    }
+
+    # Use heuristics to sort answers
+    mcq_answers = [text for text in handwritten_answers if len(text) == 1 and text.isalpha()]
+
+    # Filter out common non-answer numbers (like '59' from Roll No.)
+    # You may need to make this filter smarter later
+    fib_answers = [text for text in handwritten_answers if text.isdigit() and text not in ["59","24","2"]]
+
+    for i, answer in enumerate(mcq_answers):
+        output_json["multiple_choice"].append({
+            "question_number": str(i + 1),
+            "selected_answer": answer.upper() # Standardize to uppercase
+        })
+
+    for i, answer in enumerate(fib_answers):
+        output_json["fill_in_the_blanks"].append({
+            "question_number": str(i + 1),
+            "question_prompt": f"Fill in the blank {i + 1}", # Generic prompt
+            "written_answer": answer
+        })
+
+    return output_json
+
+
+def _parse_zone_answers(result: AnalyzeResult, zones, slots) -> dict:
+    """
+    Zone parsing: every recognised word belongs to the question whose slot
+    in the composite image contains the word's centre.
+    """
+    words_per_zone = [[] for _ in slots]
+    for page in result.pages or []:
+        for word in page.words or []:
+            polygon = word.polygon or []
+            if len(polygon) < 2:
+                continue
+            cx = sum(polygon[0::2]) / (len(polygon) // 2)
+            cy = sum(polygon[1::2]) / (len(polygon) // 2)
+            index = slot_for_point(slots, cx, cy)
+            if index >= 0:
+                words_per_zone[index].append((cy, cx, word.content))
+
+    output_json = {
+        "multiple_choice": [],
+        "fill_in_the_blanks": []
+    }
+
+    for zone, words in zip(zones, words_per_zone):
+        # Reading order: top to bottom in half-line bands, then left to right
+        band = max(1, zone.box[3] // 2)
+        words.sort(key=lambda w: (int(w[0] // band), w[1]))
+        text = " ".join(content for _, _, content in words).strip()
+        if not text:
+            continue  # Unanswered: leave it out, as the whole-page parser does
+
+        if zone.type == "multiple_choice":
+            output_json["multiple_choice"].append({
+                "question_number": zone.question_id,
+                "selected_answer": text.upper() # Standardize to uppercase
+            })
+        else:
+            output_json["fill_in_the_blanks"].append({
+                "question_number": zone.question_id,
+                "question_prompt": zone.prompt or f"Fill in the blank {zone.question_id}",
+                "written_answer": text
+            })
+
+    print(f"OCR Tool: Mapped {sum(len(w) for w in words_per_zone)} words to "
+          f"{len(zones)} zones.")
+    return output_json
+
+
 # In ocrtool.py
 # ... (keep all your imports and the _create_azure_di_client function) ...
 
 class AzureOCRTool(BaseTool):
     name: str = "Azure OCR Tool"
     description: str = "Performs OCR on an image, intelligently extracts only handwritten answers, and saves them to a structured JSON file."
-    
+
     client: Any = Field(default_factory=_create_azure_di_client)
 
     # --- REPLACE YOUR OLD _run METHOD WITH THIS ---
-    def _run(self, image_path: str, output_json_path: str) -> dict:
+    def _run(self, image_path: str, output_json_path: str, layout_path: str = None) -> dict:
         """
         Perform smart OCR on an image, find only handwritten answers,
         save them to the specified JSON path, and return the JSON object.
-        """
-        if not self.client:
-            return {
-                'success': False,
-                'error': "Azure Document Intelligence client is not initialized. Check environment variables."
-            }
 
+        If a template layout is given, image_path must be the *aligned*
+        image: bubble questions are read locally by OMR, the remaining
+        answer zones are cropped, packed into one composite image and sent
+        to Azure, and each answer is mapped back to its question by position.
+        An exam with only bubble questions makes no network call.
+        """
         try:
-            print(f"OCR Tool: Analyzing {image_path} with 'prebuilt-layout'...")
-            
-            # Read image
-            with open(image_path, "rb") as image_file:
-                image_bytes = image_file.read()
-            
-            # --- THIS IS THE KEY CHANGE ---
-            # 1. Use the "prebuilt-layout" model to get handwriting info
-            poller = self.client.begin_analyze_document(
-                model_id="prebuilt-layout",  # Use layout model
-                body=image_bytes, # Correct parameter name
-                content_type="application/octet-stream"
-            )
-            result: AnalyzeResult = poller.result()
-            print("OCR Tool: Analysis complete.")
+            if layout_path:
+                layout = load_template_layout(layout_path)
+                image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+                if image is None:
+                    raise Exception(f"Failed to load image: {image_path}")
+                output_json = self._extract_zones(image, layout, source=image_path)
+            else:
+                print(f"OCR Tool: Analyzing {image_path} with '{OCR_MODEL_ID}'...")
 
-            # 2. Extract only handwritten text
-            handwritten_answers = []
-            if result.styles:
-                for style in result.styles:
-                    if style.is_handwritten:
-                        for span in style.spans:
-                            start = span.offset
-                            end = span.offset + span.length
-                            handwritten_text = result.content[start:end].strip()
-                            
-                            if handwritten_text:
-                                handwritten_answers.append(handwritten_text)
-
-            print(f"OCR Tool: Found handwritten text: {handwritten_answers}")
-
-            # 3. Format the text into your desired JSON structure
-            output_json = {
-                "multiple_choice": [],
-                "fill_in_the_blanks": []
-            }
-            
-            # Use heuristics to sort answers
-            mcq_answers = [text for text in handwritten_answers if len(text) == 1 and text.isalpha()]
-            
-            # Filter out common non-answer numbers (like '59' from Roll No.)
-            # You may need to make this filter smarter later
-            fib_answers = [text for text in handwritten_answers if text.isdigit() and text not in ["59","24","2"]]
-
-            for i, answer in enumerate(mcq_answers):
-                output_json["multiple_choice"].append({
-                    "question_number": str(i + 1),
-                    "selected_answer": answer.upper() # Standardize to uppercase
-                })
-
-            for i, answer in enumerate(fib_answers):
-                output_json["fill_in_the_blanks"].append({
-                    "question_prompt": f"Fill in the blank {i + 1}", # Generic prompt
-                    "written_answer": answer
-                })
+                # Read image
+                with open(image_path, "rb") as image_file:
+                    image_bytes = image_file.read()
+
+                output_json = self._extract_page(image_bytes)
 
             # 4. Save the final JSON file
             try:
-                os.makedirs(os.path.dirname(output_json_path), exist_ok=True)
-                with open(output_json_path, 'w') as f:
-                    json.dump(output_json, f, indent=2)
-                
+                atomic_write_json(output_json_path, output_json)
+
                 print(f"OCR Tool: Successfully saved formatted answers to {output_json_path}")
-            
+
             except Exception as e:
                 return {
                     'success': False,
@@ -116,9 +199,109 @@ class AzureOCRTool(BaseTool):
 
             # 5. Return the final JSON object to the agent
             return output_json
-        
+
+        except _ClientMissing:
+            return self._client_missing_error()
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Error during OCR analysis: {str(e)}"
+            }
+
+    def extract(self, image=None, image_bytes: bytes = None, layout=None) -> dict:
+        """
+        In-memory variant of _run(): nothing is read from or written to disk.
+
+        With a TemplateLayout, `image` is the aligned sheet as a NumPy
+        array; without one, `image_bytes` is the encoded original sheet,
+        sent to Azure as is. Returns the answers, or an error dict.
+        """
+        try:
+            if layout is not None:
+                return self._extract_zones(image, layout)
+            return self._extract_page(image_bytes)
+
+        except _ClientMissing:
+            return self._client_missing_error()
+
         except Exception as e:
             return {
                 'success': False,
                 'error': f"Error during OCR analysis: {str(e)}"
-            }
\ No newline at end of file
+            }
+
+    def _extract_zones(self, image, layout, source: str = "aligned image") -> dict:
+        # Bubble questions are read locally; only text zones need Azure
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        output_json = read_bubbles(gray, layout.bubble_zones())
+        output_json["fill_in_the_blanks"] = []
+        text_zones = layout.text_zones()
+
+        if not text_zones:
+            print("OCR Tool: All questions are bubbles, no Azure call needed.")
+            return output_json
+
+        # Crop only the answer zones and pack them into one image
+        composite, slots = pack_zones(gray, [q.box for q in text_zones])
+        print(f"OCR Tool: Analyzing {len(slots)} answer zones from {source} "
+              f"({composite.shape[1]}x{composite.shape[0]} composite) with '{OCR_MODEL_ID}'...")
+
+        # The zone geometry decides how words map to questions
+        zones_json = json.dumps([q.model_dump() for q in text_zones], sort_keys=True)
+        zone_answers = self._cached_analyze(
+            encode_png(composite),
+            lambda result: _parse_zone_answers(result, text_zones, slots),
+            scope=f"zones-{bytes_sha256(zones_json.encode())}"
+        )
+        output_json["multiple_choice"].extend(zone_answers["multiple_choice"])
+        output_json["fill_in_the_blanks"].extend(zone_answers["fill_in_the_blanks"])
+        return output_json
+
+    def _extract_page(self, image_bytes: bytes) -> dict:
+        return self._cached_analyze(image_bytes, _parse_handwritten_answers, scope="page")
+
+    def _cached_analyze(self, image_bytes: bytes, parse, scope: str) -> dict:
+        """
+        Return parsed OCR output for these exact bytes, calling Azure only
+        on a cache miss. A teacher key or a rescan is analysed only once.
+        """
+        key = ocr_cache_key(image_bytes, OCR_MODEL_ID, PARSING_VERSION, scope)
+        if _ocr_cache is not None:
+            cached = _ocr_cache.get(key)
+            if cached is not None:
+                print("OCR Tool: Cache hit, skipping Azure analysis.")
+                return cached
+
+        if not self.client:
+            raise _ClientMissing()
+
+        output_json = parse(self._analyze(image_bytes))
+        if _ocr_cache is not None:
+            _ocr_cache.put(key, output_json)
+        return output_json
+
+    def _analyze(self, image_bytes: bytes) -> AnalyzeResult:
+        if config.OCR_ASYNC:
+            # Shared async client: pooled session, bounded concurrency, 429/503 retry
+            result = analyze_document(image_bytes, OCR_MODEL_ID)
+            print("OCR Tool: Analysis complete.")
+            return result
+
+        # --- THIS IS THE KEY CHANGE ---
+        # 1. Use the "prebuilt-layout" model to get handwriting info
+        poller = self.client.begin_analyze_document(
+            model_id=OCR_MODEL_ID,  # Use layout model
+            body=image_bytes, # Correct parameter name
+            content_type="application/octet-stream"
+        )
+        result: AnalyzeResult = poller.result()
+        print("OCR Tool: Analysis complete.")
+        return result
+
+    @staticmethod
+    def _client_missing_error() -> dict:
+        return {
+            'success': False,
+            'error': "Azure Document Intelligence client is not initialized. Check environment variables."
+        }
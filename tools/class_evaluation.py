@@ -0,0 +1,218 @@
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+from tools.answer_key_index import AnswerKeyIndex, compile_answer_key
+
+# Answer codes in the students × questions matrix. Every other answer a
+# student gave to a question gets its own code (2, 3, ...) per question.
+UNANSWERED = 0
+CORRECT = 1
+
+# How many wrong answers per question are listed as distractors
+MAX_DISTRACTORS = 5
+
+
+def _percent(value: float) -> str:
+    return f"{value:.2f}%"
+
+
+class AnswerMatrix:
+    """
+    A class's answers against one key, encoded as a students × questions
+    matrix of answer codes. Scoring and item statistics are computed on the
+    whole matrix at once instead of student by student.
+
+    Answers are judged by the compiled key (see answer_key_index.py), once
+    per distinct normalized answer; an answer that normalizes to nothing
+    counts as unanswered.
+    """
+
+    def __init__(self, key, students: List[Dict[str, Any]]):
+        self.key = key if isinstance(key, AnswerKeyIndex) else compile_answer_key(key)
+        self.questions = [q.label for q in self.key.questions]
+        self.correct_answers = [q.answer for q in self.key.questions]
+        width = len(self.questions)
+
+        # Per question: normalized answer -> code. Every accepted spelling
+        # shares the CORRECT code; each wrong one gets its own.
+        self._vocab = [{} for _ in range(width)]
+        self._labels = [{} for _ in range(width)]
+
+        # --- Encode every answer once ---
+        # Answers seen before (most of a class's) cost one dict lookup
+        seen = [{} for _ in range(width)]
+        rows, self.raw_answers = [], []
+        for student in students:
+            raw = [None] * width
+            for section, answer_field in (("multiple_choice", 'selected_answer'),
+                                          ("fill_in_the_blanks", 'written_answer')):
+                for item in student.get(section, []):
+                    j = self.key.locate(section, item)
+                    if j is not None:
+                        raw[j] = item.get(answer_field)  # Later duplicates win, as in a dict
+
+            codes = [UNANSWERED] * width
+            for j, answer in enumerate(raw):
+                if answer:
+                    code = seen[j].get(answer)
+                    if code is None:
+                        code = seen[j][answer] = self._encode(j, answer)
+                    codes[j] = code
+            rows.append(codes)
+            self.raw_answers.append(raw)
+
+        self.codes = np.array(rows, dtype=np.int32).reshape(len(students), width)
+
+        # --- Score everyone in one pass ---
+        self.correct = self.codes == CORRECT
+        self.unanswered = self.codes == UNANSWERED
+        self.correct_counts = self.correct.sum(axis=1)
+        self.unanswered_counts = self.unanswered.sum(axis=1)
+        self.wrong_counts = width - self.correct_counts - self.unanswered_counts
+
+        # Accuracy: correct out of all questions; precision: correct out of those attempted
+        answered = width - self.unanswered_counts
+        self.accuracy = self.correct_counts / max(width, 1) * 100
+        self.precision = np.where(answered > 0, self.correct_counts / np.maximum(answered, 1) * 100, 0.0)
+
+    def _encode(self, j: int, answer) -> int:
+        question = self.key.questions[j]
+        normalized = question.normalize(answer)
+        vocab = self._vocab[j]
+        code = vocab.get(normalized)
+        if code is None:
+            if not normalized:
+                code = UNANSWERED
+            elif question.is_correct(normalized):
+                code = CORRECT
+            else:
+                code = len(self._labels[j]) + CORRECT + 1
+                self._labels[j][code] = normalized
+            vocab[normalized] = code
+        return code
+
+    @property
+    def student_count(self) -> int:
+        return self.codes.shape[0]
+
+    def summary(self, student: int) -> Dict[str, Any]:
+        return {
+            "total_questions": len(self.questions),
+            "correct_answers": int(self.correct_counts[student]),
+            "wrong_answers": int(self.wrong_counts[student]),
+            "unanswered": int(self.unanswered_counts[student]),
+            "accuracy_percent": _percent(self.accuracy[student]),
+            "precision_of_answered_percent": _percent(self.precision[student])
+        }
+
+    def report(self, student: int) -> Dict[str, Any]:
+        """The per-student report (summary + detailed_results), as evaluate_answers() returns it."""
+        codes = self.codes[student].tolist()
+        detailed_results = [
+            {
+                "question": question,
+                "student_answer": student_answer or "N/A",
+                "correct_answer": correct_answer,
+                "status": "unanswered" if code == UNANSWERED else "correct" if code == CORRECT else "wrong"
+            }
+            for question, correct_answer, student_answer, code
+            in zip(self.questions, self.correct_answers, self.raw_answers[student], codes)
+        ]
+        return {"summary": self.summary(student), "detailed_results": detailed_results}
+
+    def reports(self) -> List[Dict[str, Any]]:
+        return [self.report(student) for student in range(self.student_count)]
+
+    def score_distribution(self) -> Dict[str, Any]:
+        """Class score statistics (accuracy percent of each student)."""
+        scores = self.accuracy
+        if not self.student_count:
+            return {}
+        histogram, edges = np.histogram(scores, bins=10, range=(0, 100))
+        p25, median, p75 = np.percentile(scores, [25, 50, 75])
+        return {
+            "mean_percent": _percent(scores.mean()),
+            "median_percent": _percent(median),
+            "min_percent": _percent(scores.min()),
+            "max_percent": _percent(scores.max()),
+            "std_percent": _percent(scores.std()),
+            "p25_percent": _percent(p25),
+            "p75_percent": _percent(p75),
+            "kr20_reliability": self._kr20(),
+            "histogram": {
+                f"{int(low)}-{int(high)}%": int(count)
+                for low, high, count in zip(edges[:-1], edges[1:], histogram)
+            },
+        }
+
+    def item_analysis(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-question statistics: counts, difficulty (share of students who
+        got it right), point-biserial discrimination against the rest of
+        the test, and the most frequent wrong answers (distractors).
+        """
+        n = self.student_count
+        if not n:
+            return {}
+        correct = self.correct.astype(np.float64)
+        difficulty = correct.mean(axis=0)
+        discrimination = self._point_biserial(correct)
+        correct_counts = self.correct.sum(axis=0)
+        unanswered_counts = self.unanswered.sum(axis=0)
+
+        items = {}
+        for j, question in enumerate(self.questions):
+            counts = np.bincount(self.codes[:, j], minlength=CORRECT + 1)
+            labels = self._labels[j]
+            wrong_codes = np.argsort(-counts[CORRECT + 1:], kind="stable")[:MAX_DISTRACTORS] + CORRECT + 1
+            items[question] = {
+                "correct": int(correct_counts[j]),
+                "wrong": int(n - correct_counts[j] - unanswered_counts[j]),
+                "unanswered": int(unanswered_counts[j]),
+                "correct_percent": _percent(difficulty[j] * 100),
+                "difficulty": round(float(difficulty[j]), 4),
+                "point_biserial": None if np.isnan(discrimination[j]) else round(float(discrimination[j]), 4),
+                "distractors": [
+                    {"answer": labels[code], "count": int(counts[code]), "percent": _percent(counts[code] / n * 100)}
+                    for code in wrong_codes if counts[code]
+                ],
+            }
+        return items
+
+    def _point_biserial(self, correct: np.ndarray) -> np.ndarray:
+        # Correlation of each item with the score on the *other* items, so an
+        # item does not correlate with itself; NaN where either side is constant
+        rest = correct.sum(axis=1, keepdims=True) - correct
+        covariance = (correct * rest).mean(axis=0) - correct.mean(axis=0) * rest.mean(axis=0)
+        spread = correct.std(axis=0) * rest.std(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(spread > 0, covariance / np.where(spread > 0, spread, 1), np.nan)
+
+    def _kr20(self) -> Optional[float]:
+        # Kuder-Richardson 20: internal consistency of right/wrong items
+        k = len(self.questions)
+        variance = self.correct_counts.var()
+        if k < 2 or variance == 0:
+            return None
+        p = self.correct.mean(axis=0)
+        return round(float(k / (k - 1) * (1 - (p * (1 - p)).sum() / variance)), 4)
+
+
+def evaluate_class(key, students: List[Dict[str, Any]],
+                   failed: int = 0) -> Dict[str, Any]:
+    """
+    Grade a whole class in one pass against `key` (key JSON or a compiled
+    AnswerKeyIndex). Returns the per-student reports (in the order of
+    `students`) and the class summary: score distribution and item
+    analysis per question.
+    """
+    matrix = AnswerMatrix(key, students)
+    return {
+        "reports": matrix.reports(),
+        "class_summary": {
+            "students_graded": matrix.student_count,
+            "students_failed": failed,
+            "score_distribution": matrix.score_distribution(),
+            "per_question": matrix.item_analysis(),
+        },
+    }
@@ -0,0 +1,272 @@
+import contextvars
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from models.schemas import InsightBatch
+from tools.answer_key_index import normalize_text
+from utils import config
+from utils.hashing import bytes_sha256
+from utils.json_cache import JSONCache
+from utils.llm_cache import LLMCacheMiss
+
+# Bump whenever the prompt, the profile or the template feedback changes,
+# so cached feedback and insight checkpoints are not reused
+INSIGHTS_VERSION = "1"
+
+INSIGHT_MODES = ("llm", "template")
+
+# Multiple-choice questions are labelled "MCQ <number>" by the answer key index
+_MCQ_LABEL = re.compile(r"^mcq \S+$")
+_SECTION_NAMES = {"multiple_choice": "multiple-choice", "fill_in_the_blanks": "fill-in-the-blank"}
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+# Questions named per line of template feedback
+_MAX_LISTED_QUESTIONS = 5
+
+_SYSTEM_PROMPT = """You are an academic performance analyst. For each student profile
+you receive the score summary and, per question, whether the student answered it
+correctly, wrongly or not at all. Write short, specific, encouraging feedback for
+each profile: refer to the questions and sections by name, never invent answers.
+Return one entry per profile, with the profile's id."""
+
+
+class InsightCache(JSONCache):
+    """Persistent cache of LLM feedback, keyed by score profile (see profile_key())."""
+
+    table = "insight_cache"
+
+
+def insight_stats(report: Dict[str, Any]) -> Dict[str, Any]:
+    """The numeric insight fields, copied from the report's summary."""
+    summary = report["summary"]
+    return {
+        "total_questions": summary["total_questions"],
+        "correct_answers": summary["correct_answers"],
+        "wrong_answers": summary["wrong_answers"],
+        "unanswered": summary["unanswered"],
+        "score_percentage": summary["accuracy_percent"],
+    }
+
+
+def score_profile(report: Dict[str, Any]) -> List[List[str]]:
+    """
+    What the written feedback depends on: each question's section, name
+    and outcome, in a canonical order. The answers themselves are left
+    out, so every student with the same outcomes shares one profile.
+    """
+    profile = []
+    for result in report.get("detailed_results", []):
+        question = str(result["question"])
+        profile.append([_section(question), question, result["status"]])
+    return sorted(profile, key=lambda entry: (entry[0], normalize_text(entry[1])))
+
+
+def profile_key(profile: List[List[str]]) -> str:
+    """Cache key of a profile's LLM feedback."""
+    return bytes_sha256(json.dumps(
+        [INSIGHTS_VERSION, config.LLM_MODEL, config.LLM_TEMPERATURE, profile]
+    ).encode())
+
+
+def template_feedback(profile: List[List[str]]) -> Dict[str, Any]:
+    """Rule-based feedback for a profile, without the LLM."""
+    total = len(profile)
+    correct = sum(1 for _, _, status in profile if status == "correct")
+    percent = correct / total * 100 if total else 0.0
+
+    if percent >= 90:
+        level, closing = "Excellent", "Outstanding work, keep it up!"
+    elif percent >= 75:
+        level, closing = "Good", "You're on the right track: a little more review and you'll ace the next one."
+    elif percent >= 50:
+        level, closing = "Fair", "You have a solid base to build on. Focused review will pay off quickly."
+    else:
+        level, closing = "Needs improvement", ("Every question you review now is one you'll get right "
+                                                "next time. Keep going!")
+
+    strengths, improvements = [], []
+    for section in _SECTION_NAMES:
+        outcomes = [status for s, _, status in profile if s == section]
+        if not outcomes:
+            continue
+        section_correct = outcomes.count("correct")
+        name = _SECTION_NAMES[section]
+        if section_correct / len(outcomes) >= 0.75:
+            strengths.append(f"Strong accuracy on {name} questions ({section_correct}/{len(outcomes)} correct).")
+        wrong = [question for s, question, status in profile if s == section and status == "wrong"]
+        if wrong:
+            improvements.append(f"Review the {name} questions answered incorrectly: {_list_questions(wrong)}.")
+
+    blank = [question for _, question, status in profile if status == "unanswered"]
+    if blank:
+        improvements.append(f"Answer every question: {len(blank)} left blank ({_list_questions(blank)}).")
+    elif total:
+        strengths.append("Attempted every question.")
+    if not strengths and correct:
+        strengths.append(f"Answered {correct} question{'s' if correct != 1 else ''} correctly.")
+    if not improvements:
+        improvements.append("Keep practising to maintain this level.")
+
+    return {
+        "overall_performance": f"{level} result: {correct} of {total} questions correct ({percent:.2f}%).",
+        "strengths": strengths,
+        "areas_for_improvement": improvements,
+        "motivational_feedback": closing,
+    }
+
+
+class InsightService:
+    """
+    Student insights as structured data.
+
+    The numeric fields are copied from the evaluation summary; only the
+    written feedback comes from the LLM. Students are reduced to their
+    score profile, identical profiles are asked about once (and reuse
+    cached feedback across runs), and up to `batch_size` profiles go into
+    one schema-constrained request. "template" mode writes rule-based
+    feedback instead, without any LLM call.
+
+    Every insight says where its feedback came from in "generated_by"
+    ("llm" or "template").
+    """
+
+    def __init__(self, mode: str = None, batch_size: int = None, cache: JSONCache = None):
+        self.mode = mode or config.INSIGHT_MODE
+        if self.mode not in INSIGHT_MODES:
+            raise ValueError(f"Unknown insight mode '{self.mode}' (expected one of {', '.join(INSIGHT_MODES)})")
+        self.batch_size = max(1, batch_size or config.INSIGHT_BATCH_SIZE)
+        if cache is None and config.INSIGHT_CACHE_ENABLED:
+            cache = InsightCache(
+                config.INSIGHT_CACHE_PATH,
+                max_bytes=config.INSIGHT_CACHE_MAX_MB * 1024 * 1024,
+                ttl_seconds=config.INSIGHT_CACHE_TTL_DAYS * 24 * 3600
+            )
+        self.cache = cache
+
+    def settings(self) -> list:
+        """Everything besides the report that changes the insights (part of checkpoint keys)."""
+        return [INSIGHTS_VERSION, self.mode] + ([config.LLM_MODEL, config.LLM_TEMPERATURE] if self.mode == "llm" else [])
+
+    def generate(self, reports: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insights for each report, in order."""
+        profiles = [score_profile(report) for report in reports]
+        if self.mode == "template":
+            feedback = {i: (template_feedback(profile), "template") for i, profile in enumerate(profiles)}
+        else:
+            feedback = self._llm_feedback(profiles)
+        return [
+            {**insight_stats(report), **feedback[i][0], "generated_by": feedback[i][1]}
+            for i, report in enumerate(reports)
+        ]
+
+    def _llm_feedback(self, profiles: List[List[List[str]]]) -> Dict[int, tuple]:
+        # Distinct profiles, each with the students that share it
+        by_key: Dict[str, List[int]] = {}
+        for i, profile in enumerate(profiles):
+            by_key.setdefault(profile_key(profile), []).append(i)
+
+        written = {}
+        for key in by_key:
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                written[key] = (cached, "llm")
+
+        missing = [key for key in by_key if key not in written]
+        if missing:
+            print(f"[InsightService] {len(profiles)} students, {len(by_key)} distinct profiles, "
+                  f"{len(missing)} not cached.")
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            # Requests run on pool threads but still count against the caller's job and stage
+            context = contextvars.copy_context()
+
+            def request(keys):
+                return context.copy().run(self._request_batch, [profiles[by_key[key][0]] for key in keys])
+
+            with ThreadPoolExecutor(max_workers=max(1, config.INSIGHT_MAX_CONCURRENCY)) as executor:
+                for batch, answers in zip(batches, executor.map(request, batches)):
+                    for key, answer in zip(batch, answers):
+                        if answer is not None:
+                            written[key] = (answer, "llm")
+                            if self.cache is not None:
+                                self.cache.put(key, answer)
+                        else:
+                            written[key] = (template_feedback(profiles[by_key[key][0]]), "template")
+
+        return {i: written[key] for key, students in by_key.items() for i in students}
+
+    def _request_batch(self, profiles: List[List[List[str]]]) -> List[Any]:
+        """One LLM request for a batch of profiles: their feedback, or None where it failed."""
+        from agents.llm import get_llm
+
+        request = [
+            {
+                "id": i,
+                "summary": _profile_summary(profile),
+                "questions": [{"question": question, "status": status} for _, question, status in profile],
+            }
+            for i, profile in enumerate(profiles)
+        ]
+        messages = [
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(request)},
+        ]
+        try:
+            # Only an answer that parses and covers every profile is worth caching
+            output = get_llm(InsightBatch).call(
+                messages, cache_if=lambda response: _covers_every_profile(response, len(profiles))
+            )
+            answers = _parse_batch(output, len(profiles))
+        except LLMCacheMiss:
+            raise  # Replaying a recorded run: a missing response is an error, not an outage
+        except Exception as e:
+            if not config.INSIGHT_TEMPLATE_FALLBACK:
+                raise RuntimeError(f"Insight generation failed: {e}") from e
+            print(f"[InsightService] LLM request failed, using template feedback for {len(profiles)} profiles: {e}")
+            return [None] * len(profiles)
+
+        if None in answers:
+            if not config.INSIGHT_TEMPLATE_FALLBACK:
+                raise RuntimeError("Insight generation failed: the LLM skipped some students")
+            print(f"[InsightService] LLM skipped {answers.count(None)} of {len(profiles)} profiles; "
+                  f"using template feedback for them.")
+        return answers
+
+
+def _parse_batch(output, count: int) -> List[Any]:
+    """Feedback per profile id from an LLM answer (None where it skipped one); raises if it is not an InsightBatch."""
+    batch = output if isinstance(output, InsightBatch) else \
+        InsightBatch.model_validate_json(_CODE_FENCE.sub("", str(output).strip()))
+    answers = [None] * count
+    for item in batch.insights:
+        if 0 <= item.id < count:
+            answers[item.id] = item.model_dump(exclude={"id"})
+    return answers
+
+
+def _covers_every_profile(output, count: int) -> bool:
+    try:
+        return None not in _parse_batch(output, count)
+    except ValueError:  # Not valid JSON, or not the schema
+        return False
+
+
+def _section(question: str) -> str:
+    return "multiple_choice" if _MCQ_LABEL.match(normalize_text(question)) else "fill_in_the_blanks"
+
+
+def _profile_summary(profile: List[List[str]]) -> Dict[str, int]:
+    statuses = [status for _, _, status in profile]
+    return {
+        "total_questions": len(statuses),
+        "correct_answers": statuses.count("correct"),
+        "wrong_answers": statuses.count("wrong"),
+        "unanswered": statuses.count("unanswered"),
+    }
+
+
+def _list_questions(questions: List[str]) -> str:
+    listed = ", ".join(questions[:_MAX_LISTED_QUESTIONS])
+    extra = len(questions) - _MAX_LISTED_QUESTIONS
+    return f"{listed} and {extra} more" if extra > 0 else listed
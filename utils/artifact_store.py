@@ -0,0 +1,221 @@
+# utils/artifact_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.hashing import bytes_sha256
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write a file so readers see either the old content or the new, never half of it."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path: str, data, indent: int = 2) -> None:
+    atomic_write(path, json.dumps(data, indent=indent).encode())
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for pipeline artifacts (aligned images,
+    answers, reports, insights).
+
+    An artifact's name is derived from its stage and the content hashes of
+    everything it was computed from (see key()), so identical inputs map
+    to the same file: two uploads of the same sheet share one copy, and
+    two different sheets called `scan.jpg` never collide.
+
+    Jobs hold references to the artifacts they produced. References older
+    than `ttl_seconds` are dropped, unreferenced artifacts are deleted, and
+    when the store outgrows `max_bytes` the oldest jobs are released first.
+    """
+
+    # Unreferenced files younger than this are left alone: their writer
+    # may not have recorded its reference yet
+    GRACE_SECONDS = 60
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3,
+                 ttl_seconds: float = 7 * 24 * 3600, evict_interval: float = 60):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evict_interval = evict_interval
+        self._last_evict = 0.0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self.db_path = os.path.join(self.root, "refs.sqlite3")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS refs (
+                    job_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, name)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_name ON refs(name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_created ON refs(created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:  # Commit on success, roll back on error
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(stage: str, *inputs, ext: str = ".json") -> str:
+        """
+        Artifact name for `stage` computed from `inputs` (content hashes,
+        other artifact names, or parameters that change the output).
+        """
+        digest = bytes_sha256("\0".join([stage] + [str(i) for i in inputs]).encode())
+        return f"{digest}_{stage}{ext}"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def reserve(self, job_id: str, name: str) -> str:
+        """
+        Reference an artifact for a job and return its path, for writers
+        that produce the file themselves (tools driven by an agent).
+        """
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO refs (job_id, name, created_at) VALUES (?, ?, ?)",
+                (job_id, name, time.time())
+            )
+        self.maybe_evict()
+        return path
+
+    def read_json(self, job_id: str, name: str):
+        """
+        Load a JSON artifact and reference it for `job_id`, or return None
+        if it is missing or unreadable (e.g. evicted or truncated).
+        """
+        try:
+            with open(self.path(name), "rb") as f:
+                data = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        self.reserve(job_id, name)
+        return data
+
+    def write_bytes(self, job_id: str, name: str, data: bytes) -> str:
+        path = self.reserve(job_id, name)
+        atomic_write(path, data)
+        return path
+
+    def write_json(self, job_id: str, name: str, data) -> str:
+        return self.write_bytes(job_id, name, json.dumps(data, indent=2).encode())
+
+    def write_text(self, job_id: str, name: str, text: str) -> str:
+        return self.write_bytes(job_id, name, text.encode())
+
+    def write_image(self, job_id: str, name: str, image) -> str:
+        import cv2  # Deferred: keeps importing the store cheap
+
+        ok, buffer = cv2.imencode(os.path.splitext(name)[1] or ".png", image)
+        if not ok:
+            raise Exception(f"Failed to encode image artifact '{name}'.")
+        return self.write_bytes(job_id, name, buffer.tobytes())
+
+    def release(self, job_id: str) -> None:
+        """Drop a job's references; its artifacts go at the next eviction unless shared."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM refs WHERE job_id = ?", (job_id,))
+
+    def maybe_evict(self) -> None:
+        """Run evict() at most once per `evict_interval` seconds."""
+        with self._lock:
+            now = time.time()
+            if now - self._last_evict < self.evict_interval:
+                return
+            self._last_evict = now
+        self.evict()
+
+    def evict(self) -> dict:
+        """Drop expired references, then unreferenced files, then the oldest jobs until under max_bytes."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM refs WHERE created_at < ?", (now - self.ttl_seconds,))
+            referenced = {row[0] for row in conn.execute("SELECT DISTINCT name FROM refs")}
+
+        files = self._scan()
+        removed = 0
+        for name, (path, size, mtime) in list(files.items()):
+            if name not in referenced and now - mtime > self.GRACE_SECONDS:
+                removed += self._remove(path)
+                del files[name]
+
+        total = sum(size for _, size, _ in files.values())
+        while total > self.max_bytes:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT job_id FROM refs GROUP BY job_id ORDER BY MIN(created_at) LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    break
+                conn.execute("DELETE FROM refs WHERE job_id = ?", (row[0],))
+                referenced = {r[0] for r in conn.execute("SELECT DISTINCT name FROM refs")}
+            for name, (path, size, _) in list(files.items()):
+                if name not in referenced:
+                    removed += self._remove(path)
+                    total -= size
+                    del files[name]
+
+        return {"files": len(files), "bytes": total, "removed": removed}
+
+    def stats(self) -> dict:
+        files = self._scan()
+        with self._connect() as conn:
+            jobs, refs = conn.execute("SELECT COUNT(DISTINCT job_id), COUNT(*) FROM refs").fetchone()
+        return {
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files.values()),
+            "jobs": jobs,
+            "refs": refs,
+        }
+
+    def _scan(self) -> dict:
+        """name -> (path, size, mtime) of every artifact on disk."""
+        files = {}
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            for item in os.scandir(entry.path):
+                if item.is_file() and not item.name.endswith(".tmp"):
+                    stat = item.stat()
+                    files[item.name] = (item.path, stat.st_size, stat.st_mtime)
+        return files
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
@@ -0,0 +1,27 @@
+# utils/async_loop.py
+import asyncio
+import threading
+
+# One event loop per process, running in a daemon thread. Async clients
+# that own a connection pool (e.g. the Azure OCR client) live on this loop,
+# so threads and other event loops can all share them.
+_loop = None
+_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="sases-async-loop", daemon=True)
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def run_coroutine(coro, timeout: float = None):
+    """Run a coroutine on the background loop and block until it finishes."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_background_loop())
+    return future.result(timeout)
+
@@ -0,0 +1,171 @@
+# utils/config.py
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- Pipeline Mode ---
+# "crew"   : every stage is driven by its LLM agent (original behaviour).
+# "direct" : alignment, OCR and evaluation are called as plain Python tools
+#            and only the insight (and optional validation) stage uses the LLM.
+PIPELINE_MODE = os.getenv("SASES_PIPELINE_MODE", "crew")
+
+# Run the LLM validation agent at the end of a "direct" pipeline run.
+DIRECT_RUN_VALIDATION = _env_bool("SASES_DIRECT_VALIDATION", False)
+
+# Number of pipeline stages that may run at the same time. The teacher and
+# student branches are independent until evaluation; 1 runs them one by one.
+MAX_PARALLEL_STAGES = int(os.getenv("SASES_MAX_PARALLEL_STAGES", "4"))
+
+# --- Alignment ---
+# Template features (ORB keypoints/descriptors) are cached per template
+# content hash so only the scanned sheet is processed on each call.
+TEMPLATE_CACHE_SIZE = int(os.getenv("SASES_TEMPLATE_CACHE_SIZE", "8"))
+# Optional directory where cached template features are also stored on disk.
+TEMPLATE_CACHE_DIR = os.getenv("SASES_TEMPLATE_CACHE_DIR") or None
+# Alignment engine: "fiducial" (printed corner marks), "pyramid"
+# (coarse-to-fine with LSH kNN matching) or
+# "orb" (full-resolution ORB with brute-force matching).
+ALIGNMENT_METHOD = os.getenv("SASES_ALIGNMENT_METHOD", "pyramid")
+# Refine the pyramid homography with ECC on a finer level before warping.
+ALIGNMENT_REFINE = _env_bool("SASES_ALIGNMENT_REFINE", False)
+# Used by the "fiducial" method when the corner marks can't be found.
+ALIGNMENT_FALLBACK_METHOD = os.getenv("SASES_ALIGNMENT_FALLBACK_METHOD", "pyramid")
+# Skip alignment for scans that are already registered to the template
+# (e.g. flatbed scans), checked with phase correlation on a small level.
+ALIGNMENT_SKIP_CHECK = _env_bool("SASES_ALIGNMENT_SKIP_CHECK", True)
+ALIGNMENT_SKIP_TOLERANCE_PX = float(os.getenv("SASES_ALIGNMENT_SKIP_TOLERANCE_PX", "2.0"))
+ALIGNMENT_SKIP_MIN_CORRELATION = float(os.getenv("SASES_ALIGNMENT_SKIP_MIN_CORRELATION", "0.8"))
+
+# --- OMR (bubble) reading ---
+# A bubble counts as filled when this fraction of its inner area is dark...
+OMR_FILL_THRESHOLD = float(os.getenv("SASES_OMR_FILL_THRESHOLD", "0.35"))
+# ...and it is at least this much darker than the next darkest bubble.
+OMR_MIN_MARGIN = float(os.getenv("SASES_OMR_MIN_MARGIN", "0.15"))
+
+# --- Azure OCR ---
+# Send OCR requests through the shared async client (pooled HTTP session,
+# bounded concurrency, 429/503 retry) instead of a blocking client per tool.
+OCR_ASYNC = _env_bool("SASES_OCR_ASYNC", True)
+OCR_MAX_CONCURRENCY = int(os.getenv("SASES_OCR_MAX_CONCURRENCY", "8"))
+OCR_MAX_RETRIES = int(os.getenv("SASES_OCR_MAX_RETRIES", "5"))
+OCR_BACKOFF_BASE_SECONDS = float(os.getenv("SASES_OCR_BACKOFF_BASE_SECONDS", "1.0"))
+
+# Persistent cache of parsed OCR output, keyed by image content hash,
+# model id and parsing version.
+OCR_CACHE_ENABLED = _env_bool("SASES_OCR_CACHE", True)
+OCR_CACHE_PATH = os.getenv("SASES_OCR_CACHE_PATH", "cache/ocr_cache.sqlite3")
+OCR_CACHE_MAX_MB = int(os.getenv("SASES_OCR_CACHE_MAX_MB", "256"))
+OCR_CACHE_TTL_DAYS = float(os.getenv("SASES_OCR_CACHE_TTL_DAYS", "30"))
+
+# --- Answer matching ---
+# Fill-in-the-blank text answers within this many edits per character of an
+# accepted answer count as correct (OCR noise); 0 turns approximate matching off.
+ANSWER_FUZZY_MAX_EDIT_RATIO = float(os.getenv("SASES_ANSWER_FUZZY_MAX_EDIT_RATIO", "0.2"))
+# Shorter answers must match exactly.
+ANSWER_FUZZY_MIN_LENGTH = int(os.getenv("SASES_ANSWER_FUZZY_MIN_LENGTH", "5"))
+# Numeric answers within this absolute difference of the key count as correct
+# (a key item's own "tolerance" takes precedence).
+ANSWER_NUMERIC_TOLERANCE = float(os.getenv("SASES_ANSWER_NUMERIC_TOLERANCE", "0"))
+
+# --- Class batches ---
+# Students graded at the same time in a batch (also the number of sheets
+# held in memory at once).
+BATCH_MAX_WORKERS = int(os.getenv("SASES_BATCH_MAX_WORKERS", "4"))
+
+# --- Exam registry ---
+# Registered exams (template, features, layout and parsed key) live here.
+EXAM_REGISTRY_DIR = os.getenv("SASES_EXAM_REGISTRY_DIR", "exams")
+
+# --- Outputs ---
+# Default folder for files written by tools run on their own (e.g. the aligned
+# image of AlignmentTool when no output path is given).
+OUTPUT_DIR = os.getenv("SASES_OUTPUT_DIR", "outputs")
+
+# Pipeline outputs (aligned images, answers, reports, insights) go to a
+# content-addressed artifact store. Artifacts are referenced per job; jobs
+# older than the TTL are released and the store is kept under its size cap.
+ARTIFACT_DIR = os.getenv("SASES_ARTIFACT_DIR", "artifacts")
+ARTIFACT_MAX_MB = int(os.getenv("SASES_ARTIFACT_MAX_MB", "2048"))
+ARTIFACT_TTL_DAYS = float(os.getenv("SASES_ARTIFACT_TTL_DAYS", "7"))
+
+# --- API ---
+# Pipeline runs executing at once; each one runs on a worker thread, off the event loop.
+API_MAX_CONCURRENT_RUNS = int(os.getenv("SASES_API_MAX_CONCURRENT_RUNS", "2"))
+# Requests allowed to wait for a free slot, and for how long, before a 503.
+API_MAX_QUEUED_RUNS = int(os.getenv("SASES_API_MAX_QUEUED_RUNS", "8"))
+API_QUEUE_TIMEOUT_SECONDS = float(os.getenv("SASES_API_QUEUE_TIMEOUT_SECONDS", "30"))
+# Largest accepted upload per file (0 = no limit).
+API_MAX_UPLOAD_MB = int(os.getenv("SASES_API_MAX_UPLOAD_MB", "25"))
+
+# --- Job queue ---
+# Jobs submitted through /api/v1/jobs are stored in a SQLite queue and run
+# by worker processes (python worker.py --workers N), separately from the web process.
+JOB_DIR = os.getenv("SASES_JOB_DIR", "jobs")
+JOB_QUEUE_PATH = os.getenv("SASES_JOB_QUEUE_PATH", os.path.join(JOB_DIR, "queue.sqlite3"))
+JOB_WORKERS = int(os.getenv("SASES_JOB_WORKERS", "2"))
+# A job whose worker stops heartbeating for this long is handed to another worker.
+JOB_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("SASES_JOB_VISIBILITY_TIMEOUT_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("SASES_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY_SECONDS = float(os.getenv("SASES_JOB_RETRY_DELAY_SECONDS", "10"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("SASES_JOB_POLL_INTERVAL_SECONDS", "1.0"))
+
+# --- Intermediate artifacts ---
+# "direct" mode passes images and results between stages in memory. Turn
+# this on to also write them (aligned images, answers, reports, insights)
+# to the artifact store for debugging or auditing.
+PERSIST_INTERMEDIATES = _env_bool("SASES_PERSIST_INTERMEDIATES", False)
+
+# --- Checkpoints ---
+# "direct" mode checkpoints every stage's output in the artifact store,
+# keyed by a hash of its inputs and the stage version, so a failed run
+# resumes from the first stage that has no valid checkpoint.
+CHECKPOINTS_ENABLED = _env_bool("SASES_CHECKPOINTS", True)
+
+# --- LLM ---
+# One client per process is shared by every agent (LiteLLM reuses its HTTP
+# connections across calls).
+LLM_MODEL = os.getenv("SASES_LLM_MODEL", "gemini/gemini-2.5-flash")  # "gemini/" prefix for LiteLLM
+LLM_TEMPERATURE = float(os.getenv("SASES_LLM_TEMPERATURE", "0.1"))
+# Persistent cache of LLM responses, keyed by model, parameters and the full
+# message list: templated prompts that repeat exactly are answered from it.
+# Least recently used responses are evicted beyond the size cap.
+LLM_CACHE_ENABLED = _env_bool("SASES_LLM_CACHE", True)
+LLM_CACHE_PATH = os.getenv("SASES_LLM_CACHE_PATH", "cache/llm_cache.sqlite3")
+LLM_CACHE_MAX_MB = int(os.getenv("SASES_LLM_CACHE_MAX_MB", "128"))
+LLM_CACHE_TTL_DAYS = float(os.getenv("SASES_LLM_CACHE_TTL_DAYS", "30"))
+# Replay: answer only from the cache and fail on a miss, never calling the
+# model (offline test runs against a recorded cache).
+LLM_REPLAY_ONLY = _env_bool("SASES_LLM_REPLAY", False)
+
+# --- Startup ---
+# Agents, tools and their heavy imports (crewai, OpenCV, the Azure SDK) are
+# built on first use. api.py and worker.py warm them up in the background
+# right after start, so they are ready before the first request or job.
+WARM_UP_ON_START = _env_bool("SASES_WARM_UP_ON_START", True)
+# Time from process start until main.py / api.py / worker.py are ready;
+# exceeding it prints a warning along with the heavy modules already loaded.
+STARTUP_BUDGET_SECONDS = float(os.getenv("SASES_STARTUP_BUDGET_SECONDS", "2.0"))
+
+# --- Insights ---
+# "llm": the written feedback comes from the LLM, several students per
+# request. "template": rule-based feedback, no LLM calls (e.g. when the
+# quota is exhausted). The numeric fields always come from the report.
+INSIGHT_MODE = os.getenv("SASES_INSIGHT_MODE", "llm")
+# Distinct score profiles sent in one LLM request, and requests at once.
+INSIGHT_BATCH_SIZE = int(os.getenv("SASES_INSIGHT_BATCH_SIZE", "10"))
+INSIGHT_MAX_CONCURRENCY = int(os.getenv("SASES_INSIGHT_MAX_CONCURRENCY", "4"))
+# When an LLM request fails, use template feedback for its students
+# (it is not cached or checkpointed, so the next run asks the LLM again).
+INSIGHT_TEMPLATE_FALLBACK = _env_bool("SASES_INSIGHT_TEMPLATE_FALLBACK", True)
+# Persistent cache of LLM feedback per score profile (which questions were
+# right, wrong or unanswered), so identical profiles reuse their feedback.
+INSIGHT_CACHE_ENABLED = _env_bool("SASES_INSIGHT_CACHE", True)
+INSIGHT_CACHE_PATH = os.getenv("SASES_INSIGHT_CACHE_PATH", "cache/insight_cache.sqlite3")
+INSIGHT_CACHE_MAX_MB = int(os.getenv("SASES_INSIGHT_CACHE_MAX_MB", "64"))
+INSIGHT_CACHE_TTL_DAYS = float(os.getenv("SASES_INSIGHT_CACHE_TTL_DAYS", "90"))
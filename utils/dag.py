@@ -0,0 +1,84 @@
+# utils/dag.py
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# A stage is (names of the stages it depends on, function).
+# The function receives a dict with the results of its dependencies.
+Stage = Tuple[Iterable[str], Callable[[Dict[str, Any]], Any]]
+
+
+class StageError(Exception):
+    """Raised when a stage fails. Carries the results finished so far."""
+
+    def __init__(self, stage: str, error: Exception, results: Dict[str, Any]):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.results = results
+
+
+def run_dag(stages: Dict[str, Stage], max_workers: int = 4,
+            on_stage: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+    """
+    Run a set of dependent stages on a thread pool.
+
+    Every stage starts as soon as all of its dependencies have finished,
+    so independent branches (e.g. teacher and student sheets) overlap.
+    Returns a dict mapping each stage name to its result.
+
+    `on_stage(name, result)` is called as each stage succeeds, from the
+    calling thread. Errors raised by the callback are reported and ignored.
+    """
+    dependencies = {name: set(deps) for name, (deps, _) in stages.items()}
+    for name, deps in dependencies.items():
+        unknown = deps - stages.keys()
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {sorted(unknown)}")
+
+    results: Dict[str, Any] = {}
+    pending = dict(dependencies)
+    running = {}
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while pending or running:
+            # --- Submit every stage whose dependencies are all done ---
+            if failure is None:
+                ready = [name for name, deps in pending.items() if deps <= results.keys()]
+                for name in ready:
+                    del pending[name]
+                    inputs = {dep: results[dep] for dep in dependencies[name]}
+                    running[executor.submit(stages[name][1], inputs)] = name
+
+            if not running:
+                if failure is None and pending:
+                    raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+                break
+
+            # --- Wait for at least one running stage to finish ---
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    # Stop scheduling new stages, let the running ones finish
+                    if failure is None:
+                        failure = (name, e)
+                    continue
+                notify_stage(on_stage, name, results[name])
+
+    if failure is not None:
+        raise StageError(failure[0], failure[1], results) from failure[1]
+
+    return results
+
+
+def notify_stage(on_stage: Optional[Callable[[str, Any], None]], name: str, result: Any) -> None:
+    """Report a finished stage; a failing progress callback never fails the pipeline."""
+    if on_stage is None:
+        return
+    try:
+        on_stage(name, result)
+    except Exception as e:
+        print(f"Warning: progress callback failed for stage '{name}': {e}")
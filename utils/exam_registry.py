@@ -0,0 +1,261 @@
+# utils/exam_registry.py
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.artifact_store import atomic_write_json
+from utils.hashing import file_sha256
+
+MANIFEST_FILE = "exam.json"
+ANSWER_KEY_FILE = "answer_key.json"
+LAYOUT_FILE = "layout.json"
+FEATURES_DIR = "features"
+STUDENTS_DIR = "students"
+CLASS_SUMMARY_FILE = "class_summary.json"
+ANSWERS_SUFFIX = "_answers.json"
+REPORT_SUFFIX = "_report.json"
+
+_UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class UnknownExamError(LookupError):
+    """Raised for an exam id that is not registered."""
+
+
+class DuplicateStudentError(ValueError):
+    """Raised when a different sheet is already stored under a student id."""
+
+
+def normalize_student_id(student_id: str) -> str:
+    """A student id made safe to use as a file name."""
+    return _UNSAFE_NAME_CHARS.sub("_", student_id.strip()).lstrip(".") or "student"
+
+
+def student_id_from_sheet(name: str) -> str:
+    """
+    The default student id of a sheet: its file name, or its path inside
+    an uploaded zip or a batch folder, without the extension
+    ("classA/alice.jpg" -> "classA_alice"). Every route names students
+    this way unless the caller gives an explicit id.
+    """
+    return normalize_student_id(os.path.splitext(name.replace("\\", "/").strip("/"))[0])
+
+
+def _create_json(path: str, data) -> bool:
+    """Write `data` to `path` only if no file is there yet (atomically); False if one is."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.link(tmp_path, path)  # Fails if the file exists, even if another process just wrote it
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+
+class ExamRegistry:
+    """
+    Durable, on-disk registry of exams whose teacher side is already done.
+
+    Each exam lives in <root>/<exam_id>/ with the template image, the
+    parsed answer key, the optional zone layout, the precomputed template
+    features (.npz) and an exam.json manifest. An exam directory is built
+    under a temporary name and renamed into place, so a crash never leaves
+    a half-registered exam behind.
+
+    Graded students are kept under <exam_id>/students/ as
+    <student>_answers.json (the OCR output and the hash of the sheet it
+    came from) and <student>_report.json, so the class can be re-graded
+    against a corrected key without redoing alignment or OCR. A student
+    id holds one sheet: storing a different sheet under it raises
+    DuplicateStudentError unless `replace` is set.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._loaded_features = set()
+        self._lock = threading.Lock()
+
+    def register(self, template_path: str, answer_key: dict, template_features: Dict[str, dict],
+                 layout_path: str = None, teacher_alignment: dict = None, name: str = None) -> dict:
+        exam_id = uuid.uuid4().hex[:12]
+        staging_dir = tempfile.mkdtemp(prefix=f".{exam_id}_", dir=self.root)
+
+        try:
+            template_file = f"template{os.path.splitext(template_path)[1].lower() or '.jpg'}"
+            shutil.copyfile(template_path, os.path.join(staging_dir, template_file))
+
+            with open(os.path.join(staging_dir, ANSWER_KEY_FILE), 'w') as f:
+                json.dump(answer_key, f, indent=2)
+
+            if layout_path:
+                shutil.copyfile(layout_path, os.path.join(staging_dir, LAYOUT_FILE))
+
+            features_dir = os.path.join(staging_dir, FEATURES_DIR)
+            os.makedirs(features_dir)
+            for key, entry in template_features.items():
+                with open(os.path.join(features_dir, f"{key}.npz"), "wb") as f:
+                    np.savez(f, **entry)
+
+            manifest = {
+                "exam_id": exam_id,
+                "name": name,
+                "created_at": time.time(),
+                "template_file": template_file,
+                "template_sha256": file_sha256(template_path),
+                "answer_key_file": ANSWER_KEY_FILE,
+                "layout_file": LAYOUT_FILE if layout_path else None,
+                "teacher_alignment": teacher_alignment,
+            }
+            with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+            os.replace(staging_dir, self._exam_dir(exam_id))
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        return manifest
+
+    def get(self, exam_id: str) -> Optional[dict]:
+        manifest_path = os.path.join(self._exam_dir(exam_id), MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+
+    def list(self) -> List[dict]:
+        exams = []
+        for exam_id in sorted(os.listdir(self.root)):
+            if exam_id.startswith("."):
+                continue
+            manifest = self.get(exam_id)
+            if manifest:
+                exams.append(manifest)
+        return exams
+
+    def key_context(self, exam_id: str) -> Optional[dict]:
+        """
+        Build the key context SASESCrew.grade_student() expects, straight
+        from the stored exam, so no teacher-side work is redone.
+        """
+        manifest = self.get(exam_id)
+        if manifest is None:
+            return None
+        exam_dir = self._exam_dir(exam_id)
+        answer_key_path = os.path.join(exam_dir, manifest["answer_key_file"])
+        with open(answer_key_path, 'r') as f:
+            answer_key = json.load(f)
+
+        return {
+            "exam_id": exam_id,
+            "template_path": os.path.join(exam_dir, manifest["template_file"]),
+            "layout_path": os.path.join(exam_dir, manifest["layout_file"]) if manifest["layout_file"] else None,
+            "teacher_alignment": manifest.get("teacher_alignment"),
+            "answer_key": answer_key,
+            "answer_key_path": answer_key_path,
+        }
+
+    def update_answer_key(self, exam_id: str, answer_key: dict) -> None:
+        """Replace an exam's answer key (e.g. after a teacher's correction)."""
+        manifest = self.get(exam_id)
+        if manifest is None:
+            raise UnknownExamError(f"Unknown exam id: '{exam_id}'")
+        exam_dir = self._exam_dir(exam_id)
+        atomic_write_json(os.path.join(exam_dir, manifest["answer_key_file"]), answer_key)
+        manifest["answer_key_updated_at"] = time.time()
+        atomic_write_json(os.path.join(exam_dir, MANIFEST_FILE), manifest)
+
+    # --- Graded students ---
+
+    def save_student(self, exam_id: str, student: str, answers: dict, report: dict = None,
+                     sheet_sha256: str = None, replace: bool = False) -> None:
+        path = self._student_path(exam_id, student, ANSWERS_SUFFIX)
+        record = {"student": student, "sheet_sha256": sheet_sha256, "answers": answers}
+        if not replace and not _create_json(path, record):
+            self.check_student(exam_id, student, sheet_sha256)
+            replace = True  # The same sheet again, e.g. a retried job
+        if replace:
+            atomic_write_json(path, record)
+        if report is not None:
+            self.save_student_report(exam_id, student, report)
+
+    def check_student(self, exam_id: str, student: str, sheet_sha256: str = None) -> None:
+        """Raise DuplicateStudentError if another sheet is stored under `student`."""
+        try:
+            with open(self._student_path(exam_id, student, ANSWERS_SUFFIX), 'r') as f:
+                stored = json.load(f).get("sheet_sha256")
+        except FileNotFoundError:
+            return
+        if sheet_sha256 is None or stored != sheet_sha256:
+            raise DuplicateStudentError(
+                f"Student '{student}' already has a graded sheet for exam '{exam_id}'; "
+                f"give this sheet its own student id, or replace the stored one."
+            )
+
+    def save_student_report(self, exam_id: str, student: str, report: dict) -> None:
+        atomic_write_json(self._student_path(exam_id, student, REPORT_SUFFIX), report)
+
+    def student_answers(self, exam_id: str) -> Dict[str, dict]:
+        """Stored answers of every graded student, by student id."""
+        students_dir = os.path.join(self._exam_dir(exam_id), STUDENTS_DIR)
+        if not os.path.isdir(students_dir):
+            return {}
+        answers = {}
+        for file_name in sorted(os.listdir(students_dir)):
+            if file_name.endswith(ANSWERS_SUFFIX):
+                with open(os.path.join(students_dir, file_name), 'r') as f:
+                    answers[file_name[:-len(ANSWERS_SUFFIX)]] = json.load(f)["answers"]
+        return answers
+
+    def student_report(self, exam_id: str, student: str) -> Optional[dict]:
+        try:
+            with open(self._student_path(exam_id, student, REPORT_SUFFIX), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_class_summary(self, exam_id: str, class_summary: dict) -> None:
+        atomic_write_json(os.path.join(self._exam_dir(exam_id), CLASS_SUMMARY_FILE), class_summary)
+
+    def _student_path(self, exam_id: str, student: str, suffix: str) -> str:
+        return os.path.join(self._exam_dir(exam_id), STUDENTS_DIR, f"{normalize_student_id(student)}{suffix}")
+
+    def template_features(self, exam_id: str) -> Dict[str, dict]:
+        """Load the stored template features, keyed by template cache key."""
+        features_dir = os.path.join(self._exam_dir(exam_id), FEATURES_DIR)
+        features = {}
+        if not os.path.isdir(features_dir):
+            return features
+        for file_name in os.listdir(features_dir):
+            if not file_name.endswith(".npz"):
+                continue
+            with np.load(os.path.join(features_dir, file_name), allow_pickle=False) as data:
+                features[file_name[:-len(".npz")]] = {name: data[name] for name in data.files}
+        return features
+
+    def features_loaded(self, exam_id: str) -> bool:
+        with self._lock:
+            return exam_id in self._loaded_features
+
+    def mark_features_loaded(self, exam_id: str) -> None:
+        with self._lock:
+            self._loaded_features.add(exam_id)
+
+    def _exam_dir(self, exam_id: str) -> str:
+        # exam ids are generated hex strings; refuse anything that could escape the root
+        if not exam_id or os.path.basename(exam_id) != exam_id or exam_id.startswith("."):
+            raise ValueError(f"Invalid exam id: '{exam_id}'")
+        return os.path.join(self.root, exam_id)
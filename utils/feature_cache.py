@@ -0,0 +1,135 @@
+# utils/feature_cache.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# A cache entry is a flat dict of NumPy arrays so it can be stored as .npz
+FeatureEntry = Dict[str, np.ndarray]
+
+
+class TemplateFeatureCache:
+    """
+    Thread-safe LRU cache for per-template data (keypoints, descriptors,
+    shape, ...), keyed by a string such as the template's content hash.
+
+    Entries live in memory up to `max_entries`; the least recently used
+    entry is evicted first. If `spill_dir` is set, entries are also written
+    there as .npz files (at most `max_disk_entries`) and reloaded on a
+    memory miss, so they survive eviction and process restarts.
+    """
+
+    def __init__(self, max_entries: int = 8, spill_dir: Optional[str] = None,
+                 max_disk_entries: int = 256):
+        self.max_entries = max(1, max_entries)
+        self.spill_dir = spill_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, FeatureEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[FeatureEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, entry)
+            return entry
+
+    def put(self, key: str, entry: FeatureEntry) -> None:
+        with self._lock:
+            self._store(key, entry)
+        self._save_to_disk(key, entry)
+
+    def get_or_compute(self, key: str, compute: Callable[[], FeatureEntry]) -> FeatureEntry:
+        entry = self.get(key)
+        if entry is None:
+            entry = compute()
+            self.put(key, entry)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # --- Internal helpers ---
+
+    def _store(self, key: str, entry: FeatureEntry) -> None:
+        """Insert under the lock and evict least recently used entries."""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.npz")
+
+    def _load_from_disk(self, key: str) -> Optional[FeatureEntry]:
+        if not self.spill_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {name: data[name] for name in data.files}
+            os.utime(path)  # Mark as recently used for disk eviction
+            return entry
+        except Exception as e:
+            print(f"[TemplateFeatureCache] Ignoring unreadable cache file {path}: {e}")
+            return None
+
+    def _save_to_disk(self, key: str, entry: FeatureEntry) -> None:
+        if not self.spill_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **entry)
+            os.replace(tmp_path, path)  # Atomic, so readers never see half a file
+        except Exception as e:
+            print(f"[TemplateFeatureCache] Could not write {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        files = [
+            os.path.join(self.spill_dir, name)
+            for name in os.listdir(self.spill_dir)
+            if name.endswith(".npz")
+        ]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
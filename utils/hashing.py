@@ -0,0 +1,16 @@
+# utils/hashing.py
+import hashlib
+
+
+def bytes_sha256(data: bytes) -> str:
+    """Hex SHA-256 of a bytes object."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
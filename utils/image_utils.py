@@ -0,0 +1,66 @@
+# utils/image_utils.py
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# (x, y, width, height)
+Box = Tuple[int, int, int, int]
+
+
+def crop_box(image, box: Sequence[int]):
+    """Crop an (x, y, w, h) box, clipped to the image bounds."""
+    x, y, w, h = (int(v) for v in box)
+    height, width = image.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + w), min(height, y + h)
+    return image[y0:y1, x0:x1]
+
+
+def pack_zones(image, boxes: Sequence[Sequence[int]], padding: int = 24,
+               max_width: int = 2000, min_size: int = 50) -> Tuple[np.ndarray, List[Box]]:
+    """
+    Crop each box from the image and pack the crops into one compact
+    composite image, row by row (tallest first), separated by white padding.
+
+    Returns (composite, slots) where slots[i] is the (x, y, w, h) position
+    of boxes[i] inside the composite.
+    """
+    crops = [crop_box(image, box) for box in boxes]
+    order = sorted(range(len(crops)), key=lambda i: crops[i].shape[0], reverse=True)
+
+    # --- Shelf packing: fill a row left to right, then start a new row ---
+    slots: List[Box] = [(0, 0, 0, 0)] * len(crops)
+    x, y, row_height, used_width = padding, padding, 0, 0
+    for i in order:
+        h, w = crops[i].shape[:2]
+        if x > padding and x + w + padding > max_width:
+            x, y, row_height = padding, y + row_height + padding, 0
+        slots[i] = (x, y, w, h)
+        x += w + padding
+        row_height = max(row_height, h)
+        used_width = max(used_width, x)
+
+    width = max(min_size, used_width)
+    height = max(min_size, y + row_height + padding)
+    shape = (height, width) + image.shape[2:]
+    composite = np.full(shape, 255, dtype=image.dtype)
+    for crop, (sx, sy, w, h) in zip(crops, slots):
+        composite[sy:sy + h, sx:sx + w] = crop
+
+    return composite, slots
+
+
+def slot_for_point(slots: Sequence[Box], px: float, py: float) -> int:
+    """Index of the slot containing a point, or -1 if it is in the padding."""
+    for i, (x, y, w, h) in enumerate(slots):
+        if x <= px < x + w and y <= py < y + h:
+            return i
+    return -1
+
+
+def encode_png(image) -> bytes:
+    ok, buffer = cv2.imencode(".png", image)
+    if not ok:
+        raise Exception("Failed to encode image as PNG.")
+    return buffer.tobytes()
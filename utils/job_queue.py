@@ -0,0 +1,222 @@
+# utils/job_queue.py
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+# Job states: queued -> running -> succeeded | failed
+# A running job whose lease expires (crashed or stuck worker) goes back to
+# queued, or to failed once it has used all of its attempts.
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Persistent SQLite work queue shared by the web process and any number
+    of worker processes.
+
+    A worker claims a job with a lease of `visibility_timeout` seconds and
+    keeps it alive with heartbeat(). If the lease runs out, the job becomes
+    visible to other workers again. Failed attempts are retried after an
+    exponential delay until `max_attempts` is reached.
+    """
+
+    def __init__(self, db_path: str, visibility_timeout: float = 600, max_attempts: int = 3,
+                 retry_delay: float = 10.0):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    available_at REAL NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, available_at)")
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can
+        # never claim the same job
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def enqueue(self, kind: str, payload: dict, job_id: str = None) -> str:
+        job_id = job_id or new_job_id()
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, self.max_attempts, now, now, now)
+            )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """Lease the oldest available job to `worker_id`, or return None."""
+        now = time.time()
+        with self._transaction() as conn:
+            self._release_expired(conn, now)
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND available_at <= ? "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+                "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, worker_id, now + self.visibility_timeout, now, row[0])
+            )
+            return self._fetch(conn, row[0])
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease. False means the job is no longer ours."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (now + self.visibility_timeout, now, job_id, worker_id, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def record_stage(self, job_id: str, worker_id: str, stage: str, info: dict = None) -> bool:
+        """Record a finished stage in the job's progress (also extends the lease)."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT progress FROM jobs WHERE id = ? AND worker_id = ? AND status = ?",
+                (job_id, worker_id, RUNNING)
+            ).fetchone()
+            if row is None:
+                return False
+            progress = json.loads(row[0])
+            progress[stage] = dict(info or {}, finished_at=now)
+            conn.execute(
+                "UPDATE jobs SET progress = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(progress, default=str), now + self.visibility_timeout, now, job_id)
+            )
+            return True
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_expires_at = NULL, "
+                "updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (SUCCEEDED, json.dumps(result, default=str), now, job_id, worker_id, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt. The job is requeued with a backoff delay,
+        or marked failed once out of attempts. Returns the new status, or
+        None if the job is no longer ours.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ? AND status = ?",
+                (job_id, worker_id, RUNNING)
+            ).fetchone()
+            if row is None:
+                return None
+            attempts, max_attempts = row
+            status = FAILED if attempts >= max_attempts else QUEUED
+            delay = self.retry_delay * (2 ** (attempts - 1))
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker_id = NULL, lease_expires_at = NULL, "
+                "progress = '{}', available_at = ?, updated_at = ? WHERE id = ?",
+                (status, error, now + delay, now, job_id)
+            )
+            return status
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._transaction() as conn:
+            self._release_expired(conn, time.time())
+            return self._fetch(conn, job_id)
+
+    def stats(self) -> dict:
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _release_expired(self, conn, now: float) -> None:
+        """Make jobs of lost workers visible again (or fail them when out of attempts)."""
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = 'Worker lost (lease expired); out of attempts.', "
+            "worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts",
+            (FAILED, now, RUNNING, now)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = 'Worker lost (lease expired); retrying.', "
+            "worker_id = NULL, lease_expires_at = NULL, progress = '{}', available_at = ?, updated_at = ? "
+            "WHERE status = ? AND lease_expires_at < ?",
+            (QUEUED, now, now, RUNNING, now)
+        )
+
+    @staticmethod
+    def _fetch(conn, job_id: str) -> Optional[dict]:
+        row = conn.execute(
+            "SELECT id, kind, payload, status, attempts, max_attempts, worker_id, progress, "
+            "result, error, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "payload": json.loads(row[2]),
+            "status": row[3],
+            "attempts": row[4],
+            "max_attempts": row[5],
+            "worker_id": row[6],
+            "progress": json.loads(row[7]),
+            "result": json.loads(row[8]) if row[8] is not None else None,
+            "error": row[9],
+            "created_at": row[10],
+            "updated_at": row[11],
+        }
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:16]
@@ -0,0 +1,119 @@
+# utils/json_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class JSONCache:
+    """
+    Persistent SQLite cache of JSON values, keyed by content address.
+
+    Entries older than `ttl_seconds` are treated as missing and removed.
+    When the stored JSON exceeds `max_bytes`, the least recently used
+    entries are evicted. Hit and miss counters are kept per process.
+    Subclasses set `table`, so several caches can share one database file.
+    """
+
+    table = "json_cache"
+
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: float = 30 * 24 * 3600):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    output TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_access ON {self.table}(last_access)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the cache safe across threads
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:  # Commit on success, roll back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT output, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, output: dict) -> None:
+        payload = json.dumps(output)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, output, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now)
+            )
+        self.evict()
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def evict(self) -> None:
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access").fetchall()
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                total -= size
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": total,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
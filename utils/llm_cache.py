@@ -0,0 +1,31 @@
+# utils/llm_cache.py
+import json
+
+from utils.hashing import bytes_sha256
+from utils.json_cache import JSONCache
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay mode when a prompt has no cached response."""
+
+
+def llm_cache_key(model: str, params: dict, messages) -> str:
+    """
+    Content address of an LLM response: the model, every parameter that
+    changes the output (temperature, stop words, response schema...) and
+    the full message list.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    payload = json.dumps([model, params, messages], sort_keys=True, default=str)
+    return f"{bytes_sha256(payload.encode())}:{model}"
+
+
+class LLMCache(JSONCache):
+    """
+    Persistent cache of LLM responses, keyed by llm_cache_key(). Entries
+    hold the response text and its token counts, so cache hits still show
+    up in the usage accounting.
+    """
+
+    table = "llm_cache"
@@ -0,0 +1,107 @@
+# utils/llm_usage.py
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# (job_id, stage) that LLM calls made in the current context are charged to
+_scope: ContextVar = ContextVar("sases_llm_scope", default=(None, None))
+
+# Per-job usage is kept for this many recent jobs
+_MAX_JOBS = 256
+
+_COUNTERS = ("calls", "cache_hits", "estimated_calls", "prompt_tokens", "completion_tokens", "cached_tokens",
+             "latency_seconds")
+
+
+@contextmanager
+def usage_scope(job_id: Optional[str], stage: Optional[str]):
+    """Charge the LLM calls made inside the block (in this thread or context) to a job's stage."""
+    token = _scope.set((job_id, stage))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> tuple:
+    return _scope.get()
+
+
+def _empty() -> Dict[str, float]:
+    return dict.fromkeys(_COUNTERS, 0)
+
+
+class UsageTracker:
+    """
+    Thread-safe LLM usage counters: calls, cache hits, prompt/completion
+    tokens (tokens served from the cache are counted as cached_tokens
+    instead) and time spent waiting on the model, per job and stage and
+    for the whole process. Calls whose token counts are estimates rather
+    than the provider's usage are counted in estimated_calls.
+    """
+
+    def __init__(self, max_jobs: int = _MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict[str, Dict[str, float]]]" = OrderedDict()
+        self._totals = _empty()
+        self._lock = threading.Lock()
+
+    def record(self, prompt_tokens: int, completion_tokens: int, latency: float = 0.0,
+               cache_hit: bool = False, estimated: bool = False) -> None:
+        """Record one LLM call against the current scope (see usage_scope())."""
+        job_id, stage = current_scope()
+        usage = _empty()
+        usage["calls"] = 1
+        usage["estimated_calls"] = int(estimated)
+        if cache_hit:
+            usage["cache_hits"] = 1
+            usage["cached_tokens"] = prompt_tokens + completion_tokens
+        else:
+            usage["prompt_tokens"] = prompt_tokens
+            usage["completion_tokens"] = completion_tokens
+            usage["latency_seconds"] = latency
+
+        with self._lock:
+            targets = [self._totals]
+            if job_id is not None:
+                stages = self._jobs.get(job_id)
+                if stages is None:
+                    stages = self._jobs[job_id] = {}
+                    while len(self._jobs) > self.max_jobs:
+                        self._jobs.popitem(last=False)
+                else:
+                    self._jobs.move_to_end(job_id)
+                targets.append(stages.setdefault(stage or "other", _empty()))
+            for target in targets:
+                for name, value in usage.items():
+                    target[name] += value
+
+    def job_usage(self, job_id: str) -> Optional[dict]:
+        """{"stages": {stage: counters}, "total": counters} for a job, or None if it made no LLM calls."""
+        with self._lock:
+            stages = self._jobs.get(job_id)
+            if stages is None:
+                return None
+            total = _empty()
+            for counters in stages.values():
+                for name, value in counters.items():
+                    total[name] += value
+            return {
+                "stages": {stage: _rounded(counters) for stage, counters in stages.items()},
+                "total": _rounded(total),
+            }
+
+    def totals(self) -> dict:
+        """Usage of every LLM call made by this process."""
+        with self._lock:
+            return _rounded(self._totals)
+
+
+def _rounded(counters: Dict[str, float]) -> dict:
+    return {name: round(value, 3) if name == "latency_seconds" else int(value) for name, value in counters.items()}
+
+
+# Shared by every LLM client in this process
+usage_tracker = UsageTracker()
@@ -0,0 +1,21 @@
+# utils/ocr_cache.py
+from utils.hashing import bytes_sha256
+from utils.json_cache import JSONCache
+
+
+def ocr_cache_key(image_bytes: bytes, model_id: str, parsing_version: str, scope: str = "page") -> str:
+    """
+    Content address of an OCR result: the image bytes, the Azure model and
+    the version of our parsing code. `scope` separates parsers that read
+    the same bytes differently (e.g. whole page vs. a specific zone layout).
+    """
+    return f"{bytes_sha256(image_bytes)}:{model_id}:{parsing_version}:{scope}"
+
+
+class OCRCache(JSONCache):
+    """
+    Persistent SQLite cache of parsed OCR output, keyed by content address
+    (see ocr_cache_key()).
+    """
+
+    table = "ocr_cache"
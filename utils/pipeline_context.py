@@ -0,0 +1,79 @@
+# utils/pipeline_context.py
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+
+class PipelineContext:
+    """
+    In-memory artifacts of one pipeline run: decoded images (NumPy arrays)
+    and stage results (dicts), handed from stage to stage without touching
+    the filesystem.
+
+    With a `store` (an ArtifactStore), every artifact stored with a key is
+    also written there under `job_id`, as a debug/audit sink. Stages never
+    read it back.
+
+    `force_stages` names the stages of this run that must ignore their
+    checkpoints.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, store=None, job_id: Optional[str] = None, force_stages: Iterable[str] = ()):
+        self.store = store
+        self.job_id = job_id
+        self.force_stages = frozenset(force_stages or ())
+        self._images: Dict[str, Any] = {}
+        self._results: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def put_image(self, name: str, image, key: str = None) -> Optional[str]:
+        """Store an image; returns the path it was persisted to, if any."""
+        with self._lock:
+            self._images[name] = image
+        if self.store is None or not key:
+            return None
+        return self.store.write_image(self.job_id, key, image)
+
+    def image(self, name: str, default=_MISSING):
+        with self._lock:
+            if default is not self._MISSING:
+                return self._images.get(name, default)
+            return self._images[name]
+
+    def put_result(self, name: str, result, key: str = None) -> Optional[str]:
+        """Store a stage result; returns the path it was persisted to, if any."""
+        with self._lock:
+            self._results[name] = result
+        if self.store is None or not key:
+            return None
+        if isinstance(result, str):
+            return self.store.write_text(self.job_id, key, result)
+        return self.store.write_json(self.job_id, key, result)
+
+    def result(self, name: str, default=_MISSING):
+        with self._lock:
+            if default is not self._MISSING:
+                return self._results.get(name, default)
+            return self._results[name]
+
+    def path(self, key: str) -> Optional[str]:
+        """Where an artifact is persisted, or None without a sink."""
+        return self.store.path(key) if self.store is not None else None
+
+
+def load_sheet(sheet_path: str):
+    """
+    Read a sheet once: the encoded bytes (what whole-page OCR sends) and
+    the decoded grayscale image (what alignment needs).
+    """
+    import cv2  # Deferred: keeps importing the pipeline cheap
+
+    with open(sheet_path, "rb") as f:
+        image_bytes = f.read()
+    gray = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise Exception(f"Failed to load image: {sheet_path}")
+    return image_bytes, gray
@@ -0,0 +1,30 @@
+# utils/startup.py
+# Entry points import this module before load_dotenv(), so it must not
+# import utils.config (which reads the environment) at module level
+import sys
+import time
+
+# Imported first by the entry points, so this is (close to) process start
+_STARTED = time.perf_counter()
+
+# Modules that each add a noticeable share of the cold start
+HEAVY_MODULES = ("crewai", "litellm", "cv2", "azure.ai.documentintelligence")
+
+
+def elapsed(since: float = None) -> float:
+    """Seconds since `since` (a perf_counter value), by default since the entry point started importing."""
+    return time.perf_counter() - (_STARTED if since is None else since)
+
+
+def report_startup(name: str, since: float = None, budget: float = None) -> float:
+    """Print how long `name` took to become ready, against the startup budget."""
+    from utils import config
+
+    budget = config.STARTUP_BUDGET_SECONDS if budget is None else budget
+    seconds = elapsed(since)
+    loaded = [module for module in HEAVY_MODULES if module in sys.modules]
+    print(f"[{name}] Ready in {seconds:.2f}s (budget {budget:.2f}s)"
+          + (f"; heavy modules loaded: {', '.join(loaded)}" if loaded else ""))
+    if seconds > budget:
+        print(f"[{name}] WARNING: startup over budget by {seconds - budget:.2f}s")
+    return seconds
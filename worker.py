@@ -0,0 +1,170 @@
+# worker.py
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+from dotenv import load_dotenv
+
+# Workers need the same env vars as the API
+# (GOOGLE_API_KEY, AZURE_VISION_ENDPOINT, AZURE_VISION_KEY)
+load_dotenv()
+
+from utils import config
+from utils.startup import elapsed, report_startup
+from utils.job_queue import JobQueue, FAILED, SUCCEEDED
+
+
+def create_job_queue() -> JobQueue:
+    return JobQueue(
+        config.JOB_QUEUE_PATH,
+        visibility_timeout=config.JOB_VISIBILITY_TIMEOUT_SECONDS,
+        max_attempts=config.JOB_MAX_ATTEMPTS,
+        retry_delay=config.JOB_RETRY_DELAY_SECONDS
+    )
+
+
+def _serializable(result):
+    # "crew" mode returns a CrewOutput; "direct" mode a plain dict
+    try:
+        return result.model_dump()
+    except AttributeError:
+        return result
+
+
+def _stage_info(result) -> dict:
+    """What a progress entry keeps of a stage result: the score, once there is one."""
+    if isinstance(result, dict) and isinstance(result.get("summary"), dict):
+        return {"summary": result["summary"]}
+    return {}
+
+
+def run_job(crew, job: dict, on_stage=None):
+    """Run one queued job on a warm SASESCrew and return its JSON-ready result."""
+    payload = job["payload"]
+    if job["kind"] == "evaluate":
+        result = crew.process_answer_sheet(
+            template_path=payload["template_path"],
+            teacher_sheet_path=payload["teacher_sheet_path"],
+            student_sheet_path=payload["student_sheet_path"],
+            mode=payload.get("mode"),
+            layout_path=payload.get("layout_path"),
+            job_id=job["job_id"],
+            on_stage=on_stage,
+            force_stages=payload.get("force_stages", ())
+        )
+    elif job["kind"] == "exam_evaluate":
+        result = crew.grade_exam_student(
+            payload["exam_id"],
+            payload["student_sheet_path"],
+            payload.get("include_insights", True),
+            job_id=job["job_id"],
+            on_stage=on_stage,
+            force_stages=payload.get("force_stages", ()),
+            student_id=payload.get("student_id"),
+            replace=payload.get("replace", False)
+        )
+    else:
+        raise ValueError(f"Unknown job kind: '{job['kind']}'")
+
+    result = _serializable(result)
+    # "direct" mode reports stage failures in the result instead of raising
+    if isinstance(result, dict) and result.get("success") is False:
+        raise RuntimeError(result.get("error") or "Pipeline failed.")
+    return result
+
+
+def _heartbeat(queue: JobQueue, job_id: str, worker_id: str, stop: threading.Event):
+    # Renew the lease well before it runs out, while a long stage is running
+    interval = max(1.0, queue.visibility_timeout / 3)
+    while not stop.wait(interval):
+        if not queue.heartbeat(job_id, worker_id):
+            print(f"[{worker_id}] Lost the lease on job {job_id}.")
+            return
+
+
+def worker_loop(worker_id: str, max_jobs: int = None):
+    """Claim and run jobs until interrupted (or after `max_jobs` jobs)."""
+    started = time.perf_counter()
+    from crew import SASESCrew  # Imported here so each process builds its own agents
+
+    queue = create_job_queue()
+    print(f"[{worker_id}] Initializing SASESCrew...")
+    crew = SASESCrew()
+    report_startup(worker_id, since=started)
+    if config.WARM_UP_ON_START:
+        # Before claiming a job, so the first job doesn't pay for the heavy imports under its lease
+        crew.warm_up()
+        print(f"[{worker_id}] Warmed up in {elapsed(started):.2f}s")
+    print(f"[{worker_id}] Waiting for jobs on {config.JOB_QUEUE_PATH}")
+
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(config.JOB_POLL_INTERVAL_SECONDS)
+            continue
+
+        job_id = job["job_id"]
+        print(f"[{worker_id}] Running job {job_id} ({job['kind']}, attempt {job['attempts']}/{job['max_attempts']})")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(queue, job_id, worker_id, stop), daemon=True)
+        heartbeat.start()
+
+        def on_stage(name, result):
+            queue.record_stage(job_id, worker_id, name, _stage_info(result))
+
+        try:
+            result = run_job(crew, job, on_stage=on_stage)
+            status = SUCCEEDED if queue.complete(job_id, worker_id, result) else None
+        except Exception as e:
+            status = queue.fail(job_id, worker_id, str(e))
+            print(f"[{worker_id}] Job {job_id} failed: {e} (now {status})")
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        # Inputs are kept for retries and removed once the job is final
+        if status in (SUCCEEDED, FAILED):
+            inputs_dir = job["payload"].get("inputs_dir")
+            if inputs_dir:
+                shutil.rmtree(inputs_dir, ignore_errors=True)
+        processed += 1
+
+
+def _worker_main(index: int):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    try:
+        worker_loop(worker_id)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run SASES job queue workers.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.JOB_WORKERS,
+        help="Worker processes to start, each with its own warm SASESCrew (default: SASES_JOB_WORKERS)."
+    )
+    args = parser.parse_args()
+
+    create_job_queue()  # Create the database before the workers race to do it
+    processes = [
+        multiprocessing.Process(target=_worker_main, args=(i,), name=f"sases-worker-{i}")
+        for i in range(max(1, args.workers))
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("Stopping workers...")
+        for process in processes:
+            process.join()
+    print(json.dumps(create_job_queue().stats(), indent=2))